@@ -25,27 +25,22 @@ from django.core.cache import cache
 from django.utils import timezone
 
 import requests
-from app.utils import get_location_from_ip
 from cacheops import cached_as
 from chat.tasks import get_chat_url
-from dashboard.models import Activity, Tip, UserAction
-from dashboard.utils import _get_utm_from_cookie
+from dashboard.models import Tip
+from dashboard.utils import RECORD_VISIT_EVERY_N_SECONDS, queue_visit
 from kudos.models import KudosTransfer
 from marketing.utils import handle_marketing_callback
-from perftools.models import JSONStore
-from retail.helpers import get_ip
+from perftools.utils import get_jsonstore
 from townsquare.models import Announcement
 
-RECORD_VISIT_EVERY_N_SECONDS = 60 * 60
-
 logger = logging.getLogger(__name__)
 
 
-@cached_as(JSONStore.objects.filter(view='posts', key='posts'), timeout=1200)
 def fetchPost(qt='2'):
-    jsonstores = JSONStore.objects.filter(view='posts', key='posts')
-    if jsonstores.exists():
-        return jsonstores.first().data
+    jsonstore = get_jsonstore('posts', 'posts')
+    if jsonstore:
+        return jsonstore.data
 
 
 @cached_as(Announcement.objects.filter(key__in=['footer', 'header']), timeout=1200)
@@ -78,40 +73,12 @@ def preprocess(request):
     user_is_authenticated = request.user.is_authenticated
     profile = request.user.profile if user_is_authenticated and hasattr(request.user, 'profile') else None
     if user_is_authenticated and profile and profile.pk:
-        # what actions to take?
-        record_join = not profile.last_visit
         record_visit = not profile.last_visit or profile.last_visit < (
             timezone.now() - timezone.timedelta(seconds=RECORD_VISIT_EVERY_N_SECONDS)
         )
         if record_visit:
-            try:
-                profile.last_visit = timezone.now()
-                profile.save()
-            except Exception as e:
-                logger.exception(e)
-            try:
-                from dashboard.tasks import profile_dict
-                profile_dict.delay(profile.pk)
-            except Exception as e:
-                logger.exception(e)
-            metadata = {
-                'useragent': request.META['HTTP_USER_AGENT'],
-                'referrer': request.META.get('HTTP_REFERER', None),
-                'path': request.META.get('PATH_INFO', None),
-            }
-            ip_address = get_ip(request)
-            UserAction.objects.create(
-                user=request.user,
-                profile=profile,
-                action='Visit',
-                location_data=get_location_from_ip(ip_address),
-                ip_address=ip_address,
-                utm=_get_utm_from_cookie(request),
-                metadata=metadata,
-            )
-
-        if record_join:
-            Activity.objects.create(profile=profile, activity_type='joined')
+            # recorded in the background, with the joined activity of first visits
+            queue_visit(request, profile)
 
         chat_access_token = profile.gitcoin_chat_access_token
         chat_id = profile.chat_id
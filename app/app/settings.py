@@ -521,6 +521,7 @@ X_FRAME_OPTIONS = env('X_FRAME_OPTIONS', default='DENY')
 CONTACT_EMAIL = env('CONTACT_EMAIL', default='')  # TODO
 PERSONAL_CONTACT_EMAIL = env('PERSONAL_CONTACT_EMAIL', default='you@foo.bar')
 SENDGRID_API_KEY = env('SENDGRID_API_KEY', default='')  # TODO - Required to send email.
+SENDGRID_API_HOST = env('SENDGRID_API_HOST', default='https://api.sendgrid.com')
 EMAIL_HOST = env('EMAIL_HOST', default='smtp.sendgrid.net')
 EMAIL_HOST_USER = env('EMAIL_HOST_USER', default='')  # TODO
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='')  # TODO
@@ -636,12 +637,25 @@ KUDOS_CONTRACT_ROPSTEN = env('KUDOS_CONTRACT_ROPSTEN', default='0xcd520707fc68d1
 KUDOS_CONTRACT_TESTRPC = env('KUDOS_CONTRACT_TESTRPC', default='0x38c48d14a5bbc38c17ced9cd5f0695894336f426')
 KUDOS_NETWORK = env('KUDOS_NETWORK', default='mainnet')
 
+# SVG to PNG rendering (avatars, kudos art)
+SVG_RENDER_CACHE_DIR = env('SVG_RENDER_CACHE_DIR', default='static/tmp/render_cache')
+SVG_RENDER_CACHE_MAX_FILES = env.int('SVG_RENDER_CACHE_MAX_FILES', default=5000)
+SVG_RENDER_MEMORY_CACHE_BYTES = env.int('SVG_RENDER_MEMORY_CACHE_BYTES', default=32 * 1024 * 1024)
+SVG_RENDER_WORKERS = env.int('SVG_RENDER_WORKERS', default=2)
+SVG_RENDER_TIMEOUT = env.int('SVG_RENDER_TIMEOUT', default=60)  # seconds
+
 # Grants
 GRANTS_OWNER_ACCOUNT = env('GRANTS_OWNER_ACCOUNT', default='0xD386793F1DB5F21609571C0164841E5eA2D33aD8')
 GRANTS_PRIVATE_KEY = env('GRANTS_PRIVATE_KEY', default='')
 GRANTS_SPLITTER_ROPSTEN = env('GRANTS_SPLITTER_ROPSTEN', default='0xe2fd6dfe7f371e884e782d46f043552421b3a9d9')
 GRANTS_SPLITTER_MAINNET = env('GRANTS_SPLITTER_MAINNET', default='0xdf869FAD6dB91f437B59F1EdEFab319493D4C4cE')
 GRANTS_NETWORK = env('GRANTS_NETWORK', default='mainnet')
+GRANTS_CLR_POTS = {
+    'tech': env.float('GRANTS_CLR_TECH_POT', default=125000.0),
+    'media': env.float('GRANTS_CLR_MEDIA_POT', default=75000.0),
+}
+GRANTS_LIVE_CLR_MAX_AGE = env.int('GRANTS_LIVE_CLR_MAX_AGE', default=60 * 15)  # seconds
+GRANTS_LIVE_CLR_MIN_REBUILD_INTERVAL = env.int('GRANTS_LIVE_CLR_MIN_REBUILD_INTERVAL', default=60)  # seconds
 GITCOIN_DONATION_ADDRESS = env('GITCOIN_DONATION_ADDRESS', default='0x00De4B13153673BCAE2616b67bf822500d325Fc3')
 SPLITTER_CONTRACT_ADDRESS = ''
 if GRANTS_NETWORK == 'mainnet':
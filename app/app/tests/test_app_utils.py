@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Handle app util related tests.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.utils import GeoIPService
+from geoip2.errors import AddressNotFoundError
+from test_plus.test import TestCase
+
+
+class FakeReader:
+    """Answer country lookups for 1.1.1.1 only, counting them."""
+
+    def __init__(self, path, mode=None):
+        self.path = path
+        self.lookups = []
+
+    def country(self, ip_address):
+        self.lookups.append(ip_address)
+        if ip_address != '1.1.1.1':
+            raise AddressNotFoundError(ip_address)
+        return SimpleNamespace(continent=SimpleNamespace(code='OC'))
+
+
+@patch('app.utils.geoip2.database.Reader', FakeReader)
+class GeoIPServiceTest(TestCase):
+    """Define tests for the GeoIP service."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = os.path.join(self.directory, 'GeoLite2-Country.mmdb')
+        open(self.db, 'w').close()
+        self.service = GeoIPService(path=self.directory, max_cached=2, check_interval=0)
+
+    def test_lookups_are_cached(self):
+        assert self.service.country('1.1.1.1').continent.code == 'OC'
+        assert self.service.country('1.1.1.1').continent.code == 'OC'
+        assert self.service.country('10.0.0.1') is None
+        assert self.service.country('10.0.0.1') is None
+        reader = self.service.reader('GeoLite2-Country.mmdb')
+        assert reader.lookups == ['1.1.1.1', '10.0.0.1']
+
+        self.service.country('10.0.0.2')
+        self.service.country('1.1.1.1')
+        assert reader.lookups == ['1.1.1.1', '10.0.0.1', '10.0.0.2', '1.1.1.1']
+
+    def test_reopens_replaced_db(self):
+        reader = self.service.reader('GeoLite2-Country.mmdb')
+        assert self.service.reader('GeoLite2-Country.mmdb') is reader
+
+        replacement = os.path.join(self.directory, 'replacement.mmdb')
+        open(replacement, 'w').close()
+        os.replace(replacement, self.db)
+        assert self.service.reader('GeoLite2-Country.mmdb') is not reader
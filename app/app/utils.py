@@ -3,13 +3,15 @@ import imaplib
 import logging
 import os
 import re
+import threading
 import time
+from collections import OrderedDict
 from hashlib import sha1
 from secrets import token_hex
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.gis.geoip2 import GeoIP2
+from django.contrib.gis.geoip2.resources import City as GeoIPCity
 from django.db.models import Lookup
 from django.db.models.fields import Field
 from django.utils import timezone
@@ -373,6 +375,79 @@ def handle_location_request(request):
     return geolocation_data, ip_address
 
 
+class GeoIPService:
+    """Look up IP addresses in the MaxMind City and Country databases.
+
+    Each database is opened once per process, memory mapped, and reopened
+    when its file is replaced. Lookups are kept in a bounded LRU per
+    database, including the addresses the database does not know.
+
+    """
+
+    def __init__(self, path=None, max_cached=10000, check_interval=60):
+        self.path = path
+        self.max_cached = max_cached
+        self.check_interval = check_interval
+        self.readers = {}
+        self.lookups = {}
+        self.lock = threading.Lock()
+
+    def db_path(self, db):
+        if os.path.isabs(db):
+            return db
+        return os.path.join(self.path or settings.GEOIP_PATH, db)
+
+    def reader(self, db):
+        """Return the reader of the db, reopened if its file was replaced since it was opened."""
+        path = self.db_path(db)
+        with self.lock:
+            reader, version, checked_on = self.readers.get(path, (None, None, 0))
+            if reader and time.time() - checked_on < self.check_interval:
+                return reader
+        stat = os.stat(path)
+        current_version = (stat.st_ino, stat.st_mtime)
+        with self.lock:
+            reader, version, _ = self.readers.get(path, (None, None, 0))
+            if current_version != version:
+                # readers still using the old mapping keep it alive until they are done
+                reader = geoip2.database.Reader(path, mode=geoip2.database.MODE_MMAP)
+                self.lookups[path] = OrderedDict()
+            self.readers[path] = (reader, current_version, time.time())
+        return reader
+
+    def lookup(self, db, method, ip_address):
+        """Return reader.method(ip_address) on the db, or None if the db does not know the address."""
+        reader = self.reader(db)
+        path = self.db_path(db)
+        with self.lock:
+            lookups = self.lookups[path]
+            if ip_address in lookups:
+                lookups.move_to_end(ip_address)
+                return lookups[ip_address]
+        try:
+            result = getattr(reader, method)(ip_address)
+        except AddressNotFoundError:
+            result = None
+        with self.lock:
+            lookups = self.lookups[path]
+            lookups[ip_address] = result
+            while len(lookups) > self.max_cached:
+                lookups.popitem(last=False)
+        return result
+
+    def city(self, ip_address):
+        """Return the location of an IP address, as GeoIP2().city would, or None."""
+        city = self.lookup(getattr(settings, 'GEOIP_CITY', 'GeoLite2-City.mmdb'), 'city', ip_address)
+        return GeoIPCity(city) if city else None
+
+    def country(self, ip_address, db=None):
+        """Return the geoip2 country of an IP address, or None."""
+        return self.lookup(db or 'GeoLite2-Country.mmdb', 'country', ip_address)
+
+
+geoip_service = GeoIPService()
+
+
 def get_location_from_ip(ip_address):
     """Get the location associated with the provided IP address.
 
@@ -388,36 +463,46 @@ def get_location_from_ip(ip_address):
         return city
 
     try:
-        geo = GeoIP2()
-        try:
-            city = geo.city(ip_address)
-        except AddressNotFoundError:
-            pass
+        city = geoip_service.city(ip_address) or {}
     except Exception as e:
         logger.warning(f'Encountered ({e}) while attempting to retrieve a user\'s geolocation')
     return city
 
 
+def get_locations_from_ips(ip_addresses):
+    """Get the location of each of the provided IP addresses.
+
+    Returns:
+        dict: The GeoIP location data dictionary of each IP address.
+
+    """
+    return {ip_address: get_location_from_ip(ip_address) for ip_address in set(ip_addresses)}
+
+
 def get_country_from_ip(ip_address, db=None):
     """Get the user's country information from the provided IP address."""
     country = {}
-    if db is None:
-        db = f'{settings.GEOIP_PATH}GeoLite2-Country.mmdb'
-
     if not ip_address:
         return country
 
     try:
-        reader = geoip2.database.Reader(db)
-        country = reader.country(ip_address)
-    except AddressNotFoundError:
-        pass
+        country = geoip_service.country(ip_address, db) or {}
     except Exception as e:
         logger.warning(f'Encountered ({e}) while attempting to retrieve a user\'s geolocation')
 
     return country
 
 
+def get_countries_from_ips(ip_addresses, db=None):
+    """Get the country information of each of the provided IP addresses.
+
+    Returns:
+        dict: The geoip2 country of each IP address.
+
+    """
+    return {ip_address: get_country_from_ip(ip_address, db) for ip_address in set(ip_addresses)}
+
+
 def clean_str(string):
     """Clean the provided string of all non-alpha numeric characters."""
     return re.sub(r'\W+', '', string)
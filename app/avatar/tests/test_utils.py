@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Handle avatar util tests.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import os
+import tempfile
+from unittest import mock
+
+from avatar import utils
+from avatar.utils import RenderCache, render_cache_key, svg_to_png
+from test_plus.test import TestCase
+
+
+class RenderCacheTest(TestCase):
+    """Define tests for the SVG render cache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_render_cache_key(self):
+        assert render_cache_key('<svg/>', width=1, height=2) == render_cache_key(b'<svg/>', height=2, width=1)
+        assert render_cache_key('<svg/>', width=1) != render_cache_key('<svg/>', width=2)
+
+    def test_memory_and_disk_eviction(self):
+        cache = RenderCache(self.directory, max_files=3, max_memory_bytes=10)
+        keys = [render_cache_key('<svg/>', width=width) for width in range(5)]
+        for i, key in enumerate(keys):
+            cache.set(key, b'x' * (i + 1))
+            os.utime(cache.path(key), (i, i))
+        cache.evict()
+
+        assert list(cache.memory.keys()) == keys[3:]
+        assert sorted(os.listdir(self.directory)) == sorted(f'{key}.png' for key in keys[2:])
+        assert RenderCache(self.directory, 3, 10).get(keys[2]) == b'xxx'
+        assert RenderCache(self.directory, 3, 10).get(keys[0]) is None
+
+    def test_svg_to_png_renders_once(self):
+        cache = RenderCache(self.directory, max_files=10, max_memory_bytes=1024)
+        with mock.patch.object(utils, 'svg_render_cache', cache), \
+                mock.patch.object(utils, 'render_with_inkscape', return_value=b'png') as render_with_inkscape:
+            assert svg_to_png('<svg/>', prefer='inkscape').getvalue() == b'png'
+            assert svg_to_png('<svg/>', prefer='inkscape').getvalue() == b'png'
+        assert render_with_inkscape.call_count == 1
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Handle 3d avatar view tests.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+from django.http import Http404
+from django.test.client import RequestFactory
+
+from avatar.views_3d import (
+    RenderedAvatarCache, avatar3d, avatar3dids, avatar3dids_helper, get_avatar_tone_map, render_avatar3d,
+    rendered_avatars,
+)
+from test_plus.test import TestCase
+
+
+class Avatar3dViewsTest(TestCase):
+    """Define tests for the 3d avatar views."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_avatar3d(self):
+        ids = avatar3dids_helper('unisex')['ids']
+        request = self.factory.get('/avatar/view3d', {'theme': 'unisex', 'ids': ids[:1], 'skinTone': '392D16'})
+
+        output = avatar3d(request).content.decode('utf-8')
+
+        self.assertIn(f'id="{ids[0]}"', output)
+        tones = get_avatar_tone_map('skin', '392D16', 'unisex')
+        self.assertTrue(any(tone in output for tone in tones.values()))
+
+    def test_avatar3d_unknown_theme(self):
+        for params in [{'theme': 'unknown'}, {'theme': 'unknown', 'mode': 'preview', 'ids': ['head_1']}]:
+            with self.assertRaises(Http404):
+                avatar3d(self.factory.get('/avatar/view3d', params))
+        with self.assertRaises(Http404):
+            avatar3dids(self.factory.get('/avatar/avatar3dids', {'theme': 'unknown'}))
+
+    def test_render_avatar3d_is_cached(self):
+        rendered_avatars.clear()
+        ids = frozenset(avatar3dids_helper('unisex')['ids'][:3])
+
+        first = render_avatar3d('unisex', ids, '', '', '', '0 0 350 350', '100', '100')
+        second = render_avatar3d('unisex', ids, '', '', '', '0 0 350 350', '100', '100')
+
+        self.assertIs(first, second)
+        self.assertEqual(rendered_avatars.hits, 1)
+
+    def test_rendered_avatar_cache_is_bounded_by_size(self):
+        cache = RenderedAvatarCache(max_bytes=10)
+        cache.set('a', 'x' * 4)
+        cache.set('b', 'x' * 4)
+        cache.get('a')
+        cache.set('c', 'x' * 4)
+        cache.set('d', 'x' * 11)
+
+        self.assertEqual(list(cache.memory), ['a', 'c'])
+        self.assertEqual(cache.memory_bytes, 8)
@@ -17,10 +17,17 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
+import hashlib
 import logging
 import os
+import queue
 import random
 import re
+import select
+import subprocess
+import threading
+import time
+from collections import OrderedDict
 from io import BytesIO
 from secrets import token_hex
 from tempfile import NamedTemporaryFile
@@ -608,17 +615,200 @@ def get_temp_image_file(image):
     return temp_io
 
 
+class RenderCache:
+    """Keep rendered images by content hash in a bounded in-memory LRU over a bounded directory.
+
+    The directory is shared by every process on the host; files are written
+    atomically and the least recently used ones are evicted once there are
+    more than max_files of them.
+
+    """
+
+    def __init__(self, directory, max_files, max_memory_bytes):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_memory_bytes = max_memory_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def remember(self, key, content):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return
+            self.memory[key] = content
+            self.memory_bytes += len(content)
+            while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+        try:
+            with open(self.path(key), 'rb') as fin:
+                content = fin.read()
+            # mtime doubles as the last use for eviction
+            os.utime(self.path(key))
+        except OSError:
+            return None
+        self.remember(key, content)
+        return content
+
+    def set(self, key, content):
+        self.remember(key, content)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as fout:
+                fout.write(content)
+            os.replace(fout.name, self.path(key))
+        except OSError as e:
+            logger.warning('could not write %s to the render cache: %s', key, e)
+            return
+        self.writes += 1
+        if self.writes % 100 == 1:
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used files beyond max_files."""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.png')]
+        except OSError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def render_cache_key(svg_content, **params):
+    """Hash the SVG along with everything else that changes the rendering."""
+    if isinstance(svg_content, str):
+        svg_content = svg_content.encode('utf-8')
+    digest = hashlib.sha256(svg_content)
+    digest.update(repr(sorted(params.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class InkscapeShell:
+    """A pre-spawned `inkscape --shell` process, rendering one export per command."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ['/usr/bin/inkscape', '-z', '--shell'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self.read_prompt()
+
+    def read_prompt(self):
+        """Wait for the '>' prompt the shell prints once it is ready for the next command."""
+        output = b''
+        deadline = time.time() + settings.SVG_RENDER_TIMEOUT
+        while not output.endswith(b'>'):
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([self.process.stdout], [], [], remaining)[0]:
+                raise TimeoutError('inkscape shell timed out')
+            chunk = os.read(self.process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError('inkscape shell exited')
+            output += chunk.rstrip()
+        return output
+
+    def render(self, input_file, output_file, width, height, extra_flags=''):
+        command = f'{input_file} --export-png={output_file} --export-width={width} --export-height={height} {extra_flags}'
+        self.process.stdin.write(command.strip().encode('utf-8') + b'\n')
+        self.read_prompt()
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class InkscapePool:
+    """Hand out up to size InkscapeShells, spawning them on first use and keeping them around."""
+
+    def __init__(self, size):
+        self.size = size
+        self.idle = queue.Queue()
+        self.spawned = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            spawn = self.spawned < self.size
+            if spawn:
+                self.spawned += 1
+        if not spawn:
+            return self.idle.get(timeout=settings.SVG_RENDER_TIMEOUT)
+        try:
+            return InkscapeShell()
+        except Exception:
+            with self.lock:
+                self.spawned -= 1
+            raise
+
+    def render(self, *args, **kwargs):
+        shell = self.acquire()
+        try:
+            shell.render(*args, **kwargs)
+        except Exception:
+            # a shell in an unknown state is not reused
+            shell.close()
+            with self.lock:
+                self.spawned -= 1
+            raise
+        self.idle.put(shell)
+
+
+svg_render_cache = RenderCache(
+    settings.SVG_RENDER_CACHE_DIR, settings.SVG_RENDER_CACHE_MAX_FILES, settings.SVG_RENDER_MEMORY_CACHE_BYTES
+)
+inkscape_pool = InkscapePool(settings.SVG_RENDER_WORKERS)
+
+
 def svg_to_png(svg_content, width=100, height=100, scale=1, index=None, prefer=None, extra_flags=''):
-    print('creating svg with pyvips')
-    png = None
-    if not prefer or prefer == 'pyvips':
-        png = svg_to_png_pyvips(svg_content, scale=scale)
-    if not png:
-        if not index:
-            index = random.randint(1000000, 10000000)
-        print("failed; using inkscape")
-        return svg_to_png_inkscape(svg_content, height=height, width=width, index=index, extra_flags=extra_flags)
-    return png
+    """Render an SVG to PNG, at most once per distinct SVG and size.
+
+    Renders with pyvips, falling back to inkscape, and keeps the result in
+    the render cache keyed by a hash of the SVG and the render parameters.
+    index is no longer used; it used to name inkscape's temporary files.
+
+    Returns:
+        BytesIO: The PNG, or None if it could not be rendered.
+
+    """
+    key = render_cache_key(
+        svg_content, width=width, height=height, scale=scale, prefer=prefer, extra_flags=extra_flags
+    )
+    png = svg_render_cache.get(key)
+    if png is None:
+        if not prefer or prefer == 'pyvips':
+            png = svg_to_png_pyvips(svg_content, scale=scale)
+            png = png.getvalue() if png else None
+        if not png:
+            png = render_with_inkscape(svg_content, width=width, height=height, extra_flags=extra_flags)
+        if not png:
+            return None
+        svg_render_cache.set(key, png)
+    return BytesIO(png)
 
 
 def svg_to_png_pyvips(svg_content, scale=1):
@@ -648,35 +838,41 @@ def svg_to_png_pyvips(svg_content, scale=1):
     return None
 
 
-def svg_to_png_inkscape(svg_content, width=333, height=384, index=100, extra_flags=''):
-    import subprocess  # May want to use subprocess32 instead
-    input_file = f'static/tmp/input{index}.svg'
-    output_file = f'static/tmp/output{index}.png'
+def render_with_inkscape(svg_content, width=333, height=384, extra_flags=''):
+    """Render an SVG with a pooled inkscape shell, or a one off inkscape process if that fails."""
+    if isinstance(svg_content, bytes):
+        svg_content = svg_content.decode('utf-8')
+    os.makedirs(settings.SVG_RENDER_CACHE_DIR, exist_ok=True)
+    with NamedTemporaryFile('w', dir=settings.SVG_RENDER_CACHE_DIR, suffix='.svg') as input_file:
+        input_file.write(svg_content)
+        input_file.flush()
+        output_file = input_file.name[:-len('.svg')] + '.out'
+        try:
+            try:
+                inkscape_pool.render(input_file.name, output_file, width, height, extra_flags)
+            except Exception as e:
+                logger.warning('inkscape shell failed, running inkscape directly: %s', e)
+                cmd_list = [
+                    '/usr/bin/inkscape', '-z', '--export-png', output_file, '--export-width', f"{width}",
+                    '--export-height', f"{height}", input_file.name, extra_flags
+                ]
+                p = subprocess.Popen(cmd_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                out, err = p.communicate(timeout=settings.SVG_RENDER_TIMEOUT)
+                if p.returncode:
+                    logger.error('Inkscape error: %s', err or '?')
+            with open(output_file, 'rb') as fin:
+                return fin.read() or None
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.error('could not render svg with inkscape: %s', e)
+            return None
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
 
-    # check filesystem cache, if not, compute image
-    try:
-        with open(output_file, 'rb') as fin:
-            file_input = fin.read()
-    except FileNotFoundError:
-        text_file = open(input_file, "w")
-        content = svg_content
-        if type(content) == bytes:
-            content = svg_content.decode('utf-8')
-        text_file.write(content)
-        text_file.close()
-
-        cmd_list = [
-            '/usr/bin/inkscape', '-z', '--export-png', output_file, '--export-width', f"{width}", '--export-height',
-            f"{height}", input_file, extra_flags
-        ]
-        print(" ".join(cmd_list))
-        p = subprocess.Popen(cmd_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out, err = p.communicate()
-        if p.returncode:
-            print('Inkscape error: ' + (str(err) or '?'))
-
-    with open(output_file, 'rb') as fin:
-        return BytesIO(fin.read())
+
+def svg_to_png_inkscape(svg_content, width=333, height=384, index=None, extra_flags=''):
+    """Render an SVG to PNG with inkscape only, through the render cache."""
+    return svg_to_png(svg_content, width=width, height=height, prefer='inkscape', extra_flags=extra_flags)
 
 
 def convert_img(obj, input_fmt='svg', output_fmt='png', height=215, width=215, preferred_method='', extra_flags=''):
@@ -19,10 +19,14 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 import json
 import logging
+import re
+import threading
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from functools import lru_cache
 
 from django.db import transaction
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
 from avatar.helpers import add_rgb_array, hex_to_rgb_array, rgb_array_to_hex, sub_rgb_array
@@ -33,6 +37,12 @@ from .models import BaseAvatar, CustomAvatar, SocialAvatar
 
 logger = logging.getLogger(__name__)
 
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+# tags included in every rendering, whatever ids were asked for
+ALWAYS_INCLUDED_TAGS = ['{http://www.w3.org/2000/svg}style']
+# rendered SVGs are large, so the cache of each worker is bounded by their total size
+MAX_CACHED_AVATAR_BYTES = 16 * 1024 * 1024
+
 
 def get_avatar_attrs(theme, key):
     avatar_attrs = {
@@ -622,16 +632,160 @@ def get_avatar_tone_map(tone='skin', skinTone='', theme='unisex'):
         delta = sub_rgb_array(hex_to_rgb_array(key), hex_to_rgb_array(base_3d_tone), False)
         rgb_array = add_rgb_array(delta, hex_to_rgb_array(skinTone), True)
         tones[key] = rgb_array_to_hex(rgb_array)
-        print(tone, key, tones[key])
 
     return tones
 
 
+def get_avatar3d_index(theme):
+    """Return the parsed base SVG of a theme, see parse_avatar3d_base.
+
+    Returns:
+        dict: The theme's components, or None for unknown themes.
+
+    """
+    avatar_3d_base_path = get_avatar_attrs(theme, 'path')
+    if not avatar_3d_base_path:
+        return None
+    # cached by path rather than by theme, so unknown themes take no room in the cache
+    return parse_avatar3d_base(avatar_3d_base_path)
+
+
+@lru_cache(maxsize=None)
+def parse_avatar3d_base(avatar_3d_base_path):
+    """Parse a theme's base SVG once into its pre-serialized top level components.
+
+    Returns:
+        dict: The theme's components as (id, tag, svg fragment) tuples in
+            document order under 'elements', along with the 'ids' and
+            'by_category' avatar3dids serves.
+
+    """
+    ET.register_namespace('', SVG_NAMESPACE)
+    with open(avatar_3d_base_path) as file:
+        tree = ET.parse(file)
+    elements = [(item.attrib.get('id'), item.tag, ET.tostring(item).decode('utf-8')) for item in tree.getroot()]
+
+    ids = [_id for _id, _, _ in elements if _id and _id != 'base']
+    category_list = {ele.split("_")[0]: [] for ele in ids}
+    for ele in ids:
+        category = ele.split("_")[0]
+        category_list[category].append(ele)
+    return {'elements': elements, 'ids': ids, 'by_category': category_list}
+
+
+@lru_cache(maxsize=256)
+def get_tone_pattern(tones):
+    """Compile one regex matching any of the given hex tones."""
+    return re.compile('|'.join(re.escape(tone) for tone in tones))
+
+
+class RenderedAvatarCache:
+    """Keep rendered SVGs in an in-memory LRU bounded by their total length."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+
+    def set(self, key, content):
+        with self.lock:
+            if key in self.memory or len(content) > self.max_bytes:
+                return
+            self.memory[key] = content
+            self.memory_bytes += len(content)
+            while self.memory_bytes > self.max_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+            self.hits = 0
+
+
+rendered_avatars = RenderedAvatarCache(MAX_CACHED_AVATAR_BYTES)
+
+
+def render_avatar3d(theme, accept_ids, skinTone, hairTone, backgroundTone, viewBox, width, height):
+    """Render the SVG of a 3d avatar, or return it from rendered_avatars.
+
+    Args:
+        accept_ids (frozenset): The ids of the components to include.
+
+    Returns:
+        str: The SVG, or None for unknown themes.
+
+    """
+    key = (theme, accept_ids, skinTone, hairTone, backgroundTone, viewBox, width, height)
+    output = rendered_avatars.get(key)
+    if output is None:
+        output = _render_avatar3d(*key)
+        if output is not None:
+            rendered_avatars.set(key, output)
+    return output
+
+
+def _render_avatar3d(theme, accept_ids, skinTone, hairTone, backgroundTone, viewBox, width, height):
+    """Render the SVG of a 3d avatar from the theme's component index.
+
+    Args:
+        accept_ids (frozenset): The ids of the components to include.
+
+    Returns:
+        str: The SVG, or None for unknown themes.
+
+    """
+    index = get_avatar3d_index(theme)
+    if not index:
+        return None
+
+    prepend = f'''<?xml version="1.0" encoding="utf-8"?>
+<svg width="{width}%" height="{height}%" viewBox="{viewBox}" version="1.1" id="Layer_1" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">
+'''
+    postpend = '''
+</svg>
+'''
+    elements = [
+        fragment for _id, tag, fragment in index['elements'] if _id in accept_ids or tag in ALWAYS_INCLUDED_TAGS
+    ]
+    output = prepend + "".join(elements) + postpend
+
+    # merge the tone maps so every color is substituted in a single pass; like the
+    # sequential replaces this used to be, the first tone map to claim a color wins
+    replacements = {}
+    for _type in get_avatar_attrs(theme, 'tone_maps'):
+        base_tone = skinTone
+        if 'hair' in _type:
+            base_tone = hairTone
+        if 'background' in _type:
+            base_tone = backgroundTone
+        if base_tone:
+            for _from, to in get_avatar_tone_map(_type, base_tone, theme).items():
+                replacements.setdefault(_from, to)
+    if replacements:
+        pattern = get_tone_pattern(tuple(sorted(replacements.keys())))
+        output = pattern.sub(lambda match: replacements[match.group(0)], output)
+    return output
+
+
 @csrf_exempt
 def avatar3d(request):
     """Serve an 3d avatar."""
 
     theme = request.GET.get('theme', 'unisex')
+    index = get_avatar3d_index(theme)
+    if not index:
+        raise Http404
     #get request
     accept_ids = request.GET.getlist('ids')
     if not accept_ids:
@@ -656,73 +810,43 @@ def avatar3d(request):
     else:
         accept_ids.append('frame')
 
-    # setup
-    tags = ['{http://www.w3.org/2000/svg}style']
-    ET.register_namespace('', "http://www.w3.org/2000/svg")
-    prepend = f'''<?xml version="1.0" encoding="utf-8"?>
-<svg width="{width}%" height="{height}%" viewBox="{viewBox}" version="1.1" id="Layer_1" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">
-'''
-    postpend = '''
-</svg>
-'''
-
     #ensure at least one per category
 
     if bool(int(force_show_whole_body)):
-        categories = avatar3dids_helper(theme)['by_category']
+        categories = index['by_category']
         for category_name, ids in categories.items():
             has_ids_in_category = any([ele in accept_ids for ele in ids])
             if not has_ids_in_category:
                 accept_ids.append(ids[0])
 
     # asseble response
-    avatar_3d_base_path = get_avatar_attrs(theme, 'path')
-    if avatar_3d_base_path:
-        with open(avatar_3d_base_path) as file:
-            elements = []
-            tree = ET.parse(file)
-            for item in tree.getroot():
-                include_item = item.attrib.get('id') in accept_ids or item.tag in tags
-                if include_item:
-                    elements.append(ET.tostring(item).decode('utf-8'))
-            output = prepend + "".join(elements) + postpend
-            tone_maps = get_avatar_attrs(theme, 'tone_maps')
-            for _type in tone_maps:
-                base_tone = skinTone
-                if 'hair' in _type:
-                    base_tone = hairTone
-                if 'background' in _type:
-                    base_tone = backgroundTone
-                if base_tone:
-                    for _from, to in get_avatar_tone_map(_type, base_tone, theme).items():
-                        output = output.replace(_from, to)
-            if request.method == 'POST':
-                return save_custom_avatar(request, output)
-            response = HttpResponse(output, content_type='image/svg+xml')
-    return response
+    output = render_avatar3d(
+        theme, frozenset(accept_ids), skinTone, hairTone, backgroundTone, viewBox, width, height
+    )
+    if output is None:
+        raise Http404
+    if request.method == 'POST':
+        return save_custom_avatar(request, output)
+    return HttpResponse(output, content_type='image/svg+xml')
 
 
 def avatar3dids_helper(theme):
-    avatar_3d_base_path = get_avatar_attrs(theme, 'path')
-    if avatar_3d_base_path:
-        with open(avatar_3d_base_path) as file:
-            tree = ET.parse(file)
-            ids = [item.attrib.get('id') for item in tree.getroot()]
-            ids = [ele for ele in ids if ele and ele != 'base']
-            category_list = {ele.split("_")[0]: [] for ele in ids}
-            for ele in ids:
-                category = ele.split("_")[0]
-                category_list[category].append(ele)
-
-            response = {'ids': ids, 'by_category': category_list, }
-            return response
+    index = get_avatar3d_index(theme)
+    if index:
+        response = {'ids': list(index['ids']), 'by_category': {
+            category: list(ids) for category, ids in index['by_category'].items()
+        }, }
+        return response
 
 
 def avatar3dids(request):
     """Serve an 3d avatar id list."""
 
     theme = request.GET.get('theme', 'unisex')
-    response = JsonResponse(avatar3dids_helper(theme))
+    index = avatar3dids_helper(theme)
+    if not index:
+        raise Http404
+    response = JsonResponse(index)
     return response
 
 
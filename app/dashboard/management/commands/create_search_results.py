@@ -16,106 +16,133 @@
 
 '''
 
+from urllib.parse import urlsplit
+
+from django.apps import apps
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
+from django.test import Client
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-import requests
 from app.sitemaps import StaticViewSitemap
 from bs4 import BeautifulSoup
-from dashboard.models import Bounty, HackathonEvent, Profile
-from grants.models import Grant
-from kudos.models import Token
-from quests.models import Quest
-from retail.utils import strip_html
+from perftools.utils import get_jsonstore, replace_jsonstore
 from search.models import Page, ProgrammingLanguage, SearchResult
+from search.utils import BATCH_SIZE, SEARCH_DOCUMENTS, index_search_results
 
+WATERMARK_VIEW = 'search_index'
+# also revisit rows saved shortly before the last run, whose transactions may have committed after it
+WATERMARK_OVERLAP = timezone.timedelta(minutes=10)
 
-class Command(BaseCommand):
-
-    help = 'creates earnings records for deploy of https://github.com/gitcoinco/web/pull/5093'
 
-    def handle(self, *args, **options):
+def index_static_pages():
+    """Index the static pages of the sitemap, rendered in process."""
+    client = Client(HTTP_HOST=urlsplit(settings.BASE_URL).hostname)
+    svs = StaticViewSitemap()
+    for item in svs.items():
+        try:
+            uri = reverse(item)
+            url = f"{settings.BASE_URL}{uri}".replace(f"/{uri}", f"{uri}")
 
-        # regular URLs
-        svs = StaticViewSitemap()
-        for item in svs.items():
-            try:
-                uri = reverse(item)
-                url = f"{settings.BASE_URL}{uri}".replace(f"/{uri}", f"{uri}")
-
-                html_response = requests.get(url)
-                soup = BeautifulSoup(html_response.text, 'html.parser')
-                title = soup.findAll("title")[0].text
-                try:
-                    description = soup.findAll("meta", {"name": 'description'})[0].text
-                except:
-                    description = ''
-                try:
-                    img_url = soup.findAll("meta", {"name": 'twitter:image'})[0].get('content')
-                    print(img_url)
-                except:
-                    img_url = ''
-                valid_title ='Grow Open Source' not in title and 'GitHub' not in title
-                title = title if valid_title else item.capitalize() + " Page"
-                print(title, item, url, img_url)
-                obj, created = Page.objects.update_or_create(
-                    key=item,
+            html_response = client.get(uri)
+            soup = BeautifulSoup(html_response.content, 'html.parser')
+            title = soup.findAll("title")[0].text
+            description = soup.find("meta", {"name": 'description'})
+            description = description.get('content', '') if description else ''
+            img_url = soup.find("meta", {"name": 'twitter:image'})
+            img_url = img_url.get('content', '') if img_url else ''
+            valid_title ='Grow Open Source' not in title and 'GitHub' not in title
+            title = title if valid_title else item.capitalize() + " Page"
+            print(title, item, url, img_url)
+            obj, created = Page.objects.update_or_create(
+                key=item,
+                defaults={
+                    "title":title,
+                    "description":description,
+                }
+            )
+            if obj.pk:
+                SearchResult.objects.update_or_create(
+                    source_type=ContentType.objects.get(app_label='search', model='page'),
+                    source_id=obj.pk,
                     defaults={
                         "title":title,
                         "description":description,
+                        "url":url,
+                        "visible_to":None,
+                        'img_url': img_url,
+                    }
+                    )
+        except Exception as e:
+            print(item, e)
+
+
+def index_programming_languages():
+    from retail.utils import programming_languages_full
+    for pl in programming_languages_full:
+        obj, created = ProgrammingLanguage.objects.update_or_create(val=pl)
+        urls = [f"/explorer?q={pl}", f"/users?q={pl}"]
+        for url in urls:
+            title = f"View {pl} Bounties"
+            if 'users' in url:
+                title = f"View {pl} Coders"
+            description = title
+            if obj.pk:
+                SearchResult.objects.update_or_create(
+                    source_type=ContentType.objects.get(app_label='search', model='programminglanguage'),
+                    source_id=obj.pk,
+                    title=title,
+                    defaults={
+                        "description":description,
+                        "url":url,
+                        "visible_to":None,
                     }
-                )
-                if obj.pk:
-                    SearchResult.objects.update_or_create(
-                        source_type=ContentType.objects.get(app_label='search', model='page'),
-                        source_id=obj.pk,
-                        defaults={
-                            "title":title,
-                            "description":description,
-                            "url":url,
-                            "visible_to":None,
-                            'img_url': img_url,
-                        }
-                        )
-            except Exception as e:
-                print(item, e)
-
-
-        # prog languages
-        from retail.utils import programming_languages_full
-        for pl in programming_languages_full:
-            obj, created = ProgrammingLanguage.objects.update_or_create(val=pl)
-            urls = [f"/explorer?q={pl}", f"/users?q={pl}"]
-            for url in urls:
-                title = f"View {pl} Bounties"
-                if 'users' in url:
-                    title = f"View {pl} Coders"
-                description = title
-                if obj.pk:
-                    SearchResult.objects.update_or_create(
-                        source_type=ContentType.objects.get(app_label='search', model='programminglanguage'),
-                        source_id=obj.pk,
-                        title=title,
-                        defaults={
-                            "description":description,
-                            "url":url,
-                            "visible_to":None,
-                        }
-                        )
-        # objects
-        qses = [
-            Grant.objects.all(),
-            Token.objects.filter(num_clones_allowed__gt=0),
-            Bounty.objects.current(),
-            Quest.objects.filter(visible=True),
-            Profile.objects.filter(hide_profile=False),
-            HackathonEvent.objects.all(),
-        ]
-        for qs in qses:
-            print(qs)
-            for obj in qs:
-                print(obj.pk)
-                obj.save()
+                    )
+
+
+def reconcile_search_results(label, since=None):
+    """Reindex the objects of a model modified since a watermark and drop results of deleted ones.
+
+    Returns:
+        int: The number of objects reindexed.
+
+    """
+    model = apps.get_model(label)
+    objects = model.objects.all()
+    if since:
+        objects = objects.filter(modified_on__gte=since)
+    pks = list(objects.values_list('pk', flat=True))
+    for i in range(0, len(pks), BATCH_SIZE):
+        index_search_results(label, pks[i:i + BATCH_SIZE])
+
+    source_type = ContentType.objects.get_for_model(model)
+    SearchResult.objects.filter(source_type=source_type).exclude(source_id__in=model.objects.values('pk')).delete()
+    return len(pks)
+
+
+class Command(BaseCommand):
+
+    help = 'reconciles the search index with the objects modified since its last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='reindex every object and static page')
+        parser.add_argument('--pages', action='store_true', help='also reindex the static pages and programming languages')
+
+    def handle(self, *args, **options):
+        started_on = timezone.now()
+        since = None
+        watermark = get_jsonstore(WATERMARK_VIEW, 'watermark')
+        if watermark and not options['full']:
+            since = parse_datetime(watermark.data) - WATERMARK_OVERLAP
+
+        if options['full'] or options['pages']:
+            index_static_pages()
+            index_programming_languages()
+
+        for label in SEARCH_DOCUMENTS:
+            print(f"{label}: reindexed {reconcile_search_results(label, since)} objects")
+
+        replace_jsonstore(WATERMARK_VIEW, {'watermark': started_on.isoformat()})
@@ -0,0 +1,49 @@
+'''
+    Copyright (C) 2020 Gitcoin Core
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published
+    by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard.utils import (
+    NoBountiesException, get_bounty_references_watermark, get_highest_known_bounty_id, update_bounty_references,
+)
+
+
+class Command(BaseCommand):
+
+    help = 'indexes the webReferenceURL of the bounties not in the BountyReference index yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('network', default='rinkeby', type=str)
+        parser.add_argument('--workers', type=int, default=8, help='how many contract reads and IPFS fetches to run at once')
+        parser.add_argument('--window', type=int, default=32, help='how many bounties to fetch together')
+
+    def handle(self, *args, **options):
+        network = options['network']
+        if (settings.DEBUG or settings.ENV != 'prod') and network == 'mainnet':
+            # mainnet bounties are only synced in prod
+            print("--*--")
+            return
+
+        try:
+            end_id = get_highest_known_bounty_id(network)
+        except NoBountiesException:
+            print(f"no bounties on {network}")
+            return
+        bounty_ids = update_bounty_references(network, end_id, workers=options['workers'], window=options['window'])
+        print(f"indexed {len(bounty_ids)} urls, up to bounty {get_bounty_references_watermark(network)} of {end_id}")
@@ -19,12 +19,18 @@
 import datetime
 import logging
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection
 
 from dashboard.helpers import UnsupportedSchemaException
-from dashboard.utils import BountyNotFoundException, get_bounty, getBountyContract, web3_process_bounty
+from dashboard.utils import (
+    BountyNotFoundException, assemble_bounty, get_bounty_reference_url, getBountyContract, ipfs_cat_many,
+    read_bounty_contract, record_bounty_references, web3_process_bounty,
+)
+from perftools.utils import get_jsonstore, replace_jsonstore
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 logging.getLogger("requests").setLevel(logging.WARNING)
@@ -33,6 +39,9 @@ logging.getLogger("urllib3").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 default_start_id = 0 if not settings.DEBUG else 402
 
+# JSONStore view holding the last bounty id processed on each network
+CHECKPOINT_VIEW = 'sync_geth'
+
 
 def get_bounty_id(_id, network):
     if _id > 0:
@@ -42,6 +51,139 @@ def get_bounty_id(_id, network):
     return bounty_id + _id
 
 
+def get_checkpoint(network):
+    """Return the last bounty id synced on network, or None."""
+    checkpoint = get_jsonstore(CHECKPOINT_VIEW, network)
+    return checkpoint.data['last_id'] if checkpoint else None
+
+
+class BountySyncer:
+    """Sync a range of bounties from the StandardBounties contract.
+
+    Bounties are synced in windows which go through three stages: the
+    contract reads of a window run concurrently, then the IPFS data of all
+    of its bounties and fulfillments is fetched concurrently, each hash once
+    and only if it is not in the IPFS cache yet,
+    and finally the bounties are processed into the DB in id order on the
+    calling thread, which also records their webReferenceURL in the
+    BountyReference index. The next window is fetched while the current
+    one is processed.
+
+    Args:
+        network (str): The network to sync.
+        contract (web3.contract.Contract): The StandardBounties contract,
+            getBountyContract(network) by default.
+        cat (callable): Returns the content of an IPFS hash, by default the
+            content is read through the IPFS cache, see ipfs_cat_many.
+        workers (int): How many contract reads and IPFS fetches run at once.
+        window (int): How many bounties are fetched together.
+        checkpoint (bool): Whether to record the last processed id, see get_checkpoint.
+
+    """
+
+    def __init__(self, network, contract=None, cat=None, workers=8, window=32, checkpoint=True):
+        self.network = network
+        self.contract = contract or getBountyContract(network)
+        self.cat = cat
+        self.workers = workers
+        self.window = window
+        self.checkpoint = checkpoint
+
+    def read_contract(self, bounty_enum):
+        try:
+            return read_bounty_contract(self.contract, bounty_enum)
+        except BountyNotFoundException:
+            return None
+        except Exception as e:
+            # kept so processing logs it against the bounty, in order
+            return e
+
+    def cat_or_none(self, key):
+        try:
+            return self.cat(key)
+        except Exception as e:
+            logger.warning(f"* Could not cat {key} from ipfs => {e}")
+            return None
+
+    def fetch_window(self, bounty_enums, pool):
+        """Return the contract bounties of a window and the IPFS content they reference, by hash."""
+        contract_bounties = list(pool.map(self.read_contract, bounty_enums))
+        hashes = set()
+        for contract_bounty in contract_bounties:
+            if isinstance(contract_bounty, dict):
+                hashes.add(contract_bounty['data'])
+                hashes.update(fulfillment['data'] for fulfillment in contract_bounty['fulfillments'])
+        return list(zip(bounty_enums, contract_bounties)), self.fetch_contents(list(hashes), pool)
+
+    def fetch_contents(self, hashes, pool):
+        if self.cat:
+            return dict(zip(hashes, pool.map(self.cat_or_none, hashes)))
+        try:
+            return ipfs_cat_many(hashes, pool=pool)
+        finally:
+            # the prefetch thread would otherwise hold its connection for the whole sync
+            connection.close()
+
+    def process(self, bounty_enum, contract_bounty, contents):
+        """Process a bounty into the DB.
+
+        Returns:
+            str: The bounty's webReferenceURL, or None.
+
+        """
+        url = None
+        try:
+            if isinstance(contract_bounty, Exception):
+                raise contract_bounty
+            print(f"Processing bounty {bounty_enum}")
+            bounty = assemble_bounty(contract_bounty, self.network, cat=contents.get)
+            url = get_bounty_reference_url(bounty['data'])
+            web3_process_bounty(bounty)
+        except UnsupportedSchemaException as e:
+            logger.info(f"* Unsupported Schema => {e}")
+        except Exception as e:
+            extra_data = {'bounty_enum': bounty_enum, 'network': self.network}
+            logger.error('Failed to fetch github username', exc_info=True, extra=extra_data)
+            logger.error(f"* Exception in sync_geth => {e}")
+        return url
+
+    def save_checkpoint(self, bounty_enum):
+        if self.checkpoint:
+            replace_jsonstore(CHECKPOINT_VIEW, {self.network: {'last_id': bounty_enum}}, whole_view=False)
+
+    def sync(self, start_id, end_id):
+        """Sync bounties start_id to end_id, stopping early at the first id the contract does not have.
+
+        Returns:
+            int: The last bounty id processed, or None.
+
+        """
+        windows = (
+            range(window_start, min(window_start + self.window, end_id + 1))
+            for window_start in range(start_id, end_id + 1, self.window)
+        )
+        last_id = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, ThreadPoolExecutor(max_workers=1) as prefetch:
+            window = next(windows, None)
+            fetched = prefetch.submit(self.fetch_window, window, pool) if window else None
+            while fetched:
+                bounties, contents = fetched.result()
+                window = next(windows, None)
+                more_bounties = all(contract_bounty is not None for _, contract_bounty in bounties)
+                fetched = prefetch.submit(self.fetch_window, window, pool) if window and more_bounties else None
+
+                urls_by_id = {}
+                for bounty_enum, contract_bounty in bounties:
+                    if contract_bounty is None:
+                        break
+                    urls_by_id[bounty_enum] = self.process(bounty_enum, contract_bounty, contents)
+                    last_id = bounty_enum
+                record_bounty_references(self.network, urls_by_id)
+                if last_id is not None:
+                    self.save_checkpoint(last_id)
+        return last_id
+
+
 class Command(BaseCommand):
 
     help = 'syncs bounties with geth'
@@ -60,40 +202,27 @@ class Command(BaseCommand):
             type=int,
             help="The end id.  If negative or 0, will be set to highest bounty id minus <x>"
         )
+        parser.add_argument('--resume', action='store_true', help='start after the last bounty id synced on the network')
+        parser.add_argument('--workers', type=int, default=8, help='how many contract reads and IPFS fetches to run at once')
+        parser.add_argument('--window', type=int, default=32, help='how many bounties to fetch together')
 
     def handle(self, *args, **options):
         # config
         network = options['network']
-        hour = datetime.datetime.now().hour
-        day = datetime.datetime.now().day
-        month = datetime.datetime.now().month
+        if (settings.DEBUG or settings.ENV != 'prod') and network == 'mainnet':
+            # mainnet bounties are only synced in prod
+            print("--*--")
+            return
 
         start_id = get_bounty_id(options['start_id'], network)
         end_id = get_bounty_id(options['end_id'], network)
-
-        # iterate through all the bounties
-        bounty_enum = int(start_id)
-        print(f"syncing from {start_id} to {end_id}")
-        more_bounties = True
-        while more_bounties:
-            try:
-                # pull and process each bounty
-                print(f"[{month}/{day} {hour}:00] Getting bounty {bounty_enum}")
-                bounty = get_bounty(bounty_enum, network)
-                print(f"[{month}/{day} {hour}:00] Processing bounty {bounty_enum}")
-                web3_process_bounty(bounty)
-
-            except BountyNotFoundException:
-                more_bounties = False
-            except UnsupportedSchemaException as e:
-                logger.info(f"* Unsupported Schema => {e}")
-            except Exception as e:
-                extra_data = {'bounty_enum': bounty_enum, 'more_bounties': more_bounties, 'network': network}
-                logger.error('Failed to fetch github username', exc_info=True, extra=extra_data)
-                logger.error(f"* Exception in sync_geth => {e}")
-            finally:
-                # prepare for next loop
-                bounty_enum += 1
-
-                if bounty_enum > int(end_id):
-                    more_bounties = False
+        if options['resume']:
+            checkpoint = get_checkpoint(network)
+            if checkpoint is not None:
+                start_id = max(start_id, checkpoint + 1)
+
+        now = datetime.datetime.now()
+        print(f"[{now.month}/{now.day} {now.hour}:00] syncing from {start_id} to {end_id}")
+        syncer = BountySyncer(network, workers=options['workers'], window=options['window'])
+        last_id = syncer.sync(int(start_id), int(end_id))
+        print(f"synced up to bounty {last_id}")
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.4 on 2020-04-02 12:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0091_merge_20200316_1102'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='activity',
+            index_together={
+                ('hidden', 'created_on', 'id'),
+                ('activity_type', 'created_on', 'id'),
+                ('hackathonevent', 'created_on', 'id'),
+                ('profile', 'created_on', 'id'),
+            },
+        ),
+    ]
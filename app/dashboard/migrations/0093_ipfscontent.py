@@ -0,0 +1,27 @@
+# Generated by Django 2.2.4 on 2020-04-02 12:00
+
+from django.db import migrations, models
+import economy.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0092_activity_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IPFSContent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(db_index=True, default=economy.models.get_time)),
+                ('modified_on', models.DateTimeField(default=economy.models.get_time)),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('content', models.TextField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
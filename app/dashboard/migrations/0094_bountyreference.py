@@ -0,0 +1,29 @@
+# Generated by Django 2.2.4 on 2020-04-03 12:00
+
+from django.db import migrations, models
+import economy.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0093_ipfscontent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BountyReference',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(db_index=True, default=economy.models.get_time)),
+                ('modified_on', models.DateTimeField(default=economy.models.get_time)),
+                ('network', models.CharField(max_length=255)),
+                ('standard_bounties_id', models.IntegerField()),
+                ('url', models.URLField(max_length=500)),
+            ],
+            options={
+                'unique_together': {('network', 'standard_bounties_id')},
+                'index_together': {('network', 'url')},
+            },
+        ),
+    ]
@@ -19,6 +19,7 @@
 from __future__ import unicode_literals
 
 import base64
+import binascii
 import collections
 import json
 import logging
@@ -44,6 +45,7 @@ from django.templatetags.static import static
 from django.urls import reverse
 from django.urls.exceptions import NoReverseMatch
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 
@@ -1843,27 +1845,6 @@ def psave_bounty(sender, instance, **kwargs):
             if profiles.exists():
                 instance.bounty_owner_profile = profiles.first()
 
-    from django.contrib.contenttypes.models import ContentType
-    from search.models import SearchResult
-    ct = ContentType.objects.get(app_label='dashboard', model='bounty')
-    if instance.current_bounty and instance.pk:
-        SearchResult.objects.update_or_create(
-            source_type=ct,
-            source_id=instance.pk,
-            defaults={
-                "created_on":instance.web3_created,
-                "title":instance.title,
-                "description":instance.issue_description,
-                "url":instance.url,
-                "visible_to":None,
-                'img_url': instance.get_avatar_url(True),
-            }
-            )
-        # delete any old bounties
-        if instance.prev_bounty and instance.prev_bounty.pk:
-            for sr in SearchResult.objects.filter(source_type=ct, source_id=instance.prev_bounty.pk):
-                sr.delete()
-
 
 @receiver(post_save, sender=BountyFulfillment, dispatch_uid="psave_bounty_fulfill")
 def psave_bounty_fulfilll(sender, instance, **kwargs):
@@ -2043,6 +2024,57 @@ class ActivityQuerySet(models.QuerySet):
 
         return posts
 
+    def feed_page(self, cursor=None, page_size=7):
+        """Return a page of the activity feed and the cursor of the page after it.
+
+        Pages are keyed on (created_on, pk) instead of an OFFSET, so a deep
+        page costs the same index range scan as the first one.
+
+        Args:
+            cursor (str): The opaque cursor returned with the previous page,
+                or None for the newest activities.
+            page_size (int): The number of activities per page.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+
+        Returns:
+            tuple: The list of activities and the next cursor, None on the last page.
+
+        """
+        activities = self.order_by('-created_on', '-pk')
+        if cursor:
+            created_on, pk = decode_feed_cursor(cursor)
+            activities = activities.filter(Q(created_on__lt=created_on) | Q(created_on=created_on, pk__lt=pk))
+        page = list(activities[:page_size + 1])
+        next_cursor = encode_feed_cursor(page[page_size - 1]) if len(page) > page_size else None
+        return page[:page_size], next_cursor
+
+
+def encode_feed_cursor(activity):
+    """Encode the (created_on, pk) position of an activity as an opaque feed cursor."""
+    position = f"{activity.created_on.isoformat()}|{activity.pk}"
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('utf-8').rstrip('=')
+
+
+def decode_feed_cursor(cursor):
+    """Decode a feed cursor into its (created_on, pk) position.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_on, pk = position.split('|')
+        created_on = parse_datetime(created_on)
+        pk = int(pk)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f'invalid feed cursor {cursor}') from e
+    if not created_on:
+        raise ValueError(f'invalid feed cursor {cursor}')
+    return created_on, pk
+
 
 class Activity(SuperModel):
     """Represent Start work/Stop work event.
@@ -2164,6 +2196,17 @@ class Activity(SuperModel):
     # Activity QuerySet Manager
     objects = ActivityQuerySet.as_manager()
 
+    class Meta:
+        """Define metadata associated with Activity."""
+
+        # match the (created_on, pk) keyset of ActivityQuerySet.feed_page for each feed tab
+        index_together = [
+            ["hidden", "created_on", "id"],
+            ["activity_type", "created_on", "id"],
+            ["hackathonevent", "created_on", "id"],
+            ["profile", "created_on", "id"],
+        ]
+
     def __str__(self):
         """Define the string representation of an interested profile."""
         return f"{self.profile.handle} type: {self.activity_type} created: {naturalday(self.created)} " \
@@ -2259,23 +2302,67 @@ class Activity(SuperModel):
             return vp
 
         vp.metadata['liked'] = False
-        if self.likes.exists():
-            vp.metadata['liked'] = self.likes.filter(profile=user.profile).exists()
-            vp.metadata['likes_title'] = "Liked by " + ",".join(self.likes.values_list('profile__handle', flat=True)) + '. '
+        # (profile_id, handle) pairs attached by view_props_for_many
+        likers = getattr(self, '_likers', None)
+        if likers is None:
+            likers = list(self.likes.values_list('profile_id', 'profile__handle'))
+        if likers:
+            vp.metadata['liked'] = any(profile_id == user.profile.pk for profile_id, _ in likers)
+            vp.metadata['likes_title'] = "Liked by " + ",".join(handle for _, handle in likers) + '. '
         vp.metadata['poll_answered'] = self.has_voted(user)
         return vp
 
+    @classmethod
+    def view_props_for_many(cls, activities, user):
+        """Apply view_props_for to a page of activities in a constant number of queries.
+
+        The likers and tips of the whole page are fetched in one query each
+        and attached to every activity, so neither view_props_for nor
+        tip_count_usd / tip_count_eth query per row.
+
+        Args:
+            activities (iterable): The Activity objects of the page.
+            user (User): The user viewing the page.
+
+        Returns:
+            list: The activities, with their view props set.
+
+        """
+        from townsquare.models import Like
+        activities = list(activities)
+        pks = [activity.pk for activity in activities]
+
+        likers = collections.defaultdict(list)
+        if user.is_authenticated:
+            likes = Like.objects.filter(activity_id__in=pks).order_by('pk')
+            for activity_id, profile_id, handle in likes.values_list('activity_id', 'profile_id', 'profile__handle'):
+                likers[activity_id].append((profile_id, handle))
+
+        tips = collections.defaultdict(list)
+        network = 'rinkeby' if settings.DEBUG else 'mainnet'
+        for tip in Tip.objects.filter(comments_priv__in=[f"activity:{pk}" for pk in pks], network=network):
+            tips[int(tip.comments_priv.split(':')[1])].append(tip)
+
+        for activity in activities:
+            activity._likers = likers[activity.pk]
+            activity._tips = tips[activity.pk]
+        return [activity.view_props_for(user) for activity in activities]
+
+    @property
+    def activity_tips(self):
+        tips = getattr(self, '_tips', None)
+        if tips is None:
+            network = 'rinkeby' if settings.DEBUG else 'mainnet'
+            tips = list(Tip.objects.filter(comments_priv=f"activity:{self.pk}", network=network))
+        return tips
+
     @property
     def tip_count_usd(self):
-        network = 'rinkeby' if settings.DEBUG else 'mainnet'
-        tips = Tip.objects.filter(comments_priv=f"activity:{self.pk}", network=network)
-        return sum([tip.value_in_usdt for tip in tips])
+        return sum([tip.value_in_usdt for tip in self.activity_tips])
 
     @property
     def tip_count_eth(self):
-        network = 'rinkeby' if settings.DEBUG else 'mainnet'
-        tips = Tip.objects.filter(comments_priv=f"activity:{self.pk}", network=network)
-        return sum([tip.value_in_eth for tip in tips])
+        return sum([tip.value_in_eth for tip in self.activity_tips])
 
     @property
     def secondary_avatar_url(self):
@@ -4061,22 +4148,6 @@ def psave_profile(sender, instance, **kwargs):
     instance.handle = instance.handle.replace('@', '')
     instance.handle = instance.handle.lower()
 
-    from django.contrib.contenttypes.models import ContentType
-    from search.models import SearchResult
-    if instance.pk:
-        SearchResult.objects.update_or_create(
-            source_type=ContentType.objects.get(app_label='dashboard', model='profile'),
-            source_id=instance.pk,
-            defaults={
-                "created_on":instance.created_on,
-                "title":instance.handle,
-                "description":instance.desc,
-                "url":instance.url,
-                "visible_to":None,
-                'img_url': instance.avatar_url,
-            }
-            )
-
 @receiver(user_logged_in)
 def post_login(sender, request, user, **kwargs):
     """Handle actions to take on user login."""
@@ -4463,25 +4534,6 @@ class HackathonEvent(SuperModel):
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
-# method for updating
-@receiver(pre_save, sender=HackathonEvent, dispatch_uid="psave_hackathonevent")
-def psave_hackathonevent(sender, instance, **kwargs):
-
-    from django.contrib.contenttypes.models import ContentType
-    from search.models import SearchResult
-    if instance.pk:
-        SearchResult.objects.update_or_create(
-            source_type=ContentType.objects.get(app_label='dashboard', model='hackathonevent'),
-            source_id=instance.pk,
-            defaults={
-                "created_on":instance.created_on,
-                "title":instance.name,
-                "description":instance.stats['range'],
-                "url":instance.onboard_url,
-                "visible_to":None,
-                'img_url': instance.logo.url if instance.logo else None,
-            }
-            )
 
 class HackathonSponsor(SuperModel):
     SPONSOR_TYPES = [
@@ -4769,3 +4821,28 @@ class TribeMember(SuperModel):
         max_length=20,
         blank=True
     )
+
+
+class IPFSContent(SuperModel):
+    """Cache the content of an IPFS hash, which never changes, see dashboard.utils.ipfs_cat."""
+
+    key = models.CharField(max_length=255, unique=True)
+    content = models.TextField()
+
+    def __str__(self):
+        return self.key
+
+
+class BountyReference(SuperModel):
+    """Index the webReferenceURL of each StandardBounties bounty, see dashboard.utils.get_bounty_id."""
+
+    network = models.CharField(max_length=255)
+    standard_bounties_id = models.IntegerField()
+    url = models.URLField(max_length=500)
+
+    class Meta:
+        unique_together = ('network', 'standard_bounties_id')
+        index_together = [('network', 'url')]
+
+    def __str__(self):
+        return f"{self.network} {self.standard_bounties_id}: {self.url}"
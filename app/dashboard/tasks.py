@@ -96,3 +96,19 @@ def profile_dict(self, pk, retry: bool = True) -> None:
         if profile.frontend_calc_stale:
             profile.calculate_all()
             profile.save()
+
+
+@app.shared_task(bind=True, max_retries=3)
+def record_visits(self, retry: bool = True) -> None:
+    """
+    :param self:
+    :return:
+    """
+    from dashboard.utils import record_queued_visits
+    with redis.lock("tasks:record_visits", timeout=LOCK_TIMEOUT):
+        try:
+            recorded = record_queued_visits()
+        except Exception as e:
+            logger.exception(e)
+            raise self.retry(countdown=30)
+        logger.info(f'recorded {recorded} visits')
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Handle pagerank command related tests.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+from dashboard.management.commands.create_pagerank import get_exponent, pagerank
+from test_plus.test import TestCase
+
+
+class CreatePagerankTest(TestCase):
+    """Define tests for the pagerank power iteration."""
+
+    def test_pagerank_spreads_grand_total_weight(self):
+        edges = [('a', 'b', 10.0), ('b', 'c', 5.0), ('c', 'a', 1.0), ('a', 'c', 2.0)]
+        ranks = pagerank(edges)
+
+        # every node's outgoing value plus its 20% random walk share
+        self.assertAlmostEqual(sum(ranks.values()), (10 + 5 + 1 + 2) * 1.2)
+        self.assertGreater(ranks['b'], ranks['a'])
+
+    def test_pagerank_is_deterministic(self):
+        edges = [('a', 'b', 3.0), ('b', 'a', 1.0), ('c', 'b', 7.0)]
+
+        self.assertEqual(pagerank(edges), pagerank(edges))
+
+    def test_pagerank_without_edges(self):
+        self.assertEqual(pagerank([]), {})
+
+    def test_get_exponent(self):
+        self.assertEqual(get_exponent(1), 1)
+        self.assertEqual(get_exponent(26), 3)
@@ -20,14 +20,16 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 from datetime import date, datetime, timedelta
 
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.humanize.templatetags.humanize import naturaltime
 from django.utils import timezone
 
 import pytz
 from avatar.models import CustomAvatar, SocialAvatar
-from dashboard.models import Bounty, BountyFulfillment, Interest, Profile, Tip, Tool, ToolVote
+from dashboard.models import Activity, Bounty, BountyFulfillment, Interest, Profile, Tip, Tool, ToolVote
 from economy.models import ConversionRate, Token
 from test_plus.test import TestCase
+from townsquare.models import Like
 
 
 class DashboardModelsTest(TestCase):
@@ -479,6 +481,61 @@ class DashboardModelsTest(TestCase):
         assert profile.github_url == 'https://github.com/gitcoinco'
         assert profile.get_relative_url() == '/gitcoinco'
 
+    def test_activity_view_props_for_many(self):
+        """Test the batched Activity view props."""
+        user = User.objects.create(username='fred')
+        profile = Profile.objects.create(user=user, handle='fred', data={})
+        other_profile = Profile.objects.create(handle='alice', data={})
+        activities = [
+            Activity.objects.create(profile=profile, activity_type='status_update', metadata={'title': str(i)})
+            for i in range(3)
+        ]
+        Like.objects.create(profile=other_profile, activity=activities[0])
+        Like.objects.create(profile=profile, activity=activities[0])
+        Like.objects.create(profile=other_profile, activity=activities[1])
+        Tip.objects.create(
+            emails=['foo@bar.com'],
+            tokenName='ETH',
+            amount=3,
+            network='mainnet',
+            comments_priv=f'activity:{activities[1].pk}',
+            expires_date=datetime.now(tz=pytz.UTC) + timedelta(days=1),
+        )
+
+        page = list(Activity.objects.filter(pk__in=[a.pk for a in activities]).order_by('pk'))
+        # one query for the likes and one for the tips of the whole page
+        with self.assertNumQueries(2):
+            activities = Activity.view_props_for_many(page, user)
+
+        assert [activity.metadata.get('liked') for activity in activities] == [True, False, False]
+        assert activities[0].metadata['likes_title'] == 'Liked by alice,fred. '
+        assert 'likes_title' not in activities[2].metadata
+        with self.assertNumQueries(0):
+            assert [activity.tip_count_eth for activity in activities] == [0, 3, 0]
+
+    def test_activity_feed_page(self):
+        """Test the keyset paginated activity feed."""
+        profile = Profile.objects.create(handle='fred', data={})
+        created_on = timezone.now()
+        activities = [
+            Activity.objects.create(
+                profile=profile, activity_type='status_update', metadata={'title': str(i)}, created_on=created_on
+            )
+            for i in range(5)
+        ]
+
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = Activity.objects.feed_page(cursor, page_size=2)
+            pages.append([activity.pk for activity in page])
+            if not cursor:
+                break
+
+        assert pages == [[activities[4].pk, activities[3].pk], [activities[2].pk, activities[1].pk], [activities[0].pk]]
+        with self.assertRaises(ValueError):
+            Activity.objects.feed_page('not a cursor')
+
     def test_tool(self):
         """Test the dashboard Tool model."""
         tool = Tool.objects.create(
@@ -17,20 +17,23 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
+import json
 from datetime import datetime
 from unittest.mock import patch
 
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.test.client import RequestFactory
 from django.utils import timezone
 
 import ipfshttpclient
 import pytest
-from dashboard.models import Bounty, Profile
+from dashboard import utils
+from dashboard.models import Activity, Bounty, IPFSContent, Profile, UserAction
 from dashboard.utils import (
     IPFSCantConnectException, apply_new_bounty_deadline, clean_bounty_url, create_user_action, get_bounty, get_ipfs,
-    get_ordinal_repr, get_web3, getBountyContract, humanize_event_name, ipfs_cat_ipfsapi, re_market_bounty,
-    release_bounty_to_the_public,
+    get_ordinal_repr, get_web3, getBountyContract, humanize_event_name, ipfs_cat, ipfs_cat_ipfsapi, ipfs_cat_many,
+    re_market_bounty, record_queued_visits, record_visits_batch, release_bounty_to_the_public,
 )
 from pytz import UTC
 from test_plus.test import TestCase
@@ -297,3 +300,77 @@ class DashboardUtilsTest(TestCase):
         assert bounty.bounty_reserved_for_user is None
         assert bounty.reserved_for_user_from is None
         assert bounty.reserved_for_user_expiration is None
+
+    def test_ipfs_cat_is_cached(self):
+        utils._ipfs_contents.clear()
+        with patch.object(utils, 'fetch_ipfs', return_value=b'{"title": "cached"}') as fetch_ipfs:
+            assert ipfs_cat('QmCached') == '{"title": "cached"}'
+            utils._ipfs_contents.clear()
+            assert ipfs_cat('QmCached') == '{"title": "cached"}'
+            with self.assertNumQueries(0):
+                assert ipfs_cat('QmCached') == '{"title": "cached"}'
+        assert fetch_ipfs.call_count == 1
+
+    def test_ipfs_cat_many_only_fetches_missing_hashes(self):
+        utils._ipfs_contents.clear()
+        IPFSContent.objects.create(key='QmStored', content='stored')
+        with patch.object(utils, 'fetch_ipfs', side_effect=['fetched', None]) as fetch_ipfs:
+            contents = ipfs_cat_many(['QmStored', 'QmNew', 'QmNew'])
+            assert contents['QmStored'] == 'stored'
+            assert contents['QmNew'] == 'fetched'
+            assert ipfs_cat_many(['QmMissing']) == {'QmMissing': None}
+        assert fetch_ipfs.call_count == 2
+        assert set(IPFSContent.objects.values_list('key', flat=True)) == {'QmStored', 'QmNew'}
+
+    @patch('dashboard.tasks.profile_dict.delay')
+    @patch('dashboard.utils.get_locations_from_ips', return_value={'1.1.1.1': {'city': 'Sydney'}})
+    def test_record_visits_batch(self, get_locations_from_ips, profile_dict):
+        user = self.make_user('visitor')
+        profile = Profile.objects.create(user=user, handle='visitor', data={})
+        visit = {
+            'profile_id': profile.pk,
+            'user_id': user.pk,
+            'ip_address': '1.1.1.1',
+            'utm': None,
+            'metadata': {'path': '/'},
+            'created_on': timezone.now().isoformat(),
+        }
+
+        record_visits_batch([visit, dict(visit, metadata={'path': '/explorer'})])
+
+        action = UserAction.objects.get(profile=profile, action='Visit')
+        assert action.location_data == {'city': 'Sydney'}
+        assert action.metadata == {'path': '/'}
+        profile.refresh_from_db()
+        assert profile.last_visit
+        assert Activity.objects.filter(profile=profile, activity_type='joined').count() == 1
+        profile_dict.assert_called_once_with(profile.pk)
+
+        record_visits_batch([visit])
+        assert Activity.objects.filter(profile=profile, activity_type='joined').count() == 1
+
+    @patch('dashboard.tasks.profile_dict.delay')
+    @patch('dashboard.utils.get_locations_from_ips', return_value={'1.1.1.1': {}})
+    @patch('dashboard.utils.redis')
+    def test_record_queued_visits_drops_failing_visits(self, redis, get_locations_from_ips, profile_dict):
+        visits = []
+        for handle in ['deleted', 'visitor']:
+            user = self.make_user(handle)
+            profile = Profile.objects.create(user=user, handle=handle, data={})
+            visits.append({
+                'profile_id': profile.pk,
+                'user_id': user.pk,
+                'ip_address': '1.1.1.1',
+                'utm': None,
+                'metadata': {},
+                'created_on': timezone.now().isoformat(),
+            })
+        deleted_profile_id = visits[0]['profile_id']
+        User.objects.filter(pk=visits[0]['user_id']).delete()
+        events = [json.dumps(visit) for visit in visits] + ['not a visit']
+        redis.pipeline.return_value.execute.side_effect = [(events, True), ([], True)]
+
+        assert record_queued_visits() == 2
+        assert UserAction.objects.get(profile_id=deleted_profile_id, action='Visit').user is None
+        assert UserAction.objects.filter(profile_id=visits[1]['profile_id'], action='Visit').exists()
+        redis.rpush.assert_not_called()
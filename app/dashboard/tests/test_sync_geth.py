@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Handle sync_geth related tests.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from dashboard import utils
+from dashboard.management.commands.sync_geth import BountySyncer, get_checkpoint
+from dashboard.utils import get_bounty_id, get_bounty_references_watermark
+from test_plus.test import TestCase
+from web3.exceptions import BadFunctionCallOutput
+
+
+class FakeStandardBounties:
+    """Answer StandardBounties calls for bounties 0 to num_bounties - 1, with one fulfillment each."""
+
+    def __init__(self, num_bounties):
+        self.num_bounties = num_bounties
+        self.functions = SimpleNamespace(
+            getNumBounties=lambda: self.result(num_bounties),
+            getBounty=self.getBounty,
+            getBountyData=lambda i: self.result(f'bounty-{i}'),
+            getBountyArbiter=lambda i: self.result('0x0'),
+            getBountyToken=lambda i: self.result('0x0'),
+            getNumFulfillments=lambda i: self.result(1),
+            getFulfillment=lambda i, f: self.result((False, '0x1', 'fulfillment')),
+        )
+
+    @staticmethod
+    def result(value):
+        return SimpleNamespace(call=lambda: value)
+
+    def getBounty(self, bounty_enum):
+        if bounty_enum >= self.num_bounties:
+            def not_found():
+                raise BadFunctionCallOutput
+            return SimpleNamespace(call=not_found)
+        return self.result(('0x2', 100 + bounty_enum, 1, False, 1, 1))
+
+
+class SyncGethTest(TestCase):
+    """Define tests for the sync_geth bounty syncer."""
+
+    def setUp(self):
+        self.cats = []
+
+    def cat(self, key):
+        self.cats.append(key)
+        return json.dumps({'key': key})
+
+    @patch('dashboard.management.commands.sync_geth.web3_process_bounty')
+    def test_sync(self, web3_process_bounty):
+        syncer = BountySyncer('rinkeby', contract=FakeStandardBounties(5), cat=self.cat, workers=2, window=2)
+
+        assert syncer.sync(1, 100) == 4
+
+        bounties = [call[0][0] for call in web3_process_bounty.call_args_list]
+        assert [bounty['id'] for bounty in bounties] == [1, 2, 3, 4]
+        assert bounties[0]['data'] == {'key': 'bounty-1'}
+        assert bounties[0]['contract_deadline'] == 101
+        assert bounties[0]['fulfillments'][0]['data'] == {'key': 'fulfillment'}
+        # the fulfillment data shared by every bounty is fetched once per window
+        assert self.cats.count('fulfillment') == 2
+        assert get_checkpoint('rinkeby') == 4
+
+    @patch('dashboard.management.commands.sync_geth.web3_process_bounty')
+    def test_sync_end_id(self, web3_process_bounty):
+        syncer = BountySyncer('rinkeby', contract=FakeStandardBounties(5), cat=self.cat, checkpoint=False)
+
+        assert syncer.sync(0, 2) == 2
+        assert web3_process_bounty.call_count == 3
+        assert get_checkpoint('rinkeby') is None
+
+    @patch('dashboard.utils.fetch_ipfs')
+    @patch('dashboard.utils.getBountyContract')
+    def test_get_bounty_id_from_index(self, getBountyContract, fetch_ipfs):
+        utils._ipfs_contents.clear()
+        getBountyContract.return_value = FakeStandardBounties(5)
+        fetch_ipfs.side_effect = lambda key: json.dumps({
+            'payload': {'webReferenceURL': f'https://github.com/gitcoinco/web/issues/{key}/'},
+        })
+
+        assert get_bounty_id('https://github.com/gitcoinco/web/issues/bounty-3', 'rinkeby') == 3
+        assert get_bounty_references_watermark('rinkeby') == 4
+
+        getBountyContract.reset_mock()
+        assert get_bounty_id('https://github.com/gitcoinco/web/issues/bounty-1/', 'rinkeby') == 1
+        assert getBountyContract.call_count == 0
+        assert fetch_ipfs.call_count == 5
+
+    @patch('dashboard.utils.MAX_BOUNTY_REFERENCES_SCANNED_IN_REQUEST', 2)
+    @patch('dashboard.utils.fetch_ipfs')
+    @patch('dashboard.utils.getBountyContract')
+    def test_get_bounty_id_scans_the_newest_bounties(self, getBountyContract, fetch_ipfs):
+        utils._ipfs_contents.clear()
+        getBountyContract.return_value = FakeStandardBounties(5)
+        fetch_ipfs.side_effect = lambda key: None if key == 'bounty-3' else json.dumps({
+            'payload': {'webReferenceURL': f'https://github.com/gitcoinco/web/issues/{key}/'},
+        })
+
+        assert get_bounty_id('https://github.com/gitcoinco/web/issues/bounty-4', 'rinkeby') == 4
+        # bounty-3 could not be fetched, it is retried and then skipped
+        assert fetch_ipfs.call_count == 4
+        assert get_bounty_id('https://github.com/gitcoinco/web/issues/bounty-1', 'rinkeby') is None
+        # the older bounties are left to index_bounty_references
+        assert get_bounty_references_watermark('rinkeby') is None
@@ -21,24 +21,35 @@ import base64
 import json
 import logging
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from json.decoder import JSONDecodeError
 
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
 from django.urls import URLPattern, URLResolver
 from django.utils import timezone
 
 import ipfshttpclient
 import requests
-from app.utils import sync_profile
+from app.redis_service import RedisService
+from app.utils import get_locations_from_ips, sync_profile
 from avatar.models import CustomAvatar
 from compliance.models import Country, Entity
-from dashboard.helpers import UnsupportedSchemaException, normalize_url, process_bounty_changes, process_bounty_details
-from dashboard.models import Activity, BlockedUser, Bounty, BountyFulfillment, Profile, UserAction
+from dashboard.helpers import normalize_url, process_bounty_changes, process_bounty_details
+from dashboard.models import (
+    Activity, BlockedUser, Bounty, BountyFulfillment, BountyReference, IPFSContent, Profile, UserAction,
+)
 from eth_utils import to_checksum_address
 from gas.utils import conf_time_spread, eth_usd_conv_rate, gas_advisories, recommend_min_gas_price_to_confirm_in_time
 from hexbytes import HexBytes
 from ipfshttpclient.exceptions import CommunicationError
+from perftools.utils import get_jsonstore, replace_jsonstore
 from pytz import UTC
+from redis import RedisError
+from retail.helpers import get_ip
 from web3 import HTTPProvider, Web3, WebsocketProvider
 from web3.exceptions import BadFunctionCallOutput
 from web3.middleware import geth_poa_middleware
@@ -47,6 +58,26 @@ from .notifications import maybe_market_to_slack
 
 logger = logging.getLogger(__name__)
 
+MAX_CACHED_IPFS_CONTENTS = 1024
+# JSONStore view holding the id up to which the bounties of each network are in the BountyReference index
+BOUNTY_REFERENCES_VIEW = 'bounty_references'
+# how many of the newest bounties get_bounty_id reads from the contract when the index misses
+MAX_BOUNTY_REFERENCES_SCANNED_IN_REQUEST = 25
+
+RECORD_VISIT_EVERY_N_SECONDS = 60 * 60
+# visits waiting for dashboard.tasks.record_visits, see queue_visit
+PENDING_VISITS_KEY = 'visits:pending'
+RECORD_VISITS_SCHEDULED_KEY = 'visits:pending:scheduled'
+# how long visits are collected before they are recorded in one batch
+RECORD_VISITS_DELAY = 10
+RECORD_VISITS_BATCH_SIZE = 500
+
+redis = RedisService().redis
+_ipfs_contents = OrderedDict()
+# the fetches in flight, by IPFS hash
+_ipfs_fetches = {}
+_ipfs_lock = threading.Lock()
+
 SEMAPHORE_BOUNTY_SALT = '1'
 SEMAPHORE_BOUNTY_NS = 'bounty_processor'
 
@@ -191,6 +222,119 @@ def _get_utm_from_cookie(request):
         return None
 
 
+def queue_visit(request, profile):
+    """Record a visit of profile in the background, at most once per RECORD_VISIT_EVERY_N_SECONDS.
+
+    The visit is appended to a redis list and recorded in batches by
+    dashboard.tasks.record_visits, so the request only pays for a few redis
+    calls. If redis is unavailable the visit is not recorded.
+
+    Returns:
+        bool: Whether the visit was queued.
+
+    """
+    visit = {
+        'profile_id': profile.pk,
+        'user_id': request.user.pk,
+        'ip_address': get_ip(request),
+        'utm': _get_utm_from_cookie(request),
+        'metadata': {
+            'useragent': request.META.get('HTTP_USER_AGENT'),
+            'referrer': request.META.get('HTTP_REFERER', None),
+            'path': request.META.get('PATH_INFO', None),
+        },
+        'created_on': timezone.now().isoformat(),
+    }
+    try:
+        if not redis.set(f'visits:queued:{profile.pk}', 1, nx=True, ex=RECORD_VISIT_EVERY_N_SECONDS):
+            # already queued by another request
+            return False
+        redis.rpush(PENDING_VISITS_KEY, json.dumps(visit))
+        if redis.set(RECORD_VISITS_SCHEDULED_KEY, 1, nx=True, ex=RECORD_VISITS_DELAY):
+            from dashboard.tasks import record_visits
+            record_visits.apply_async(countdown=RECORD_VISITS_DELAY)
+    except RedisError as e:
+        logger.warning(f'could not queue the visit of profile {profile.pk}: {e}')
+        return False
+    return True
+
+
+def record_visits_batch(visits):
+    """Record visits queued by queue_visit, at most one per profile.
+
+    The Visit UserActions are inserted at once and the last_visit of their
+    profiles is updated with one query. Profiles visiting for the first time
+    also get a joined Activity, and each profile is recalculated once. The
+    writes are atomic, and visits of users deleted since they were queued
+    are recorded without a user.
+
+    """
+    from dashboard.tasks import profile_dict
+    visits = {visit['profile_id']: visit for visit in reversed(visits)}
+    profiles = Profile.objects.filter(pk__in=list(visits.keys()))
+    profile_ids = set(profiles.values_list('pk', flat=True))
+    joined = list(profiles.filter(last_visit__isnull=True).values_list('pk', flat=True))
+    visits = {profile_id: visit for profile_id, visit in visits.items() if profile_id in profile_ids}
+    user_ids = set(User.objects.filter(
+        pk__in=[visit['user_id'] for visit in visits.values() if visit['user_id']]
+    ).values_list('pk', flat=True))
+    locations = get_locations_from_ips(visit['ip_address'] for visit in visits.values())
+
+    with transaction.atomic():
+        UserAction.objects.bulk_create([
+            UserAction(
+                user_id=visit['user_id'] if visit['user_id'] in user_ids else None,
+                profile_id=profile_id,
+                action='Visit',
+                location_data=locations[visit['ip_address']],
+                ip_address=visit['ip_address'],
+                utm=visit['utm'],
+                metadata=visit['metadata'],
+                created_on=visit['created_on'],
+            ) for profile_id, visit in visits.items()
+        ])
+        profiles.update(last_visit=timezone.now())
+        for profile_id in joined:
+            Activity.objects.create(profile_id=profile_id, activity_type='joined')
+    for profile_id in visits:
+        try:
+            profile_dict.delay(profile_id)
+        except Exception as e:
+            logger.exception(e)
+
+
+def record_queued_visits():
+    """Record every visit queued by queue_visit, in batches.
+
+    When a batch cannot be recorded its visits are recorded one by one, and
+    the ones that still fail are logged and dropped.
+
+    Returns:
+        int: The number of visits recorded.
+
+    """
+    recorded = 0
+    while True:
+        pipe = redis.pipeline()
+        pipe.lrange(PENDING_VISITS_KEY, 0, RECORD_VISITS_BATCH_SIZE - 1)
+        pipe.ltrim(PENDING_VISITS_KEY, RECORD_VISITS_BATCH_SIZE, -1)
+        events, _ = pipe.execute()
+        if not events:
+            return recorded
+        try:
+            record_visits_batch([json.loads(event) for event in events])
+            recorded += len(events)
+            continue
+        except Exception as e:
+            logger.warning(f'could not record {len(events)} visits, recording them one by one: {e}')
+        for event in events:
+            try:
+                record_visits_batch([json.loads(event)])
+                recorded += 1
+            except Exception as e:
+                logger.exception(f'dropping the visit {event}: {e}')
+
+
 def get_ipfs(host=None, port=settings.IPFS_API_PORT):
     """Establish a connection to IPFS.
 
@@ -221,7 +365,8 @@ def get_ipfs(host=None, port=settings.IPFS_API_PORT):
     return None
 
 
-def ipfs_cat(key):
+def fetch_ipfs(key):
+    """Fetch the content of an IPFS hash over the network, None if IPFS could not be reached."""
     try:
         # Attempt connecting to IPFS via Infura
         response, status_code = ipfs_cat_requests(key)
@@ -238,6 +383,121 @@ def ipfs_cat(key):
         logger.exception(e)
 
 
+def is_cacheable_ipfs_content(content):
+    return content is not None and 'Failed to get block' not in content
+
+
+def _remember_ipfs(key, content):
+    with _ipfs_lock:
+        _ipfs_contents[key] = content
+        _ipfs_contents.move_to_end(key)
+        while len(_ipfs_contents) > MAX_CACHED_IPFS_CONTENTS:
+            _ipfs_contents.popitem(last=False)
+
+
+def _recall_ipfs(key):
+    with _ipfs_lock:
+        if key in _ipfs_contents:
+            _ipfs_contents.move_to_end(key)
+            return _ipfs_contents[key]
+    return None
+
+
+def _fetch_and_store_ipfs(key):
+    content = fetch_ipfs(key)
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    if is_cacheable_ipfs_content(content):
+        IPFSContent.objects.get_or_create(key=key, defaults={'content': content})
+        _remember_ipfs(key, content)
+    return content
+
+
+def ipfs_cat(key):
+    """Return the content of an IPFS hash.
+
+    Content is addressed by its hash and never changes, so it is kept in
+    the IPFSContent table and an in process LRU once fetched. Concurrent
+    calls for the same hash share a single fetch.
+
+    Returns:
+        str: The content, or None if IPFS could not be reached.
+
+    """
+    content = _recall_ipfs(key)
+    if content is not None:
+        return content
+
+    with _ipfs_lock:
+        fetching = _ipfs_fetches.get(key)
+        if not fetching:
+            fetching = _ipfs_fetches[key] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        return fetching.result()
+
+    try:
+        stored = IPFSContent.objects.filter(key=key).values_list('content', flat=True).first()
+        if stored is not None:
+            _remember_ipfs(key, stored)
+            content = stored
+        else:
+            content = _fetch_and_store_ipfs(key)
+        fetching.set_result(content)
+        return content
+    except Exception as e:
+        fetching.set_exception(e)
+        raise
+    finally:
+        with _ipfs_lock:
+            _ipfs_fetches.pop(key, None)
+
+
+def ipfs_cat_many(keys, pool=None):
+    """Prefetch the content of many IPFS hashes.
+
+    Hashes are looked up in the in process LRU, then in the IPFSContent
+    table with a single query, and only the remaining ones are fetched over
+    the network, on pool when given. The network fetches do not touch the
+    DB, so the pool threads need no connection of their own.
+
+    Args:
+        keys (iterable): The IPFS hashes.
+        pool (concurrent.futures.Executor): Runs the network fetches.
+
+    Returns:
+        dict: The content of each hash, None for those IPFS could not serve.
+
+    """
+    contents = {}
+    missing = []
+    for key in set(keys):
+        content = _recall_ipfs(key)
+        if content is None:
+            missing.append(key)
+        else:
+            contents[key] = content
+
+    for key, content in IPFSContent.objects.filter(key__in=missing).values_list('key', 'content'):
+        _remember_ipfs(key, content)
+        contents[key] = content
+    missing = [key for key in missing if key not in contents]
+
+    fetched = pool.map(fetch_ipfs, missing) if pool else map(fetch_ipfs, missing)
+    new_contents = []
+    for key, content in zip(missing, fetched):
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        contents[key] = content
+        if is_cacheable_ipfs_content(content):
+            _remember_ipfs(key, content)
+            new_contents.append(IPFSContent(key=key, content=content))
+    IPFSContent.objects.bulk_create(new_contents, ignore_conflicts=True)
+    return contents
+
+
 def ipfs_cat_ipfsapi(key):
     ipfs = get_ipfs()
     if ipfs:
@@ -373,7 +633,23 @@ def get_bounty(bounty_enum, network):
         return {}
 
     standard_bounties = getBountyContract(network)
+    return assemble_bounty(read_bounty_contract(standard_bounties, bounty_enum), network)
+
+
+def read_bounty_contract(standard_bounties, bounty_enum):
+    """Read a bounty and its fulfillments from the StandardBounties contract.
+
+    Args:
+        standard_bounties (web3.contract.Contract): The contract, as returned by getBountyContract.
+        bounty_enum (int): The bounty id.
+
+    Raises:
+        BountyNotFoundException: If the contract has no such bounty.
+
+    Returns:
+        dict: The on chain fields; the bounty and fulfillment data are still IPFS hashes.
 
+    """
     try:
         issuer, contract_deadline, fulfillmentAmount, paysTokens, bountyStage, balance = standard_bounties.functions.getBounty(bounty_enum).call()
     except BadFunctionCallOutput:
@@ -382,18 +658,59 @@ def get_bounty(bounty_enum, network):
     bountydata = standard_bounties.functions.getBountyData(bounty_enum).call()
     arbiter = standard_bounties.functions.getBountyArbiter(bounty_enum).call()
     token = standard_bounties.functions.getBountyToken(bounty_enum).call()
-    bounty_data_str = ipfs_cat(bountydata)
-    bounty_data = json.loads(bounty_data_str)
 
     # fulfillments
     num_fulfillments = int(standard_bounties.functions.getNumFulfillments(bounty_enum).call())
     fulfillments = []
     for fulfill_enum in range(0, num_fulfillments):
-
-        # pull from blockchain
         accepted, fulfiller, data = standard_bounties.functions.getFulfillment(bounty_enum, fulfill_enum).call()
+        fulfillments.append({
+            'id': fulfill_enum,
+            'accepted': accepted,
+            'fulfiller': fulfiller,
+            'data': data,
+        })
+
+    return {
+        'id': bounty_enum,
+        'issuer': issuer,
+        'contract_deadline': contract_deadline,
+        'fulfillmentAmount': fulfillmentAmount,
+        'paysTokens': paysTokens,
+        'bountyStage': bountyStage,
+        'balance': balance,
+        'data': bountydata,
+        'arbiter': arbiter,
+        'token': token,
+        'fulfillments': fulfillments,
+    }
+
+
+def assemble_bounty(contract_bounty, network, cat=None):
+    """Resolve the IPFS data of a bounty read by read_bounty_contract.
+
+    Args:
+        contract_bounty (dict): The on chain fields of the bounty.
+        network (str): The network the bounty was read from.
+        cat (callable): Returns the content of an IPFS hash, ipfs_cat by default.
+
+    Raises:
+        IPFSCantConnectException: If IPFS could not be reached.
+
+    Returns:
+        dict: The bounty, as processed by web3_process_bounty.
+
+    """
+    cat = cat or ipfs_cat
+    bounty_data_str = cat(contract_bounty['data'])
+    bounty_data = json.loads(bounty_data_str)
+
+    # fulfillments
+    fulfillments = []
+    for fulfillment in contract_bounty['fulfillments']:
+        data = fulfillment['data']
         try:
-            data_str = ipfs_cat(data)
+            data_str = cat(data)
             data = json.loads(data_str)
         except JSONDecodeError:
             logger.error(f'Could not get {data} from ipfs')
@@ -403,12 +720,7 @@ def get_bounty(bounty_enum, network):
         if 'Failed to get block' in str(data_str):
             raise IPFSCantConnectException("Failed to connect to IPFS")
 
-        fulfillments.append({
-            'id': fulfill_enum,
-            'accepted': accepted,
-            'fulfiller': fulfiller,
-            'data': data,
-        })
+        fulfillments.append(dict(fulfillment, data=data))
 
     # validation
     if 'Failed to get block' in str(bounty_data_str):
@@ -416,24 +728,24 @@ def get_bounty(bounty_enum, network):
 
     # https://github.com/Bounties-Network/StandardBounties/issues/25
     ipfs_deadline = bounty_data.get('payload', {}).get('expire_date', False)
-    deadline = contract_deadline
+    deadline = contract_bounty['contract_deadline']
     if ipfs_deadline:
         deadline = ipfs_deadline
 
     # assemble the data
     bounty = {
-        'id': bounty_enum,
-        'issuer': issuer,
+        'id': contract_bounty['id'],
+        'issuer': contract_bounty['issuer'],
         'deadline': deadline,
-        'contract_deadline': contract_deadline,
+        'contract_deadline': contract_bounty['contract_deadline'],
         'ipfs_deadline': ipfs_deadline,
-        'fulfillmentAmount': fulfillmentAmount,
-        'paysTokens': paysTokens,
-        'bountyStage': bountyStage,
-        'balance': balance,
+        'fulfillmentAmount': contract_bounty['fulfillmentAmount'],
+        'paysTokens': contract_bounty['paysTokens'],
+        'bountyStage': contract_bounty['bountyStage'],
+        'balance': contract_bounty['balance'],
         'data': bounty_data,
-        'arbiter': arbiter,
-        'token': token,
+        'arbiter': contract_bounty['arbiter'],
+        'token': contract_bounty['token'],
         'fulfillments': fulfillments,
         'network': network,
         'review': bounty_data.get('review',{}),
@@ -536,26 +848,36 @@ def sync_etc_payout(fulfillment):
 
 
 def get_bounty_id(issue_url, network):
+    """Return the StandardBounties id of the bounty for issue_url, or None.
+
+    Bounties are looked up in the DB first, then in the BountyReference
+    index, and only the bounties created since the index was last updated
+    are read from the contract. When the index is further behind than
+    MAX_BOUNTY_REFERENCES_SCANNED_IN_REQUEST bounties, only the newest ones
+    are read, the rest is left to the index_bounty_references command.
+
+    """
     issue_url = normalize_url(issue_url)
     bounty_id = get_bounty_id_from_db(issue_url, network)
     if bounty_id:
         return bounty_id
 
-    all_known_stdbounties = Bounty.objects.filter(
-        web3_type='bounties_network',
-        network=network,
-    ).nocache().order_by('-standard_bounties_id')
+    bounty_id = get_bounty_id_from_index(issue_url, network)
+    if bounty_id is not None:
+        return bounty_id
 
     try:
         highest_known_bounty_id = get_highest_known_bounty_id(network)
-        bounty_id = get_bounty_id_from_web3(issue_url, network, highest_known_bounty_id, direction='down')
     except NoBountiesException:
-        last_known_bounty_id = 0
-        if all_known_stdbounties.exists():
-            last_known_bounty_id = all_known_stdbounties.first().standard_bounties_id
-        bounty_id = get_bounty_id_from_web3(issue_url, network, last_known_bounty_id, direction='up')
+        return None
 
-    return bounty_id
+    watermark = get_bounty_references_watermark(network)
+    next_id = 0 if watermark is None else watermark + 1
+    if highest_known_bounty_id - next_id < MAX_BOUNTY_REFERENCES_SCANNED_IN_REQUEST:
+        return update_bounty_references(network, highest_known_bounty_id).get(issue_url)
+    start_id = highest_known_bounty_id - MAX_BOUNTY_REFERENCES_SCANNED_IN_REQUEST + 1
+    bounty_ids, _ = scan_bounty_references(network, start_id, highest_known_bounty_id)
+    return bounty_ids.get(issue_url)
 
 
 def get_bounty_id_from_db(issue_url, network):
@@ -570,6 +892,13 @@ def get_bounty_id_from_db(issue_url, network):
     return bounties.first().standard_bounties_id
 
 
+def get_bounty_id_from_index(issue_url, network):
+    return BountyReference.objects.filter(
+        network=network,
+        url=normalize_url(issue_url),
+    ).order_by('-standard_bounties_id').values_list('standard_bounties_id', flat=True).first()
+
+
 def get_highest_known_bounty_id(network):
     standard_bounties = getBountyContract(network)
     num_bounties = int(standard_bounties.functions.getNumBounties().call())
@@ -578,34 +907,102 @@ def get_highest_known_bounty_id(network):
     return num_bounties - 1
 
 
-def get_bounty_id_from_web3(issue_url, network, start_bounty_id, direction='up'):
-    issue_url = normalize_url(issue_url)
+def get_bounty_reference_url(bounty_data):
+    """Return the normalized webReferenceURL of a bounty's data, or None."""
+    payload = bounty_data.get('payload', {}) if isinstance(bounty_data, dict) else {}
+    url = payload.get('webReferenceURL') if isinstance(payload, dict) else None
+    if not url or not isinstance(url, str):
+        return None
+    return normalize_url(url)
 
-    # iterate through all the bounties
-    bounty_enum = start_bounty_id
-    more_bounties = True
-    while more_bounties:
-        try:
 
-            # pull and process each bounty
-            print(f'** get_bounty_id_from_web3; looking at {bounty_enum}')
-            bounty = get_bounty(bounty_enum, network)
-            url = bounty.get('data', {}).get('payload', {}).get('webReferenceURL', False)
-            if url == issue_url:
-                return bounty['id']
+def record_bounty_references(network, urls_by_id):
+    """Index the webReferenceURL of bounties, given by their StandardBounties id."""
+    urls_by_id = {bounty_id: url for bounty_id, url in urls_by_id.items() if url}
+    BountyReference.objects.filter(network=network, standard_bounties_id__in=list(urls_by_id.keys())).delete()
+    BountyReference.objects.bulk_create([
+        BountyReference(network=network, standard_bounties_id=bounty_id, url=url)
+        for bounty_id, url in urls_by_id.items()
+    ])
+
+
+def get_bounty_references_watermark(network):
+    """Return the id up to which every bounty of network is in the BountyReference index, or None."""
+    watermark = get_jsonstore(BOUNTY_REFERENCES_VIEW, network)
+    return watermark.data['last_id'] if watermark else None
+
+
+def scan_bounty_references(network, start_id, end_id, contract=None, workers=8, window=32, retries=2):
+    """Index the webReferenceURL of bounties start_id to end_id.
+
+    Bounties are read in windows; the contract reads and then the IPFS
+    fetches of a window run concurrently. The scan stops at the first id
+    the contract does not have. Data IPFS could not serve is fetched again
+    up to retries times, after which the bounty is scanned without a url.
+
+    Returns:
+        tuple: The ids of the bounties scanned by url, and the last id scanned or None.
+
+    """
+    contract = contract or getBountyContract(network)
 
+    def read(bounty_enum):
+        try:
+            return read_bounty_contract(contract, bounty_enum)
         except BountyNotFoundException:
-            more_bounties = False
-        except UnsupportedSchemaException:
-            pass
-        finally:
-            # prepare for next loop
-            if direction == 'up':
-                bounty_enum += 1
-            else:
-                bounty_enum -= 1
+            return None
 
-    return None
+    bounty_ids = {}
+    last_id = None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for window_start in range(start_id, end_id + 1, window):
+            contract_bounties = list(pool.map(read, range(window_start, min(window_start + window, end_id + 1))))
+            contents = ipfs_cat_many(
+                [contract_bounty['data'] for contract_bounty in contract_bounties if contract_bounty],
+                pool=pool,
+            )
+            for _ in range(retries):
+                missing = [key for key, content in contents.items() if content is None]
+                if not missing:
+                    break
+                contents.update(ipfs_cat_many(missing, pool=pool))
+
+            urls_by_id = {}
+            for contract_bounty in contract_bounties:
+                if contract_bounty is None:
+                    break
+                content = contents.get(contract_bounty['data'])
+                url = None
+                if content is None:
+                    logger.warning(f"-- could not fetch the data of bounty {contract_bounty['id']} on {network}")
+                else:
+                    try:
+                        url = get_bounty_reference_url(json.loads(content))
+                    except ValueError:
+                        pass
+                urls_by_id[contract_bounty['id']] = url
+                if url:
+                    bounty_ids[url] = contract_bounty['id']
+                last_id = contract_bounty['id']
+            record_bounty_references(network, urls_by_id)
+            if len(urls_by_id) < len(contract_bounties):
+                break
+    return bounty_ids, last_id
+
+
+def update_bounty_references(network, end_id, **kwargs):
+    """Index the bounties of network created since the BountyReference index was last updated.
+
+    Returns:
+        dict: The ids of the bounties scanned, by url.
+
+    """
+    watermark = get_bounty_references_watermark(network)
+    start_id = 0 if watermark is None else watermark + 1
+    bounty_ids, last_id = scan_bounty_references(network, start_id, end_id, **kwargs)
+    if last_id is not None:
+        replace_jsonstore(BOUNTY_REFERENCES_VIEW, {network: {'last_id': last_id}}, whole_view=False)
+    return bounty_ids
 
 
 def build_profile_pairs(bounty):
@@ -2600,7 +2600,7 @@ def get_profile_tab(request, profile, tab, prev_context):
                     return HttpResponse(status=204)
 
                 context = {}
-                context['activities'] = [ele.view_props_for(request.user) for ele in paginator.get_page(page)]
+                context['activities'] = Activity.view_props_for_many(paginator.get_page(page), request.user)
 
                 return TemplateResponse(request, 'profiles/profile_activities.html', context, status=status)
 
@@ -26,6 +26,7 @@ import ccxt
 import cryptocompare as cc
 from dashboard.models import Bounty, Tip
 from economy.models import ConversionRate
+from economy.utils import ConversionRateIndex, use_conversion_rate_index
 from grants.models import Contribution
 from kudos.models import KudosTransfer
 from websocket import create_connection
@@ -184,6 +185,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         """Get the latest currency rates."""
+        conversion_rate_index = ConversionRateIndex()
         stablecoins()
 
         try:
@@ -206,6 +208,9 @@ class Command(BaseCommand):
 
         try:
             print('refresh')
-            refresh_bounties()
+            # pick up the rates inserted above before revaluing every bounty
+            conversion_rate_index.refresh()
+            with use_conversion_rate_index(conversion_rate_index):
+                refresh_bounties()
         except Exception as e:
             print(e)
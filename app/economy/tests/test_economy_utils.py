@@ -17,12 +17,13 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
+import math
 from datetime import datetime
 
 from django.test.client import RequestFactory
 
 from economy.models import ConversionRate
-from economy.utils import convert_amount, etherscan_link
+from economy.utils import ConversionRateIndex, convert_amount, etherscan_link, use_conversion_rate_index
 from test_plus.test import TestCase
 
 
@@ -65,6 +66,42 @@ class EconomyUtilsTest(TestCase):
         result = convert_amount(2, 'ETH', 'USDT', datetime(2018, 1, 1))
         assert round(result, 1) == 10
 
+    def test_conversion_rate_index(self):
+        """Test the ConversionRateIndex answers like the convert_amount queries."""
+        index = ConversionRateIndex()
+        assert round(index.convert(2, 'ETH', 'USDT'), 1) == 6
+        assert round(index.convert(2, 'ETH', 'USDT', datetime(2018, 1, 1)), 1) == 10
+        assert round(index.convert(2, 'ETH', 'USDT', datetime(2017, 1, 1)), 1) == 6
+        with use_conversion_rate_index(index):
+            assert round(convert_amount(2, 'WETH', 'USDT', datetime(2018, 6, 1)), 1) == 10
+
+    def test_conversion_rate_index_refresh(self):
+        """Test the ConversionRateIndex picks up ConversionRates created after it was built."""
+        index = ConversionRateIndex()
+        assert round(index.convert(1, 'ETH', 'USDT'), 1) == 3
+        ConversionRate.objects.create(
+            from_amount=1,
+            to_amount=4,
+            source='etherdelta',
+            from_currency='ETH',
+            to_currency='USDT',
+        )
+        index.refresh()
+        assert round(index.convert(1, 'ETH', 'USDT'), 1) == 4
+        assert round(index.convert(1, 'USDT', 'ETH'), 2) == 0.25
+
+    def test_conversion_rate_index_convert_many(self):
+        """Test the vectorized ConversionRateIndex conversion."""
+        index = ConversionRateIndex()
+        results = index.convert_many(
+            [1, 2, 3],
+            ['ETH', 'ETH', 'FOO'],
+            'USDT',
+            [datetime(2018, 1, 1), None, None],
+        )
+        assert [round(result, 1) for result in results[:2]] == [5, 6]
+        assert math.isnan(results[2])
+
     def test_etherscan_link(self):
         """Test the economy util etherscan_link method."""
         txid = '0xcb39900d98fa00de2936d2770ef3bfef2cc289328b068e580dc68b7ac1e2055b'
@@ -17,9 +17,18 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
+from contextlib import contextmanager
+
+from django.db.models import Max
+from django.utils import timezone
+
+import numpy as np
 from cacheops import cached_as
 from economy.models import ConversionRate
 
+# the ConversionRateIndex convert_amount answers from, see use_conversion_rate_index
+_conversion_rate_index = None
+
 
 # All Units in native currency
 class TransactionException(Exception):
@@ -34,8 +43,151 @@ class ConversionRateNotFoundError(Exception):
     pass
 
 
-def convert_amount(from_amount, from_currency, to_currency, timestamp=None):
+def normalize_currency(currency):
+    """Map the currencies that share a price (WETH, the stable coins) onto the one rates are stored for."""
     from django.conf import settings
+
+    # hack to handle WETH
+    if currency == 'WETH':
+        return 'ETH'
+    # hack to handle DAI
+    if currency in settings.STABLE_COINS:
+        return 'USDT'
+    return currency
+
+
+def to_epoch(timestamp):
+    """Return a datetime as seconds since the epoch, treating naive datetimes like the ORM does."""
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp.timestamp()
+
+
+class ConversionRateIndex:
+    """Answer ConversionRate lookups from in memory time series.
+
+    Each (from_currency, to_currency) pair is loaded with a single query the
+    first time it is asked for and kept as timestamp sorted arrays, so a
+    lookup is a bisection rather than an ORDER BY -timestamp query. Rows
+    inserted after the index was built (e.g. by get_prices) are picked up by
+    refresh().
+
+    """
+
+    def __init__(self):
+        self.last_id = ConversionRate.objects.aggregate(Max('id'))['id__max'] or 0
+        self.series = {}
+
+    @staticmethod
+    def build_series(rows):
+        timestamps = np.array([timestamp.timestamp() for timestamp, _, _ in rows], dtype=float)
+        from_amounts = np.array([from_amount for _, from_amount, _ in rows], dtype=float)
+        to_amounts = np.array([to_amount for _, _, to_amount in rows], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return timestamps, to_amounts / from_amounts
+
+    def get_series(self, from_currency, to_currency):
+        """Return the (timestamps, rates) arrays of a currency pair, oldest first."""
+        key = (from_currency, to_currency)
+        if key not in self.series:
+            rows = ConversionRate.objects.filter(
+                from_currency=from_currency,
+                to_currency=to_currency,
+                id__lte=self.last_id,
+            ).order_by('timestamp', 'id').values_list('timestamp', 'from_amount', 'to_amount')
+            self.series[key] = self.build_series(list(rows))
+        return self.series[key]
+
+    def refresh(self):
+        """Append the ConversionRates created since the index was built or last refreshed."""
+        new_rows = {}
+        conversion_rates = ConversionRate.objects.filter(id__gt=self.last_id).order_by('id').values_list(
+            'id', 'from_currency', 'to_currency', 'timestamp', 'from_amount', 'to_amount'
+        )
+        for pk, from_currency, to_currency, timestamp, from_amount, to_amount in conversion_rates:
+            self.last_id = pk
+            key = (from_currency, to_currency)
+            # pairs that are not loaded yet will read the new rows when they are
+            if key in self.series:
+                new_rows.setdefault(key, []).append((timestamp, from_amount, to_amount))
+
+        for key, rows in new_rows.items():
+            timestamps, rates = self.build_series(rows)
+            timestamps = np.concatenate([self.series[key][0], timestamps])
+            rates = np.concatenate([self.series[key][1], rates])
+            # a stable sort keeps the later (higher id) row last among equal timestamps
+            order = np.argsort(timestamps, kind='mergesort')
+            self.series[key] = timestamps[order], rates[order]
+
+    def rate(self, from_currency, to_currency, timestamp=None):
+        """Return the rate convert_amount would use, see convert_amount for the arguments."""
+        from_currency = normalize_currency(from_currency)
+        to_currency = normalize_currency(to_currency)
+        timestamps, rates = self.get_series(from_currency, to_currency)
+        if not len(rates):
+            raise ConversionRateNotFoundError(f"ConversionRate {from_currency}/{to_currency} @ {timestamp} not found")
+
+        if timestamp:
+            index = np.searchsorted(timestamps, to_epoch(timestamp), side='right')
+            # no rate that old, so fall back to the latest one
+            if index:
+                return rates[index - 1]
+        return rates[-1]
+
+    def convert(self, from_amount, from_currency, to_currency, timestamp=None):
+        return float(self.rate(from_currency, to_currency, timestamp)) * float(from_amount)
+
+    def convert_many(self, from_amounts, from_currencies, to_currency, timestamps=None):
+        """Convert arrays of amounts at once.
+
+        Args:
+            from_amounts (list): The amounts to be converted.
+            from_currencies (list): The currency of each amount.
+            to_currency (str): The currency identifier to convert to.
+            timestamps (list): The timestamp of each amount, None entries meaning latest.
+
+        Returns:
+            numpy.ndarray: The amounts in to_currency, NaN where no ConversionRate exists.
+
+        """
+        from_amounts = np.asarray(from_amounts, dtype=float)
+        from_currencies = np.array([normalize_currency(currency) for currency in from_currencies], dtype=object)
+        to_currency = normalize_currency(to_currency)
+        if timestamps is None:
+            timestamps = [None] * len(from_amounts)
+        # timestamps past the last rate and missing ones both resolve to the latest rate
+        epochs = np.array([to_epoch(timestamp) if timestamp else np.inf for timestamp in timestamps], dtype=float)
+
+        results = np.full(len(from_amounts), np.nan)
+        for from_currency in set(from_currencies):
+            series_timestamps, rates = self.get_series(from_currency, to_currency)
+            if not len(rates):
+                continue
+            mask = from_currencies == from_currency
+            indexes = np.searchsorted(series_timestamps, epochs[mask], side='right') - 1
+            indexes[indexes < 0] = len(rates) - 1
+            results[mask] = from_amounts[mask] * rates[indexes]
+        return results
+
+
+@contextmanager
+def use_conversion_rate_index(index=None):
+    """Answer convert_amount from a ConversionRateIndex for the duration of the block.
+
+    Meant for batch jobs that convert many amounts; the index is not
+    refreshed on its own, so long running callers should call refresh().
+
+    """
+    global _conversion_rate_index
+    previous_index = _conversion_rate_index
+    _conversion_rate_index = index or ConversionRateIndex()
+    try:
+        yield _conversion_rate_index
+    finally:
+        _conversion_rate_index = previous_index
+
+
+def convert_amount(from_amount, from_currency, to_currency, timestamp=None):
     """Convert the provided amount to another current.
 
     Args:
@@ -48,19 +200,11 @@ def convert_amount(from_amount, from_currency, to_currency, timestamp=None):
         float: The amount in to_currency.
 
     """
+    if _conversion_rate_index:
+        return _conversion_rate_index.convert(from_amount, from_currency, to_currency, timestamp)
 
-    # hack to handle WETH
-    if from_currency == 'WETH':
-        from_currency = 'ETH'
-    if to_currency == 'WETH':
-        to_currency = 'ETH'
-
-    # hack to handle DAI
-    if from_currency in settings.STABLE_COINS:
-        from_currency = 'USDT'
-    if to_currency in settings.STABLE_COINS:
-        to_currency = 'USDT'
-
+    from_currency = normalize_currency(from_currency)
+    to_currency = normalize_currency(to_currency)
 
     if timestamp:
         conversion_rate = ConversionRate.objects.filter(
@@ -21,16 +21,29 @@ import copy
 import datetime as dt
 import json
 import math
+import multiprocessing
+import os
+import pickle
+import tempfile
 import time
+from collections import Counter
 from itertools import combinations
 
+from django.db import connections
+from django.db.models import Count
 from django.utils import timezone
 
+import numpy as np
+from django_bulk_update.helper import bulk_update
+from economy.utils import ConversionRateNotFoundError, convert_amount
+from gas.utils import eth_usd_conv_rate
 from grants.models import Contribution, Grant, PhantomFunding
 from perftools.models import JSONStore
+from scipy import sparse
 
 LOWER_THRESHOLD = 0.0
 CLR_START_DATE = dt.datetime(2020, 1, 6, 0, 0)
+CLR_ENGINES = ('python', 'sparse')
 
 
 '''
@@ -146,6 +159,117 @@ def iter_threshold(aggregated_contributions, pair_totals, total_pot, lower_bound
     return bigtot, totals
 
 
+'''
+    Sparse counterpart of aggregate_contributions. Contributions are
+    summed into a grant x contributor matrix, pairwise overlap is computed
+    as a single sparse product and every unique (k1, k2) pair of every
+    grant is flattened into parallel arrays for iter_threshold_sparse.
+
+    Args:
+        from translate_data:
+        [[grant_id (str), user_id (str), contribution_amount (float)]]
+
+    Returns:
+        grant_ids: [grant_id (str)] in order of first appearance
+        matrix: scipy.sparse.csr_matrix of aggregated amounts, grants x users
+        pairs: (
+            pair_grants  : np.array of row indices into grant_ids,
+            pair_weights : np.array of sqrt(v1 * v2),
+            pair_totals  : np.array of pair totals for (k1, k2)
+        )
+'''
+def aggregate_contributions_sparse(grant_contributions):
+    grant_index = {}
+    user_index = {}
+    rows, cols, amounts = [], [], []
+    for proj, user, amount in grant_contributions:
+        rows.append(grant_index.setdefault(proj, len(grant_index)))
+        cols.append(user_index.setdefault(user, len(user_index)))
+        amounts.append(amount)
+
+    # duplicate (grant, user) entries are summed on conversion to csr
+    matrix = sparse.coo_matrix(
+        (np.array(amounts, dtype=np.float64), (rows, cols)),
+        shape=(len(grant_index), len(user_index)),
+    ).tocsr()
+    matrix.sum_duplicates()
+
+    roots = matrix.sqrt()
+    overlap = (roots.T @ roots).tocsr()
+
+    pair_grants, pair_weights, pair_k1, pair_k2 = [], [], [], []
+    for row in range(matrix.shape[0]):
+        start, end = roots.indptr[row], roots.indptr[row + 1]
+        if end - start < 2:
+            continue
+        users = roots.indices[start:end]
+        values = roots.data[start:end]
+        i, j = np.triu_indices(end - start, 1)
+        pair_grants.append(np.full(len(i), row, dtype=np.int64))
+        pair_weights.append(values[i] * values[j])
+        pair_k1.append(users[i])
+        pair_k2.append(users[j])
+
+    if pair_grants:
+        pair_grants = np.concatenate(pair_grants)
+        pair_weights = np.concatenate(pair_weights)
+        pair_totals = np.asarray(overlap[np.concatenate(pair_k1), np.concatenate(pair_k2)]).ravel()
+    else:
+        pair_grants = np.zeros(0, dtype=np.int64)
+        pair_weights = np.zeros(0)
+        pair_totals = np.zeros(0)
+
+    return list(grant_index.keys()), matrix, (pair_grants, pair_weights, pair_totals)
+
+
+'''
+    Sparse counterpart of iter_threshold. Runs the same bisection as
+    iter_threshold, but each step is evaluated over the precomputed pair
+    arrays instead of walking the contributor dicts.
+
+    Args:
+        grant_ids   : [grant_id (str)]
+        pairs       : (pair_grants, pair_weights, pair_totals)
+        total_pot   : (float)
+        lower_bound : (float)
+
+    Returns:
+        bigtot: (float)
+        totals: [
+            {
+                id: (str),
+                clr_amount: (float)
+            }
+        ]
+'''
+def iter_threshold_sparse(grant_ids, pairs, total_pot, lower_bound):
+    pair_grants, pair_weights, pair_totals = pairs
+    lower = lower_bound
+    upper = total_pot
+    iterations = 0
+    bigtot = 0
+    grant_totals = np.zeros(len(grant_ids))
+
+    while iterations < 100:
+        threshold = (lower + upper) / 2
+        iterations += 1
+        if iterations == 100:
+            break # break at 100th iteration
+        with np.errstate(divide='ignore'):
+            terms = pair_weights / (pair_totals / threshold + 1)
+        grant_totals = np.bincount(pair_grants, weights=terms, minlength=len(grant_ids))
+        bigtot = float(terms.sum())
+        if bigtot == total_pot:
+            break
+        elif bigtot < total_pot:
+            lower = threshold
+        elif bigtot > total_pot:
+            upper = threshold
+
+    totals = [{'id': proj, 'clr_amount': float(tot)} for proj, tot in zip(grant_ids, grant_totals)]
+    return bigtot, totals
+
+
 '''
     Clubbed function that intakes grant data, calculates necessary
     intermediate calculations, and spits out clr calculations.
@@ -161,18 +285,269 @@ def iter_threshold(aggregated_contributions, pair_totals, total_pot, lower_bound
         }
         total_pot       (float)
         lower_bound     (float)
+        engine          (str) one of CLR_ENGINES
 
     Returns:
         bigtot: should equal total pot
         totals: clr totals
 '''
-def grants_clr_calculate (grant_contributions, total_pot, lower_bound):
+def grants_clr_calculate (grant_contributions, total_pot, lower_bound, engine='python'):
     grants_list = translate_data(grant_contributions)
+    if engine == 'sparse':
+        grant_ids, _, pairs = aggregate_contributions_sparse(grants_list)
+        return iter_threshold_sparse(grant_ids, pairs, total_pot, lower_bound)
     aggregated_contributions, pair_totals = aggregate_contributions(grants_list)
     bigtot, totals = iter_threshold(aggregated_contributions, pair_totals, total_pot, lower_bound)
     return bigtot, totals
 
 
+'''
+    Delta-based "what-if" predictor for a round. The baseline pair arrays
+    are built once; a hypothetical donation to a grant only adds pairs
+    between a new contributor and that grant's existing contributors, so
+    pricing it is an O(contributors of the grant) update on top of the
+    memoized baseline sums instead of a full recalculation.
+
+    The threshold is solved with a bracketed newton iteration started from
+    the baseline threshold, which converges to the same root as the
+    bisection in iter_threshold in a handful of steps.
+
+    Args:
+        grant_contributions:    {
+            'id': (string) ,
+            'contributions' : [
+                {
+                    contributor_profile (str) : contribution_amount (int)
+                }
+            ]
+        }
+        total_pot       (float)
+        lower_bound     (float)
+'''
+class CLRPredictor:
+    MAX_CACHED_EVALUATIONS = 100000
+
+    def __init__(self, grant_contributions, total_pot, lower_bound=LOWER_THRESHOLD):
+        grants_list = translate_data(grant_contributions)
+        self.grant_ids, self.matrix, self.pairs = aggregate_contributions_sparse(grants_list)
+        self.grant_index = {grant_id: row for row, grant_id in enumerate(self.grant_ids)}
+        # a donation is appended to every entry for the grant, mirroring calculate_clr_for_donation
+        self.grant_entries = Counter(grant_contribution['id'] for grant_contribution in grant_contributions)
+        self.pair_offsets = np.searchsorted(self.pairs[0], np.arange(len(self.grant_ids) + 1))
+        self.total_pot = total_pot
+        self.lower_bound = lower_bound
+        self._evaluations = {}
+        self.base_threshold = None
+        self.base_threshold = self.solve_threshold(np.zeros(0))
+
+    @staticmethod
+    def _terms(weights, totals, threshold):
+        # equivalent to weights / (totals / threshold + 1) without dividing by a zero threshold
+        denominator = totals + threshold
+        if threshold > 0:
+            return weights * threshold / denominator, weights * totals / denominator ** 2
+        terms = np.divide(weights * threshold, denominator, out=np.zeros_like(weights), where=denominator > 0)
+        slopes = np.divide(weights * totals, denominator ** 2, out=np.zeros_like(weights), where=denominator > 0)
+        return terms, slopes
+
+    def evaluate(self, threshold):
+        """Return the baseline bigtot and its derivative at threshold."""
+        if threshold not in self._evaluations:
+            if len(self._evaluations) > self.MAX_CACHED_EVALUATIONS:
+                self._evaluations.clear()
+            _, pair_weights, pair_totals = self.pairs
+            if threshold > 0:
+                # fewer passes over the pair arrays than _terms, this dominates the predictor's runtime
+                denominator = pair_totals + threshold
+                ratios = pair_weights / denominator
+                bigtot = threshold * ratios.sum()
+                ratios *= pair_totals
+                ratios /= denominator
+                self._evaluations[threshold] = (float(bigtot), float(ratios.sum()))
+            else:
+                terms, slopes = self._terms(pair_weights, pair_totals, threshold)
+                self._evaluations[threshold] = (float(terms.sum()), float(slopes.sum()))
+        return self._evaluations[threshold]
+
+    def donor_weights(self, grant_id, donation_amount):
+        """Return sqrt(donation * v_k) for every existing contributor k of the grant."""
+        donation_amount = donation_amount * self.grant_entries[grant_id]
+        row = self.grant_index.get(grant_id)
+        if not donation_amount or row is None:
+            return np.zeros(0)
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return np.sqrt(donation_amount * self.matrix.data[start:end])
+
+    def bigtot(self, threshold, donor_weights):
+        """Return bigtot and its derivative at threshold with the donor's pairs added."""
+        bigtot, slope = self.evaluate(threshold)
+        # the donor only contributes to one grant, so their pair totals equal their pair weights
+        donor_terms, donor_slopes = self._terms(donor_weights, donor_weights, threshold)
+        return bigtot + donor_terms.sum(), slope + donor_slopes.sum()
+
+    def solve_threshold(self, donor_weights):
+        lower = self.lower_bound
+        upper = self.total_pot
+        threshold = self.base_threshold if self.base_threshold is not None else (lower + upper) / 2
+
+        # bigtot only grows with the threshold, so an unreachable pot pins it to the bracket
+        if self.bigtot(upper, donor_weights)[0] <= self.total_pot:
+            return upper
+        if self.bigtot(lower, donor_weights)[0] >= self.total_pot:
+            return lower
+
+        for _ in range(100):
+            bigtot, slope = self.bigtot(threshold, donor_weights)
+            if bigtot == self.total_pot:
+                break
+            elif bigtot < self.total_pot:
+                lower = threshold
+            elif bigtot > self.total_pot:
+                upper = threshold
+
+            candidate = threshold + (self.total_pot - bigtot) / slope if slope else upper
+            if not lower < candidate < upper:
+                candidate = (lower + upper) / 2
+            if abs(candidate - threshold) <= 1e-12 * max(abs(threshold), 1.0):
+                threshold = candidate
+                break
+            threshold = candidate
+        return threshold
+
+    def predict(self, grant_id, donation_amount):
+        """Return the clr amount of grant_id after donation_amount from a new contributor."""
+        if grant_id not in self.grant_entries:
+            return None
+        if not donation_amount and grant_id not in self.grant_index:
+            return None
+
+        donor_weights = self.donor_weights(grant_id, donation_amount)
+        threshold = self.solve_threshold(donor_weights)
+        donor_terms, _ = self._terms(donor_weights, donor_weights, threshold)
+
+        row = self.grant_index.get(grant_id)
+        grant_total = 0.0
+        if row is not None:
+            start, end = self.pair_offsets[row], self.pair_offsets[row + 1]
+            _, pair_weights, pair_totals = self.pairs
+            grant_terms, _ = self._terms(pair_weights[start:end], pair_totals[start:end], threshold)
+            grant_total = grant_terms.sum()
+        return float(grant_total + donor_terms.sum())
+
+    def dump(self, directory):
+        """Write the baseline arrays to directory so other processes can memory-map them."""
+        arrays = {
+            'matrix_data': self.matrix.data,
+            'matrix_indices': self.matrix.indices,
+            'matrix_indptr': self.matrix.indptr,
+            'pair_grants': self.pairs[0],
+            'pair_weights': self.pairs[1],
+            'pair_totals': self.pairs[2],
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f'{name}.npy'), array)
+        with open(os.path.join(directory, 'predictor.pickle'), 'wb') as f:
+            pickle.dump({
+                'grant_ids': self.grant_ids,
+                'grant_entries': self.grant_entries,
+                'shape': self.matrix.shape,
+                'total_pot': self.total_pot,
+                'lower_bound': self.lower_bound,
+                'base_threshold': self.base_threshold,
+            }, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Rebuild a predictor written by dump, memory-mapping its arrays read-only."""
+        arrays = {}
+        for name in ['matrix_data', 'matrix_indices', 'matrix_indptr', 'pair_grants', 'pair_weights', 'pair_totals']:
+            arrays[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        with open(os.path.join(directory, 'predictor.pickle'), 'rb') as f:
+            meta = pickle.load(f)
+
+        predictor = cls.__new__(cls)
+        predictor.grant_ids = meta['grant_ids']
+        predictor.grant_index = {grant_id: row for row, grant_id in enumerate(predictor.grant_ids)}
+        predictor.grant_entries = meta['grant_entries']
+        predictor.matrix = sparse.csr_matrix(
+            (arrays['matrix_data'], arrays['matrix_indices'], arrays['matrix_indptr']),
+            shape=meta['shape'],
+            copy=False,
+        )
+        predictor.pairs = (arrays['pair_grants'], arrays['pair_weights'], arrays['pair_totals'])
+        predictor.pair_offsets = np.searchsorted(predictor.pairs[0], np.arange(len(predictor.grant_ids) + 1))
+        predictor.total_pot = meta['total_pot']
+        predictor.lower_bound = meta['lower_bound']
+        predictor.base_threshold = meta['base_threshold']
+        predictor._evaluations = {}
+        return predictor
+
+    def prediction_curve(self, grant_id, potential_donations):
+        return [self.predict(grant_id, donation_amount) for donation_amount in potential_donations]
+
+    def grants_clr(self, grant_id, donation_amount):
+        """Return the clr totals of every grant after donation_amount to grant_id."""
+        donor_weights = self.donor_weights(grant_id, donation_amount)
+        threshold = self.solve_threshold(donor_weights)
+        pair_grants, pair_weights, pair_totals = self.pairs
+        terms, _ = self._terms(pair_weights, pair_totals, threshold)
+        grant_totals = np.bincount(pair_grants, weights=terms, minlength=len(self.grant_ids))
+        row = self.grant_index.get(grant_id)
+        if row is not None:
+            donor_terms, _ = self._terms(donor_weights, donor_weights, threshold)
+            grant_totals[row] += donor_terms.sum()
+        return [{'id': proj, 'clr_amount': float(tot)} for proj, tot in zip(self.grant_ids, grant_totals)]
+
+
+_worker_predictor = None
+
+
+def _init_clr_worker(directory):
+    global _worker_predictor
+    _worker_predictor = CLRPredictor.load(directory)
+
+
+def _predict_grant_curve(predictor, grant_id, potential_donations):
+    curve = predictor.prediction_curve(grant_id, potential_donations)
+    grants_clr = predictor.grants_clr(grant_id, potential_donations[-1]) if curve[-1] is not None else None
+    return grant_id, curve, grants_clr
+
+
+def _predict_grant_curve_in_worker(args):
+    return _predict_grant_curve(_worker_predictor, *args)
+
+
+'''
+    Computes the prediction curve of every grant, fanning the grants out
+    to a process pool when workers > 1. The predictor's arrays are written
+    to a temporary directory once and memory-mapped read-only by each
+    worker rather than pickled per task.
+
+    Args:
+        predictor           : CLRPredictor
+        grant_ids           : [grant_id]
+        potential_donations : [donation_amount (float)]
+        workers             : (int)
+
+    Returns:
+        {grant_id: (curve [clr_amount (float)], grants_clr [{id, clr_amount}])}
+'''
+def predict_clr_curves(predictor, grant_ids, potential_donations, workers=1):
+    tasks = [(grant_id, potential_donations) for grant_id in grant_ids]
+    if workers <= 1:
+        results = [_predict_grant_curve(predictor, *task) for task in tasks]
+        return {grant_id: (curve, grants_clr) for grant_id, curve, grants_clr in results}
+
+    with tempfile.TemporaryDirectory() as directory:
+        predictor.dump(directory)
+        # forked workers must not share the parent's database connection
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_clr_worker, initargs=(directory, )) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            results = pool.imap_unordered(_predict_grant_curve_in_worker, tasks, chunksize=chunksize)
+            return {grant_id: (curve, grants_clr) for grant_id, curve, grants_clr in results}
+
+
 def generate_random_contribution_data():
     import random
     contrib_data = []
@@ -196,7 +571,7 @@ def generate_random_contribution_data():
     return contrib_data
 
 
-def calculate_clr_for_donation(donation_grant, donation_amount, total_pot, base_grant_contributions):
+def calculate_clr_for_donation(donation_grant, donation_amount, total_pot, base_grant_contributions, engine='python'):
     grant_contributions = copy.deepcopy(base_grant_contributions)
     # find grant in contributions list and add donation
     if donation_amount != 0:
@@ -205,7 +580,7 @@ def calculate_clr_for_donation(donation_grant, donation_amount, total_pot, base_
                 # add this donation with a new profile (id 99999999999) to get impact
                 grant_contribution['contributions'].append({'999999999999': donation_amount})
 
-    _, grants_clr = grants_clr_calculate(grant_contributions, total_pot, LOWER_THRESHOLD)
+    _, grants_clr = grants_clr_calculate(grant_contributions, total_pot, LOWER_THRESHOLD, engine=engine)
 
     # find grant we added the contribution to and get the new clr amount
     for grant_clr in grants_clr:
@@ -215,65 +590,225 @@ def calculate_clr_for_donation(donation_grant, donation_amount, total_pot, base_
     print(f'info: no contributions found for grant {donation_grant}')
     return (None, None)
 
-def predict_clr(random_data=False, save_to_db=False, from_date=None, clr_type=None, network='mainnet', clr_amount=0):
-    # setup
-    clr_calc_start_time = timezone.now()
+'''
+    Returns the grants taking part in a clr round.
 
-    # get all the eligible contributions and calculate total
-    contributions = Contribution.objects.prefetch_related('subscription').filter(created_on__gte=CLR_START_DATE, created_on__lte=from_date, success=True)
-    debug_output = []
+    Args:
+        clr_type    (str) 'tech', 'media' or None for every grant
+        network     (str)
 
+    Returns:
+        Grant queryset
+'''
+def get_clr_grants(clr_type=None, network='mainnet'):
     if clr_type == 'tech':
-        grants = Grant.objects.filter(network=network, hidden=False, grant_type='tech', link_to_new_grant=None)
+        return Grant.objects.filter(network=network, hidden=False, grant_type='tech', link_to_new_grant=None)
     elif clr_type == 'media':
-        grants = Grant.objects.filter(network=network, hidden=False, grant_type='media', link_to_new_grant=None)
-    else:
-        grants = Grant.objects.filter(network=network, hidden=False, link_to_new_grant=None)
+        return Grant.objects.filter(network=network, hidden=False, grant_type='media', link_to_new_grant=None)
+    return Grant.objects.filter(network=network, hidden=False, link_to_new_grant=None)
 
-    # set up data to load contributions for each grant
-    if not random_data:
-        contrib_data = []
 
-        for grant in grants:
-            # go through all the individual contributions for each grant
-            g_contributions = copy.deepcopy(contributions).filter(subscription__grant_id=grant.id)
+'''
+    Loads the contributions of each grant the original way, with several
+    queries per grant and per contributing profile. Kept as the reference
+    implementation for get_contribution_data.
+
+    Args:
+        grants      : Grant queryset
+        from_date   : (datetime)
+
+    Returns:
+        [{'id': grant_id, 'contributions': [{profile_id (str): amount (float)}]}]
+'''
+def get_contribution_data_by_grant(grants, from_date):
+    contributions = Contribution.objects.prefetch_related('subscription').filter(created_on__gte=CLR_START_DATE, created_on__lte=from_date, success=True)
+    contrib_data = []
+
+    for grant in grants:
+        # go through all the individual contributions for each grant
+        g_contributions = copy.deepcopy(contributions).filter(subscription__grant_id=grant.id)
 
-            # put in correct format
-            phantom_funding_profiles = PhantomFunding.objects.filter(grant_id=grant.id, created_on__gte=CLR_START_DATE, created_on__lte=from_date)
-            all_contributing_profile_ids = list(set([c.subscription.contributor_profile.id for c in g_contributions] + [p.profile_id for p in phantom_funding_profiles]))
-            all_summed_contributions = []
+        # put in correct format
+        phantom_funding_profiles = PhantomFunding.objects.filter(grant_id=grant.id, created_on__gte=CLR_START_DATE, created_on__lte=from_date)
+        all_contributing_profile_ids = list(set([c.subscription.contributor_profile.id for c in g_contributions] + [p.profile_id for p in phantom_funding_profiles]))
+        all_summed_contributions = []
 
-            for profile_id in all_contributing_profile_ids:
-                # get sum of contributions per grant for each profile
-                profile_g_contributions = g_contributions.filter(subscription__contributor_profile_id=profile_id)
-                sum_of_each_profiles_contributions = float(sum([c.subscription.get_converted_monthly_amount() for c in profile_g_contributions]))
+        for profile_id in all_contributing_profile_ids:
+            # get sum of contributions per grant for each profile
+            profile_g_contributions = g_contributions.filter(subscription__contributor_profile_id=profile_id)
+            sum_of_each_profiles_contributions = float(sum([c.subscription.get_converted_monthly_amount() for c in profile_g_contributions]))
 
-                phantom_funding = PhantomFunding.objects.filter(created_on__gte=CLR_START_DATE, grant_id=grant.id, profile_id=profile_id, created_on__lte=from_date)
-                if phantom_funding.exists():
-                    sum_of_each_profiles_contributions = sum_of_each_profiles_contributions + phantom_funding.first().value
+            phantom_funding = PhantomFunding.objects.filter(created_on__gte=CLR_START_DATE, grant_id=grant.id, profile_id=profile_id, created_on__lte=from_date)
+            if phantom_funding.exists():
+                sum_of_each_profiles_contributions = sum_of_each_profiles_contributions + phantom_funding.first().value
 
-                all_summed_contributions.append({str(profile_id): sum_of_each_profiles_contributions})
+            all_summed_contributions.append({str(profile_id): sum_of_each_profiles_contributions})
 
-            # for each grant, list the contributions in key value pairs like {'profile id': sum of contributions}
-            grant_id = grant.defer_clr_to.pk if grant.defer_clr_to else grant.id
-            contrib_data.append({'id': grant_id, 'contributions': all_summed_contributions})
+        # for each grant, list the contributions in key value pairs like {'profile id': sum of contributions}
+        grant_id = grant.defer_clr_to.pk if grant.defer_clr_to else grant.id
+        contrib_data.append({'id': grant_id, 'contributions': all_summed_contributions})
 
+    return contrib_data
+
+
+'''
+    Helper function that mirrors Subscription.get_converted_monthly_amount
+    for a values() row, resolving each token's usd rate and decimals once.
+
+    Args:
+        subscription    : dict of subscription__* values
+        usd_rates       : {token_symbol (str): usd rate (float) or None}
+        token_decimals  : {(token_address, network): decimals (int)}
+
+    Returns:
+        monthly amount in usd (float)
+'''
+def _converted_monthly_amount(subscription, usd_rates, token_decimals):
+    from dashboard.tokens import addr_to_token
+
+    token_symbol = subscription['subscription__token_symbol']
+    if token_symbol not in usd_rates:
+        usd_rates[token_symbol] = _token_usd_rate(token_symbol)
+
+    token_key = (subscription['subscription__token_address'], subscription['subscription__network'])
+    if token_key not in token_decimals:
+        token = addr_to_token(*token_key)
+        token_decimals[token_key] = token.get('decimals', 0) if token else None
+
+    amount = float(subscription['subscription__amount_per_period'])
+    decimals = token_decimals[token_key]
+    if decimals is not None:
+        amount -= float(subscription['subscription__gas_price']) / 10 ** decimals
+    converted_amount = amount * usd_rates[token_symbol] if usd_rates[token_symbol] is not None else 0
+
+    real_period_seconds = float(subscription['subscription__real_period_seconds'])
+    num_tx_approved = float(subscription['subscription__num_tx_approved'])
+    if real_period_seconds * num_tx_approved < 2592000:
+        return converted_amount * num_tx_approved
+    return converted_amount * (2592000 / real_period_seconds)
+
+
+def _token_usd_rate(token_symbol):
+    try:
+        if token_symbol in ['ETH', 'WETH']:
+            return float(eth_usd_conv_rate())
+        return convert_amount(1, token_symbol, 'ETH') * float(eth_usd_conv_rate())
+    except ConversionRateNotFoundError:
+        try:
+            return convert_amount(1, token_symbol, 'USDT')
+        except ConversionRateNotFoundError:
+            return None
+
+
+'''
+    Loads the contributions and phantom funding of every grant in a round
+    with a constant number of queries: one values() query over the
+    contributions, and two over phantom funding (the rows and the
+    competing fund counts that make up PhantomFunding.value). Conversion
+    rates are resolved once per token rather than once per contribution.
+
+    Args:
+        grants      : Grant queryset
+        from_date   : (datetime)
+
+    Returns:
+        [{'id': grant_id, 'contributions': [{profile_id (str): amount (float)}]}]
+'''
+def get_contribution_data(grants, from_date):
+    grant_ids = {}
+    for grant_id, defer_clr_to_id in grants.values_list('id', 'defer_clr_to_id'):
+        grant_ids[grant_id] = defer_clr_to_id or grant_id
+    summed_contributions = {grant_id: {} for grant_id in grant_ids}
+
+    contributions = Contribution.objects.filter(
+        created_on__gte=CLR_START_DATE,
+        created_on__lte=from_date,
+        success=True,
+        subscription__grant_id__in=grant_ids.keys(),
+        subscription__contributor_profile__isnull=False,
+    ).values(
+        'subscription__grant_id',
+        'subscription__contributor_profile_id',
+        'subscription__token_symbol',
+        'subscription__token_address',
+        'subscription__network',
+        'subscription__amount_per_period',
+        'subscription__gas_price',
+        'subscription__real_period_seconds',
+        'subscription__num_tx_approved',
+    )
+    usd_rates = {}
+    token_decimals = {}
+    for contribution in contributions.iterator():
+        profile_sums = summed_contributions[contribution['subscription__grant_id']]
+        profile_id = contribution['subscription__contributor_profile_id']
+        amount = _converted_monthly_amount(contribution, usd_rates, token_decimals)
+        profile_sums[profile_id] = profile_sums.get(profile_id, 0) + amount
+
+    phantom_funding = PhantomFunding.objects.filter(
+        created_on__gte=CLR_START_DATE,
+        created_on__lte=from_date,
+        grant_id__in=grant_ids.keys(),
+    ).order_by('pk').values_list('grant_id', 'profile_id', 'round_number')
+    first_phantom_funding = {}
+    for grant_id, profile_id, round_number in phantom_funding:
+        first_phantom_funding.setdefault((grant_id, profile_id), round_number)
+
+    competing_funds = PhantomFunding.objects.filter(
+        profile_id__in={profile_id for _, profile_id in first_phantom_funding.keys()},
+    ).values_list('profile_id', 'round_number').annotate(total=Count('id')).order_by()
+    competing_funds = {(profile_id, round_number): total for profile_id, round_number, total in competing_funds}
+
+    for (grant_id, profile_id), round_number in first_phantom_funding.items():
+        profile_sums = summed_contributions[grant_id]
+        value = 5 / competing_funds[(profile_id, round_number)]
+        profile_sums[profile_id] = profile_sums.get(profile_id, 0) + value
+
+    return [
+        {
+            'id': grant_ids[grant_id],
+            'contributions': [{str(profile_id): amount} for profile_id, amount in profile_sums.items()]
+        } for grant_id, profile_sums in summed_contributions.items()
+    ]
+
+
+def predict_clr(random_data=False, save_to_db=False, from_date=None, clr_type=None, network='mainnet', clr_amount=0, engine='python', workers=1):
+    # setup
+    clr_calc_start_time = timezone.now()
+    debug_output = []
+    grants = get_clr_grants(clr_type, network)
+
+    # set up data to load contributions for each grant
+    if not random_data:
+        contrib_data = get_contribution_data(grants, from_date)
     else:
         # use random contribution data for testing
         contrib_data = generate_random_contribution_data()
 
     #print(f'\n contributions data: {contrib_data} \n')
 
+    # five potential additional donations plus the base case of 0
+    potential_donations = [0, 1, 10, 100, 1000, 10000]
+
+    # the sparse engine prices every donation against one precomputed baseline
+    if engine == 'sparse':
+        predictor = CLRPredictor(contrib_data, clr_amount)
+        predictions = predict_clr_curves(predictor, [grant.id for grant in grants], potential_donations, workers)
+
+    grants_to_save = []
+    clr_contributions = []
+
     # calculate clr given additional donations
     for grant in grants:
-        # five potential additional donations plus the base case of 0
-        potential_donations = [0, 1, 10, 100, 1000, 10000]
         potential_clr = []
 
-        for donation_amount in potential_donations:
-            # calculate clr with each additional donation and save to grants model
-            predicted_clr, grants_clr = calculate_clr_for_donation(grant, donation_amount, clr_amount, contrib_data)
-            potential_clr.append(predicted_clr)
+        if engine == 'sparse':
+            potential_clr, grants_clr = predictions[grant.id]
+        else:
+            for donation_amount in potential_donations:
+                # calculate clr with each additional donation and save to grants model
+                predicted_clr, grants_clr = calculate_clr_for_donation(grant, donation_amount, clr_amount, contrib_data)
+                potential_clr.append(predicted_clr)
 
         if save_to_db:
             grant.clr_prediction_curve = list(zip(potential_donations, potential_clr))
@@ -285,14 +820,17 @@ def predict_clr(random_data=False, save_to_db=False, from_date=None, clr_type=No
             else:
                 grant.clr_prediction_curve = [[0.0, 0.0, 0.0] for x in range(0, 6)]
 
-            JSONStore.objects.create(
+            clr_contributions.append(JSONStore(
                 created_on=from_date,
                 view='clr_contribution',
                 key=f'{grant.id}',
                 data=grant.clr_prediction_curve,
-            )
+            ))
             if from_date > (clr_calc_start_time - timezone.timedelta(hours=1)):
-                grant.save()
+                grants_to_save.append(grant)
 
         debug_output.append({'grant': grant.id, "clr_prediction_curve": (potential_donations, potential_clr), "grants_clr": grants_clr})
+
+    JSONStore.objects.bulk_create(clr_contributions, batch_size=500)
+    bulk_update(grants_to_save, update_fields=['clr_prediction_curve', 'last_clr_calc_date', 'next_clr_calc_date'], batch_size=500)
     return debug_output
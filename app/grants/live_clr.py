@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Define the in-process CLR model used for live match estimates.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from grants.clr import CLRPredictor, get_clr_grants, get_contribution_data
+
+logger = logging.getLogger(__name__)
+
+# bumped by the Contribution post_save signal, shared by every process through the cache
+CONTRIBUTIONS_UPDATED_CACHE_KEY = 'grants_live_clr_contributions_updated'
+MAX_CACHED_ESTIMATES = 10000
+
+
+def mark_contributions_updated():
+    """Record that the round's contributions changed so live models rebuild."""
+    cache.set(CONTRIBUTIONS_UPDATED_CACHE_KEY, time.time(), None)
+
+
+def interpolate_clr_curve(clr_prediction_curve, amount):
+    """Estimate the match unlocked by amount from a stored Grant.clr_prediction_curve.
+
+    Args:
+        clr_prediction_curve (list): [[donation, clr_amount, clr_amount - base], ...]
+        amount (float): The donation amount.
+
+    Returns:
+        float: The interpolated increase in match, or None without a curve.
+
+    """
+    points = sorted((point[0], point[2]) for point in clr_prediction_curve if len(point) > 2)
+    if not points:
+        return None
+    if amount <= points[0][0]:
+        return points[0][1]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        if amount <= x1:
+            return y0 + (y1 - y0) * (amount - x0) / (x1 - x0)
+    return points[-1][1]
+
+
+class LiveCLRModel:
+    """Hold a CLRPredictor for one round and keep it fresh in the background.
+
+    The model is built lazily on first use and rebuilt on a background
+    thread whenever the contributions change (see mark_contributions_updated)
+    or it grows older than GRANTS_LIVE_CLR_MAX_AGE. Readers never wait for a
+    build: until the first build finishes, estimate() returns None and
+    callers fall back to the stored prediction curve.
+
+    """
+
+    def __init__(self, clr_type, network, total_pot):
+        self.clr_type = clr_type
+        self.network = network
+        self.total_pot = total_pot
+        self.predictor = None
+        self.built_at = None
+        self.built_from = None
+        self.estimates = {}
+        self.lock = threading.Lock()
+        self.building = False
+        self.last_build_started = 0
+
+    def build(self):
+        """Rebuild the predictor from the database; runs on a background thread."""
+        try:
+            built_from = cache.get(CONTRIBUTIONS_UPDATED_CACHE_KEY) or time.time()
+            grants = get_clr_grants(self.clr_type, self.network)
+            contrib_data = get_contribution_data(grants, timezone.now())
+            predictor = CLRPredictor(contrib_data, self.total_pot)
+            # swap the whole state at once so readers never see a half built model
+            self.predictor, self.estimates = predictor, {}
+            self.built_at, self.built_from = timezone.now(), built_from
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            connection.close()
+            self.building = False
+
+    @property
+    def is_stale(self):
+        if not self.predictor:
+            return True
+        if (timezone.now() - self.built_at).total_seconds() > settings.GRANTS_LIVE_CLR_MAX_AGE:
+            return True
+        contributions_updated = cache.get(CONTRIBUTIONS_UPDATED_CACHE_KEY)
+        return bool(contributions_updated and contributions_updated > self.built_from)
+
+    def refresh(self):
+        """Start a background rebuild if the model is stale and none ran recently."""
+        if not self.is_stale:
+            return
+        with self.lock:
+            if self.building or time.time() - self.last_build_started < settings.GRANTS_LIVE_CLR_MIN_REBUILD_INTERVAL:
+                return
+            self.building = True
+            self.last_build_started = time.time()
+        threading.Thread(target=self.build, daemon=True).start()
+
+    def estimate(self, grant_id, amount):
+        """Return (clr_amount, match) after a donation of amount, or None while warming up."""
+        self.refresh()
+        predictor, estimates = self.predictor, self.estimates
+        if not predictor:
+            return None
+
+        key = (grant_id, amount)
+        if key not in estimates:
+            base = predictor.predict(grant_id, 0)
+            clr_amount = predictor.predict(grant_id, amount)
+            if clr_amount is None:
+                return None
+            if len(estimates) > MAX_CACHED_ESTIMATES:
+                estimates.clear()
+            estimates[key] = (clr_amount, clr_amount - (base or 0))
+        return estimates[key]
+
+    def metadata(self):
+        return {
+            'built_at': self.built_at.isoformat() if self.built_at else None,
+            'age_seconds': (timezone.now() - self.built_at).total_seconds() if self.built_at else None,
+            'stale': self.is_stale,
+        }
+
+
+_live_models = {}
+_live_models_lock = threading.Lock()
+
+
+def get_live_clr_model(clr_type, network):
+    """Return the process wide LiveCLRModel for a round, or None if the round has no pot."""
+    total_pot = settings.GRANTS_CLR_POTS.get(clr_type)
+    if not total_pot:
+        return None
+    with _live_models_lock:
+        key = (clr_type, network)
+        if key not in _live_models:
+            _live_models[key] = LiveCLRModel(clr_type, network, total_pot)
+        return _live_models[key]
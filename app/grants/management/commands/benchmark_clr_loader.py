@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Define the CLR contribution loader benchmark management command.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from grants.clr import get_clr_grants, get_contribution_data, get_contribution_data_by_grant
+
+
+def summed(contrib_data):
+    """Flatten contrib_data into {(grant_id, profile_id): amount} for comparison."""
+    totals = {}
+    for grant in contrib_data:
+        for contribution in grant['contributions']:
+            for profile_id, amount in contribution.items():
+                key = (grant['id'], profile_id)
+                totals[key] = totals.get(key, 0) + amount
+    return totals
+
+
+class Command(BaseCommand):
+
+    help = 'compares the query count and wall time of the per grant and bulk CLR contribution loaders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('clr_type', type=str, default='all', choices=['tech', 'media', 'all'])
+        parser.add_argument('network', type=str, default='mainnet', choices=['rinkeby', 'mainnet'])
+        parser.add_argument('--skip_legacy', help='only run the bulk loader', action='store_true')
+
+    def run(self, name, loader, grants, from_date):
+        with CaptureQueriesContext(connection) as queries:
+            start_time = time.time()
+            contrib_data = loader(grants, from_date)
+            run_time = time.time() - start_time
+        print(f"{name}: {len(queries)} queries in {round(run_time, 2)}s")
+        return contrib_data
+
+    def handle(self, *args, **options):
+        from_date = timezone.now()
+        grants = get_clr_grants(options['clr_type'], options['network'])
+        print(f"loading contributions for {grants.count()} grants")
+
+        bulk_data = self.run('bulk', get_contribution_data, grants, from_date)
+        if options['skip_legacy']:
+            return
+
+        legacy_data = self.run('per grant', get_contribution_data_by_grant, grants, from_date)
+
+        bulk_totals = summed(bulk_data)
+        legacy_totals = summed(legacy_data)
+        mismatches = [
+            key for key in set(bulk_totals) | set(legacy_totals)
+            if abs(bulk_totals.get(key, 0) - legacy_totals.get(key, 0)) > 1e-6
+        ]
+        print(f"{len(mismatches)} mismatched (grant, profile) totals")
+        for key in mismatches[:10]:
+            print(f" - {key}: bulk {bulk_totals.get(key)} vs per grant {legacy_totals.get(key)}")
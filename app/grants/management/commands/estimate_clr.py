@@ -23,7 +23,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 
 from dashboard.utils import get_tx_status, has_tx_mined
-from grants.clr import predict_clr
+from grants.clr import CLR_ENGINES, predict_clr
 from grants.models import Contribution, Grant
 from marketing.mails import warn_subscription_failed
 
@@ -37,11 +37,17 @@ class Command(BaseCommand):
         parser.add_argument('clr_type', type=str, default='all', choices=['tech', 'media', 'all'])
         parser.add_argument('network', type=str, default='mainnet', choices=['rinkeby', 'mainnet'])
         parser.add_argument('clr_amount', type=float, default=0.0)
+        parser.add_argument('--engine', type=str, default='sparse', choices=CLR_ENGINES,
+            help='CLR implementation to use for the estimates')
+        parser.add_argument('--workers', type=int, default=1,
+            help='number of processes computing prediction curves (sparse engine only)')
 
     def handle(self, *args, **options):
         clr_type = options['clr_type']
         network = options['network']
         clr_amount = options['clr_amount']
+        engine = options['engine']
+        workers = options['workers']
 
         clr_prediction_curves = predict_clr(
             random_data=False,
@@ -49,7 +55,9 @@ class Command(BaseCommand):
             from_date=timezone.now(),
             clr_type=clr_type,
             network=network,
-            clr_amount=clr_amount
+            clr_amount=clr_amount,
+            engine=engine,
+            workers=workers
         )
 
         # Uncomment these for debugging and sanity checking
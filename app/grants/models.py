@@ -948,22 +948,6 @@ def psave_grant(sender, instance, **kwargs):
             if subscription.num_tx_approved != 1:
                 instance.monthly_amount_subscribed += subscription.get_converted_monthly_amount()
         #print("-", subscription.id, value_usdt, instance.monthly_amount_subscribed )
-
-    from django.contrib.contenttypes.models import ContentType
-    from search.models import SearchResult
-    if instance.pk:
-        SearchResult.objects.update_or_create(
-            source_type=ContentType.objects.get(app_label='grants', model='grant'),
-            source_id=instance.pk,
-            defaults={
-                "created_on":instance.created_on,
-                "title":instance.title,
-                "description":instance.description,
-                "url":instance.url,
-                "visible_to":None,
-                'img_url': instance.logo.url if instance.logo else None,
-            }
-            )
     instance.amount_received_with_phantom_funds = Decimal(round(instance.get_amount_received_with_phantom_funds(), 2))
 
 class DonationQuerySet(models.QuerySet):
@@ -1258,3 +1242,10 @@ class PhantomFunding(SuperModel):
         context['tx_cleared'] = True
         context['success'] = True
         return context
+
+
+@receiver(post_save, sender=Contribution, dispatch_uid="psave_contrib_live_clr")
+@receiver(post_save, sender=PhantomFunding, dispatch_uid="psave_phantom_funding_live_clr")
+def psave_live_clr(sender, instance, **kwargs):
+    from grants.live_clr import mark_contributions_updated
+    mark_contributions_updated()
@@ -0,0 +1,72 @@
+import tempfile
+
+from grants.clr import CLRPredictor, calculate_clr_for_donation, grants_clr_calculate, predict_clr_curves
+from grants.live_clr import interpolate_clr_curve
+from grants.models import Grant
+from test_plus.test import TestCase
+
+CONTRIB_DATA = [
+    {'id': 1, 'contributions': [{'10': 5.0}, {'11': 20.0}, {'12': 1.0}, {'10': 2.5}]},
+    {'id': 2, 'contributions': [{'10': 100.0}, {'13': 3.0}]},
+    {'id': 3, 'contributions': [{'11': 7.0}, {'12': 7.0}, {'13': 7.0}, {'14': 50.0}]},
+    {'id': 4, 'contributions': [{'14': 10.0}]},
+]
+
+
+class GrantsCLRTest(TestCase):
+
+    def assert_engines_match(self, contrib_data, total_pot):
+        python_bigtot, python_totals = grants_clr_calculate(contrib_data, total_pot, 0.0, engine='python')
+        sparse_bigtot, sparse_totals = grants_clr_calculate(contrib_data, total_pot, 0.0, engine='sparse')
+
+        self.assertAlmostEqual(python_bigtot, sparse_bigtot, places=6)
+        self.assertEqual([t['id'] for t in python_totals], [t['id'] for t in sparse_totals])
+        for python_total, sparse_total in zip(python_totals, sparse_totals):
+            self.assertAlmostEqual(python_total['clr_amount'], sparse_total['clr_amount'], places=6)
+
+    def test_sparse_engine_matches_python_engine(self):
+        self.assert_engines_match(CONTRIB_DATA, 100.0)
+        self.assert_engines_match(CONTRIB_DATA, 100000.0)
+
+    def test_sparse_engine_without_pairs(self):
+        bigtot, totals = grants_clr_calculate([{'id': 1, 'contributions': [{'10': 5.0}]}], 100.0, 0.0, engine='sparse')
+
+        self.assertEqual(bigtot, 0)
+        self.assertEqual(totals, [{'id': 1, 'clr_amount': 0.0}])
+
+    def test_predictor_matches_full_recalculation(self):
+        potential_donations = [0, 1, 10, 100, 1000, 10000]
+        predictor = CLRPredictor(CONTRIB_DATA, 100.0)
+
+        for grant_id in [1, 2, 3, 4]:
+            curve = predictor.prediction_curve(grant_id, potential_donations)
+            for donation_amount, predicted_clr in zip(potential_donations, curve):
+                expected_clr, _ = calculate_clr_for_donation(Grant(pk=grant_id), donation_amount, 100.0, CONTRIB_DATA)
+                self.assertAlmostEqual(predicted_clr, expected_clr, places=6)
+
+    def test_predictor_unknown_grant(self):
+        predictor = CLRPredictor(CONTRIB_DATA, 100.0)
+
+        self.assertIsNone(predictor.predict(5, 0))
+        self.assertIsNone(predictor.predict(5, 100))
+
+    def test_predictor_dump_and_load(self):
+        potential_donations = [0, 1, 10, 100, 1000, 10000]
+        predictor = CLRPredictor(CONTRIB_DATA, 100.0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            predictor.dump(directory)
+            loaded = CLRPredictor.load(directory)
+            predictions = predict_clr_curves(loaded, [1, 2, 3, 4], potential_donations)
+
+        for grant_id in [1, 2, 3, 4]:
+            curve, _ = predictions[grant_id]
+            self.assertEqual(curve, predictor.prediction_curve(grant_id, potential_donations))
+
+    def test_interpolate_clr_curve(self):
+        curve = [[0.0, 10.0, 0.0], [1.0, 12.0, 2.0], [10.0, 30.0, 20.0], [100.0, 40.0, 30.0]]
+
+        self.assertEqual(interpolate_clr_curve(curve, 0), 0.0)
+        self.assertEqual(interpolate_clr_curve(curve, 5.5), 11.0)
+        self.assertEqual(interpolate_clr_curve(curve, 1000), 30.0)
+        self.assertIsNone(interpolate_clr_curve([], 5))
@@ -39,6 +39,13 @@ class GrantsViewResponsesTests(TestCase):
         self.assertEqual(response.status_code, expected_response['status'])
         self.assertEqual(json.loads(response.content)['categories'], expected_response['categories'])
 
+    def test_clr_estimate_rejects_invalid_amounts(self):
+        for amount in ['-1', 'foo', 'nan', 'inf', '1e400']:
+            response = self.client.get(reverse('grants:clr_estimate', args=[1]), {'amount': amount})
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['message'], 'amount must be a positive number')
+
     def test_retrieving_all_categories(self):
         all_categories = basic_grant_categories('')
 
@@ -20,14 +20,16 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 from django.urls import path, re_path
 
 from grants.views import (
-    grant_categories, grant_details, grant_fund, grant_new, grant_new_v0, grants, grants_addr_as_json, invoice,
-    leaderboard, milestones, new_matching_partner, profile, quickstart, subscription_cancel,
+    grant_categories, grant_clr_estimate, grant_details, grant_fund, grant_new, grant_new_v0, grants,
+    grants_addr_as_json, invoice, leaderboard, milestones, new_matching_partner, profile, quickstart,
+    subscription_cancel,
 )
 
 app_name = 'grants'
 urlpatterns = [
     path('', grants, name='grants'),
     path('grants.json', grants_addr_as_json, name='grants_json'),
+    path('<int:grant_id>/clr_estimate', grant_clr_estimate, name='clr_estimate'),
     path('<int:grant_id>/<slug:grant_slug>', grant_details, name='details'),
     path('<int:grant_id>/<slug:grant_slug>/', grant_details, name='details2'),
     re_path(r'^new', grant_new, name='new'),
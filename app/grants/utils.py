@@ -20,7 +20,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 import os
 from secrets import token_hex
 
-from perftools.models import JSONStore
+from perftools.utils import get_jsonstore
 
 
 def get_upload_filename(instance, filename):
@@ -30,7 +30,7 @@ def get_upload_filename(instance, filename):
 
 
 def get_leaderboard():
-    return JSONStore.objects.filter(view='grants', key='leaderboard').order_by('-pk').first().data
+    return get_jsonstore('grants', 'leaderboard').data
 
 
 def generate_leaderboard(max_items=100):
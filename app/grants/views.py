@@ -20,6 +20,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 import datetime
 import json
 import logging
+import math
 from decimal import Decimal
 
 from django.conf import settings
@@ -43,6 +44,7 @@ from dashboard.utils import get_web3, has_tx_mined
 from economy.utils import convert_amount
 from gas.utils import conf_time_spread, eth_usd_conv_rate, gas_advisories, recommend_min_gas_price_to_confirm_in_time
 from grants.forms import MilestoneForm
+from grants.live_clr import get_live_clr_model, interpolate_clr_curve
 from grants.models import (
     Contribution, Grant, GrantCategory, MatchPledge, Milestone, PhantomFunding, Subscription, Update,
 )
@@ -1042,3 +1044,45 @@ def grant_categories(request):
     return JsonResponse({
         'categories': categories
     })
+
+
+def grant_clr_estimate(request, grant_id):
+    """Estimate the CLR match unlocked by a donation of ?amount= to the grant.
+
+    Answered from the in-process live CLR model when it is ready, and from
+    the stored clr_prediction_curve while it warms up.
+
+    """
+    try:
+        amount = float(request.GET.get('amount', 0))
+    except ValueError:
+        amount = -1
+    if not math.isfinite(amount) or amount < 0:
+        return JsonResponse({'status': 400, 'message': 'amount must be a positive number'}, status=400)
+    grant = get_object_or_404(Grant, pk=grant_id)
+
+    response = {
+        'status': 200,
+        'grant_id': grant.pk,
+        'amount': amount,
+    }
+    model = get_live_clr_model(grant.grant_type, grant.network)
+    estimate = model.estimate(grant.pk, amount) if model else None
+    if estimate:
+        clr_amount, match = estimate
+        response.update({
+            'source': 'live',
+            'clr_amount': clr_amount,
+            'match': match,
+            **model.metadata(),
+        })
+    else:
+        response.update({
+            'source': 'clr_prediction_curve',
+            'clr_amount': None,
+            'match': interpolate_clr_curve(grant.clr_prediction_curve, amount),
+            'built_at': grant.last_clr_calc_date.isoformat() if grant.last_clr_calc_date else None,
+            'age_seconds': (timezone.now() - grant.last_clr_calc_date).total_seconds() if grant.last_clr_calc_date else None,
+            'stale': True,
+        })
+    return JsonResponse(response)
@@ -395,22 +395,6 @@ class Token(SuperModel):
 def psave_token(sender, instance, **kwargs):
     instance.num_clones_available_counting_indirect_send = instance._num_clones_available_counting_indirect_send
 
-    from django.contrib.contenttypes.models import ContentType
-    from search.models import SearchResult
-    if instance.pk and instance.gen == 1 and not instance.hidden:
-        SearchResult.objects.update_or_create(
-            source_type=ContentType.objects.get(app_label='kudos', model='token'),
-            source_id=instance.pk,
-            defaults={
-                "created_on":instance.created_on,
-                "title":instance.humanized_name,
-                "description":instance.description,
-                "url":instance.url,
-                "visible_to":None,
-                'img_url': instance.img_url,
-            }
-            )
-
 
 @receiver(post_save, sender=Token, dispatch_uid="postsave_token")
 def postsave_token(sender, instance, created, **kwargs):
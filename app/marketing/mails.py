@@ -18,6 +18,9 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
 import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 from django.http import Http404, HttpResponse
@@ -25,9 +28,11 @@ from django.utils import timezone, translation
 from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
 
+import requests
 import sendgrid
 from app.utils import get_profiles_from_text
 from marketing.utils import func_name, get_or_save_email_subscriber, should_suppress_notification_email
+from perftools.utils import get_jsonstore, replace_jsonstore
 from python_http_client.exceptions import HTTPError, UnauthorizedError
 from retail.emails import (
     render_admin_contact_funder, render_bounty_changed, render_bounty_expire_warning, render_bounty_feedback,
@@ -36,12 +41,13 @@ from retail.emails import (
     render_funder_stale, render_gdpr_reconsent, render_gdpr_update, render_grant_cancellation_email,
     render_grant_update, render_kudos_email, render_match_distribution, render_match_email, render_mention,
     render_new_bounty, render_new_bounty_acceptance, render_new_bounty_rejection, render_new_bounty_roundup,
-    render_new_grant_email, render_new_supporter_email, render_new_work_submission, render_no_applicant_reminder,
-    render_nth_day_email_campaign, render_quarterly_stats, render_reserved_issue, render_share_bounty,
-    render_start_work_applicant_about_to_expire, render_start_work_applicant_expired, render_start_work_approved,
-    render_start_work_new_applicant, render_start_work_rejected, render_subscription_terminated_email,
-    render_successful_contribution_email, render_support_cancellation_email, render_thank_you_for_supporting_email,
-    render_tip_email, render_unread_notification_email_weekly_roundup, render_wallpost, render_weekly_recap,
+    render_new_bounty_roundup_shared, render_new_grant_email, render_new_supporter_email, render_new_work_submission,
+    render_no_applicant_reminder, render_nth_day_email_campaign, render_quarterly_stats, render_reserved_issue,
+    render_share_bounty, render_start_work_applicant_about_to_expire, render_start_work_applicant_expired,
+    render_start_work_approved, render_start_work_new_applicant, render_start_work_rejected,
+    render_subscription_terminated_email, render_successful_contribution_email, render_support_cancellation_email,
+    render_thank_you_for_supporting_email, render_tip_email, render_unread_notification_email_weekly_roundup,
+    render_wallpost, render_weekly_recap,
 )
 from sendgrid.helpers.mail import Content, Email, Mail, Personalization
 from sendgrid.helpers.stats import Category
@@ -49,6 +55,9 @@ from townsquare.utils import is_email_townsquare_enabled, is_there_an_action_ava
 
 logger = logging.getLogger(__name__)
 
+# JSONStore view holding the last email dispatch_to_all sent to, by cursor name
+MAIL_CURSORS_VIEW = 'mail_cursors'
+
 
 def send_mail(from_email, _to_email, subject, body, html=False,
               from_name="Gitcoin.co", cc_emails=None, categories=None, debug_mode=False):
@@ -114,6 +123,159 @@ def send_mail(from_email, _to_email, subject, body, html=False,
     return response
 
 
+class MailDispatcher:
+    """Send many emails through the SendGrid API over one pooled HTTP session.
+
+    Emails added with the same sender, subject, content and categories are
+    packed into the personalizations of a single request, up to
+    max_personalizations each; per recipient differences go in their
+    substitutions. flush sends the requests from a bounded pool of workers
+    and retries them with backoff when SendGrid is throttling or failing.
+
+    Unlike send_mail, recipients are not saved as email subscribers.
+
+    """
+
+    max_personalizations = 1000
+
+    def __init__(self, workers=4, max_retries=3, backoff=1, host=None, api_key=None, debug_mode=False):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.url = f"{host or settings.SENDGRID_API_HOST}/v3/mail/send"
+        self.api_key = api_key or settings.SENDGRID_API_KEY
+        self.debug_mode = debug_mode or settings.IS_DEBUG_ENV
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pending = OrderedDict()
+
+    def add(self, from_email, to_email, subject, body, html=False,
+            from_name="Gitcoin.co", categories=None, substitutions=None):
+        """Queue an email, with the arguments of send_mail."""
+        subject = str(subject)
+        if self.debug_mode:
+            to_email = settings.CONTACT_EMAIL  # just to be double secret sure of what were doing in dev
+            subject = _("[DEBUG] ") + subject
+        message = (
+            from_email, str(from_name), subject,
+            "text/html" if html else "text/plain", html if html else body,
+            tuple(categories or ['default']),
+        )
+        personalization = {'to': [{'email': to_email}]}
+        if substitutions:
+            personalization['substitutions'] = substitutions
+        self.pending.setdefault(message, []).append(personalization)
+
+    def request_bodies(self):
+        """Return the request bodies of the queued emails."""
+        for message, personalizations in self.pending.items():
+            from_email, from_name, subject, contenttype, content, categories = message
+            for i in range(0, len(personalizations), self.max_personalizations):
+                yield {
+                    'personalizations': personalizations[i:i + self.max_personalizations],
+                    'from': {'email': from_email, 'name': from_name},
+                    'subject': subject,
+                    'content': [{'type': contenttype, 'value': content}],
+                    'categories': list(categories),
+                }
+
+    def post(self, request_body):
+        """Post a request body, retrying it with exponential backoff.
+
+        Returns:
+            bool: Whether SendGrid accepted it.
+
+        """
+        recipients = [personalization['to'][0]['email'] for personalization in request_body['personalizations']]
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                response = self.session.post(
+                    self.url, json=request_body, timeout=30,
+                    headers={'Authorization': f'Bearer {self.api_key}'},
+                )
+            except requests.ConnectionError as e:
+                # the request did not reach sendgrid, so it is safe to send again
+                logger.debug(f'-- Sendgrid Mail failure - {len(recipients)} recipients - {e}')
+                continue
+            except requests.RequestException as e:
+                # e.g. a read timeout, sendgrid may have accepted it and has no idempotency key
+                logger.warning(f'-- Sendgrid Mail failure, not retried - {len(recipients)} recipients - {e}')
+                return False
+            if response.status_code < 300:
+                logger.info(f"-- Sent Mail '{request_body['subject']}' to {len(recipients)} recipients")
+                return True
+            logger.debug(f'-- Sendgrid Mail failure - {len(recipients)} recipients - {response.status_code} {response.text}')
+            if response.status_code != 429 and response.status_code < 500:
+                return False
+        return False
+
+    def flush(self):
+        """Send the queued emails.
+
+        Returns:
+            list: The recipients of the emails SendGrid did not accept.
+
+        """
+        if not self.api_key:
+            logger.warning('No SendGrid API Key set. Not attempting to send email.')
+            return []
+
+        request_bodies = list(self.request_bodies())
+        self.pending = OrderedDict()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            sent = list(pool.map(self.post, request_bodies))
+        return [
+            personalization['to'][0]['email']
+            for request_body, accepted in zip(request_bodies, sent) if not accepted
+            for personalization in request_body['personalizations']
+        ]
+
+
+def dispatch_to_all(name, to_emails, mail_func, resume=False, batch_size=1000, **kwargs):
+    """Send mail_func to each of to_emails through a MailDispatcher, one batch of emails at a time.
+
+    The last email of each batch sent is recorded under name in the
+    mail_cursors JSONStore view, so an interrupted run can be resumed,
+    along with the recipients SendGrid did not accept.
+
+    Args:
+        name (str): The name of the cursor.
+        to_emails (iterable): The recipients, sent to in alphabetical order.
+        mail_func (callable): Sends its list of emails to the dispatcher it is given.
+        resume (bool): Whether to skip the emails up to the cursor.
+        batch_size (int): How many emails are rendered before they are sent.
+
+    Returns:
+        list: The recipients SendGrid did not accept.
+
+    """
+    to_emails = sorted(set(to_email for to_email in to_emails if to_email))
+    cursor = get_jsonstore(MAIL_CURSORS_VIEW, name) if resume else None
+    failed = []
+    if cursor:
+        to_emails = [to_email for to_email in to_emails if to_email > cursor.data['last_email']]
+        failed = cursor.data.get('failed', [])
+
+    dispatcher = MailDispatcher(**kwargs)
+    for i in range(0, len(to_emails), batch_size):
+        batch = to_emails[i:i + batch_size]
+        try:
+            mail_func(batch, dispatcher=dispatcher)
+        finally:
+            # send whatever was queued, even if the batch could not be rendered in full
+            batch_failed = dispatcher.flush()
+            if batch_failed:
+                logger.warning(f"-- {name}: sendgrid did not accept {', '.join(batch_failed)}")
+            failed += batch_failed
+        replace_jsonstore(MAIL_CURSORS_VIEW, {name: {'last_email': batch[-1], 'failed': failed}}, whole_view=False)
+        print(f"- sent {i + len(batch)} / {len(to_emails)} up to {batch[-1]}")
+    return failed
+
+
 def nth_day_email_campaign(nth, subscriber):
     firstname = subscriber.email.split('@')[0]
 
@@ -936,11 +1098,13 @@ def new_bounty_daily(bounties, old_bounties, to_emails=None):
 
             if not should_suppress_notification_email(to_email, 'new_bounty_notifications'):
                 send_mail(from_email, to_email, subject, text, html, categories=['marketing', func_name()])
+        except Exception as e:
+            logger.exception(e)
         finally:
             translation.activate(cur_language)
 
 
-def weekly_roundup(to_emails=None):
+def weekly_roundup(to_emails=None, dispatcher=None):
     if to_emails is None:
         to_emails = []
 
@@ -948,15 +1112,21 @@ def weekly_roundup(to_emails=None):
         cur_language = translation.get_language()
         try:
             setup_lang(to_email)
-            html, text, subject = render_new_bounty_roundup(to_email)
+            if dispatcher:
+                # recipients share one rendering, their links are substituted by sendgrid
+                html, text, subject, substitutions = render_new_bounty_roundup_shared(to_email)
+            else:
+                html, text, subject = render_new_bounty_roundup(to_email)
             from_email = settings.CONTACT_EMAIL
 
             if not html:
                 print("no content")
-                return
+                continue
 
             if not should_suppress_notification_email(to_email, 'roundup'):
-                send_mail(
+                kwargs = {'substitutions': substitutions} if dispatcher else {}
+                send = dispatcher.add if dispatcher else send_mail
+                send(
                     from_email,
                     to_email,
                     subject,
@@ -964,14 +1134,17 @@ def weekly_roundup(to_emails=None):
                     html,
                     from_name="Vivek and the Gitcoin Team (Gitcoin.co)",
                     categories=['marketing', func_name()],
+                    **kwargs,
                 )
             else:
                 print('supressed')
+        except Exception as e:
+            logger.exception(e)
         finally:
             translation.activate(cur_language)
 
 
-def weekly_recap(to_emails=None):
+def weekly_recap(to_emails=None, dispatcher=None):
     if to_emails is None:
         to_emails = []
 
@@ -983,7 +1156,8 @@ def weekly_recap(to_emails=None):
             from_email = settings.PERSONAL_CONTACT_EMAIL
 
             if not should_suppress_notification_email(to_email, 'weeklyrecap'):
-                send_mail(
+                send = dispatcher.add if dispatcher else send_mail
+                send(
                     from_email,
                     to_email,
                     subject,
@@ -994,6 +1168,8 @@ def weekly_recap(to_emails=None):
                 )
             else:
                 print('supressed')
+        except Exception as e:
+            logger.exception(e)
         finally:
             translation.activate(cur_language)
 
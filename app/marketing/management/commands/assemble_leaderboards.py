@@ -23,7 +23,8 @@ from django.db import transaction
 from django.utils import timezone
 
 from cacheops import CacheMiss, cache
-from dashboard.models import Bounty, Profile, Tip
+from dashboard.models import Bounty, BountyFulfillment, Profile, Tip, UserAction
+from economy.utils import use_conversion_rate_index
 from grants.models import Contribution
 from kudos.models import KudosTransfer
 from marketing.models import LeaderboardRank
@@ -76,9 +77,88 @@ def default_ranks():
 
 ranks = default_ranks()
 counts = default_ranks()
+# batched lookups for the current do_leaderboard run; None outside of one
+lookups = None
+
+
+class LeaderboardLookups:
+    """Resolve the profiles, locations and fulfillments a leaderboard run needs in bulk.
+
+    Built once per do_leaderboard run so the per row helpers below can answer
+    from memory instead of issuing a query (or a cache round trip) per row.
+
+    """
+
+    def __init__(self, contributions, bounties, tips, kudos_transfers):
+        self.profiles = {}
+        profiles = Profile.objects.values('id', 'handle', 'suppress_leaderboard', 'hide_profile', 'keywords')
+        for profile in profiles.iterator():
+            # the per row queries matched handle=handle.lower(), and handles are
+            # unique, so only a profile stored in lower case can be resolved
+            if profile['handle'] == profile['handle'].lower():
+                self.profiles[profile['handle']] = profile
+
+        self.fulfillers = {}
+        fulfillments = BountyFulfillment.objects.filter(accepted=True, bounty__in=bounties).values_list('bounty_id', 'fulfiller_github_username')
+        for bounty_id, username in fulfillments.iterator():
+            self.fulfillers.setdefault(bounty_id, []).append(username)
+
+        handles = set(username for usernames in self.fulfillers.values() for username in usernames)
+        handles.update(bounties.values_list('bounty_owner_github_username', flat=True))
+        handles.update(contributions.values_list('subscription__contributor_profile__handle', flat=True))
+        handles.update(contributions.values_list('subscription__grant__admin_profile__handle', flat=True))
+        for queryset in [tips, kudos_transfers]:
+            for username, from_username in queryset.values_list('username', 'from_username').iterator():
+                handles.update([username, from_username])
+        self.locations = self.get_locations(handles)
+        self.github_names = {}
+
+    def get_locations(self, handles):
+        """Return {handle: Profile.locations} for the given handles."""
+        from app.utils import get_locations_from_ips
+
+        profile_handles = {}
+        for handle in handles:
+            profile = self.profiles.get(handle.lower()) if handle else None
+            if profile:
+                profile_handles[profile['id']] = handle.lower()
+
+        locations = {handle: [] for handle in profile_handles.values()}
+        profile_ids = list(profile_handles.keys())
+        for i in range(0, len(profile_ids), 5000):
+            logins = UserAction.objects.filter(action='Login', profile_id__in=profile_ids[i:i + 5000])
+            logins = list(logins.values_list('pk', 'profile_id', 'location_data', 'ip_address'))
+            ip_locations = get_locations_from_ips(
+                ip_address for _, _, location_data, ip_address in logins if not location_data
+            )
+            for pk, profile_id, location_data, ip_address in logins:
+                if not location_data:
+                    location_data = ip_locations[ip_address]
+                    UserAction.objects.filter(pk=pk).update(location_data=location_data)
+                locations[profile_handles[profile_id]].append(location_data)
+        return locations
+
+    def is_github_name(self, index_term):
+        if index_term not in self.github_names:
+            self.github_names[index_term] = is_github_name(index_term)
+        return self.github_names[index_term]
+
+
+def accepted_fulfillers(bounty):
+    if lookups:
+        return lookups.fulfillers.get(bounty.pk, [])
+    return list(bounty.fulfillments.filter(accepted=True).values_list('fulfiller_github_username', flat=True))
+
+
+def is_github_name(index_term):
+    is_github_org_name = Bounty.objects.filter(github_url__icontains=f'https://github.com/{index_term}').exists()
+    is_github_repo_name = Bounty.objects.filter(github_url__icontains=f'/{index_term}/').exists()
+    return is_github_org_name or is_github_repo_name
 
 
 def profile_to_location(handle):
+    if lookups:
+        return lookups.locations.get(handle.lower(), []) if handle else []
     timeout = 60 * 20
     key_salt = '1'
     key = f'profile_to_location{handle}_{key_salt}'
@@ -105,10 +185,7 @@ def profile_to_location_helper(handle):
 
 def bounty_to_location(bounty):
     locations = profile_to_location(bounty.bounty_owner_github_username)
-    fulfiller_usernames = list(
-        bounty.fulfillments.filter(accepted=True).values_list('fulfiller_github_username', flat=True)
-    )
-    for username in fulfiller_usernames:
+    for username in accepted_fulfillers(bounty):
         locations = locations + profile_to_location(username)
     return locations
 
@@ -163,9 +240,9 @@ def bounty_index_terms(bounty):
         index_terms.append(bounty.bounty_owner_github_username.lower())
     if bounty.org_name:
         index_terms.append(bounty.org_name.lower())
-    for fulfiller in bounty.fulfillments.filter(accepted=True):
-        if not should_suppress_leaderboard(fulfiller.fulfiller_github_username):
-            index_terms.append(fulfiller.fulfiller_github_username.lower())
+    for fulfiller_github_username in accepted_fulfillers(bounty):
+        if not should_suppress_leaderboard(fulfiller_github_username):
+            index_terms.append(fulfiller_github_username.lower())
     index_terms.append(bounty.token_name)
     for keyword in bounty_to_city(bounty):
         index_terms.append(keyword)
@@ -232,7 +309,7 @@ def add_element(key, index_term, amount):
 
 
 def sum_bounty_helper(b, time, index_term, val_usd):
-    fulfiller_index_terms = list(b.fulfillments.filter(accepted=True).values_list('fulfiller_github_username', flat=True))
+    fulfiller_index_terms = accepted_fulfillers(b)
     add_element(f'{time}_{ALL}', index_term, val_usd)
     add_element(f'{time}_{FULFILLED}', index_term, val_usd)
     if index_term == b.bounty_owner_github_username and index_term not in IGNORE_PAYERS:
@@ -250,9 +327,7 @@ def sum_bounty_helper(b, time, index_term, val_usd):
     if index_term in bounty_to_continent(b):
         add_element(f'{time}_{CONTINENTS}', index_term, val_usd)
     if index_term.lower() in (k.lower() for k in b.keywords_list):
-        is_github_org_name = Bounty.objects.filter(github_url__icontains=f'https://github.com/{index_term}').exists()
-        is_github_repo_name = Bounty.objects.filter(github_url__icontains=f'/{index_term}/').exists()
-        if not is_github_repo_name and not is_github_org_name:
+        if not (lookups.is_github_name(index_term) if lookups else is_github_name(index_term)):
             add_element(f'{time}_{KEYWORDS}', index_term.lower(), val_usd)
 
 
@@ -376,6 +451,9 @@ def sum_grant_helper(gc, time, index_term, val_usd):
 def should_suppress_leaderboard(handle):
     if not handle:
         return True
+    if lookups:
+        profile = lookups.profiles.get(handle.lower())
+        return bool(profile and (profile['suppress_leaderboard'] or profile['hide_profile']))
     profiles = Profile.objects.filter(handle=handle.lower())
     if profiles.exists():
         profile = profiles.first()
@@ -418,91 +496,102 @@ def do_leaderboard_feed():
 
 
 
+def merge_ranks(product_ranks):
+    """Sum per product ranks (or counts) into the ranks of the 'all' product."""
+    merged = default_ranks()
+    for _ranks in product_ranks:
+        for key, rankings in _ranks.items():
+            for index_term, amount in rankings.items():
+                merged[key][index_term] = merged[key].get(index_term, 0) + amount
+    return merged
+
+
+def leaderboard_ranks(product, product_ranks, product_counts, created_on):
+    """Build the unsaved LeaderboardRank objects of a product, resolving profiles from lookups."""
+    for key, rankings in product_ranks.items():
+        rank = 1
+        for index_term, amount in sorted(rankings.items(), key=lambda x: x[1], reverse=True):
+            profile = lookups.profiles.get(index_term.lower())
+            yield LeaderboardRank(
+                count=product_counts[key][index_term],
+                active=True,
+                amount=amount,
+                rank=rank,
+                leaderboard=key,
+                github_username=index_term,
+                product=product,
+                created_on=created_on,
+                profile_id=profile['id'] if profile else None,
+                tech_keywords=profile['keywords'] if profile else [],
+            )
+            rank += 1
+
+
 def do_leaderboard():
+    global lookups
+
+    contributions = Contribution.objects.filter(subscription__network='mainnet').select_related(
+        'subscription__contributor_profile', 'subscription__grant__admin_profile'
+    )
+    bounties = Bounty.objects.current().filter(network='mainnet')
+    tips = Tip.objects.send_success().filter(network='mainnet')
+    kudos_transfers = KudosTransfer.objects.send_success().filter(network='mainnet').select_related('kudos_token_cloned_from')
+    lookups = LeaderboardLookups(contributions, bounties, tips, kudos_transfers)
+    try:
+        do_leaderboard_with_lookups(contributions, bounties, tips, kudos_transfers)
+    finally:
+        lookups = None
+
+
+def do_leaderboard_with_lookups(contributions, bounties, tips, kudos_transfers):
     global ranks
     global counts
 
-    products = ['kudos', 'grants', 'bounties', 'tips', 'all']
-    for product in products:
-
+    # walk each source once; the 'all' product is the sum of the others
+    product_ranks = {}
+    product_counts = {}
+    for product in ['grants', 'bounties', 'tips', 'kudos']:
         ranks = default_ranks()
         counts = default_ranks()
-        index_terms = []
 
-        if product in ['all', 'grants']:
-            # get grants
-            grants = Contribution.objects.filter(subscription__network='mainnet')
-            # iterate
-            for gc in grants:
+        if product == 'grants':
+            for gc in contributions.iterator():
                 index_terms = grant_index_terms(gc)
                 sum_grants(gc, index_terms)
 
-        if product in ['all', 'bounties']:
-            # get bounties
-            bounties = Bounty.objects.current().filter(network='mainnet')
-
-            # iterate
-            for b in bounties:
+        if product == 'bounties':
+            for b in bounties.iterator():
                 if not b._val_usd_db:
                     continue
-
                 index_terms = bounty_index_terms(b)
                 sum_bounties(b, index_terms)
 
-        if product in ['all', 'tips']:
-            # get tips
-            tips = Tip.objects.send_success().filter(network='mainnet')
-
-            # iterate
-            for t in tips:
+        if product == 'tips':
+            for t in tips.iterator():
                 if not t.value_in_usdt_now:
                     continue
                 index_terms = tip_index_terms(t)
                 sum_tips(t, index_terms)
 
-        if product in ['all', 'kudos']:
-            # kudos'
-            for kt in KudosTransfer.objects.send_success().filter(network='mainnet'):
+        if product == 'kudos':
+            for kt in kudos_transfers.iterator():
                 sum_kudos(kt)
 
-        # set old LR as inactive
-        created_on = timezone.now()
+        product_ranks[product] = ranks
+        product_counts[product] = counts
+
+    product_ranks['all'] = merge_ranks(product_ranks.values())
+    product_counts['all'] = merge_ranks(product_counts.values())
+
+    created_on = timezone.now()
+    for product in ['kudos', 'grants', 'bounties', 'tips', 'all']:
+        lbrs = list(leaderboard_ranks(product, product_ranks[product], product_counts[product], created_on))
+
+        # set old LR as inactive and save new LR in DB
         with transaction.atomic():
-            lrs = LeaderboardRank.objects.active().filter(product=product)
-            lrs.update(active=False)
-
-            # save new LR in DB
-            for key, rankings in ranks.items():
-                rank = 1
-                for index_term, amount in sorted(rankings.items(), key=lambda x: x[1], reverse=True):
-                    count = counts[key][index_term]
-                    lbr_kwargs = {
-                        'count': count,
-                        'active': True,
-                        'amount': amount,
-                        'rank': rank,
-                        'leaderboard': key,
-                        'github_username': index_term,
-                        'product': product,
-                        'created_on': created_on,
-                    }
-
-                    try:
-                        profile = Profile.objects.get(handle=index_term.lower())
-                        lbr_kwargs['profile'] = profile
-                        lbr_kwargs['tech_keywords'] = profile.keywords
-                    except Profile.MultipleObjectsReturned:
-                        profile = Profile.objects.filter(handle=index_term.lower()).latest('id')
-                        lbr_kwargs['profile'] = profile
-                        lbr_kwargs['tech_keywords'] = profile.keywords
-                        print(f'Multiple profiles found for username: {index_term}')
-                    except Profile.DoesNotExist:
-                        print(f'No profiles found for username: {index_term}')
-
-                    # TODO: Bucket LeaderboardRank objects and .bulk_create
-                    LeaderboardRank.objects.create(**lbr_kwargs)
-                    rank += 1
-                    print(key, index_term, amount, count, rank, product)
+            LeaderboardRank.objects.active().filter(product=product).update(active=False)
+            LeaderboardRank.objects.bulk_create(lbrs, batch_size=1000)
+        print(product, len(lbrs))
 
 
 class Command(BaseCommand):
@@ -510,5 +599,6 @@ class Command(BaseCommand):
     help = 'creates leaderboard objects'
 
     def handle(self, *args, **options):
-        do_leaderboard()
+        with use_conversion_rate_index():
+            do_leaderboard()
         do_leaderboard_feed()
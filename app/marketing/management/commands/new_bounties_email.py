@@ -16,6 +16,7 @@
 
 '''
 import logging
+from collections import defaultdict
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -24,27 +25,46 @@ from django.utils import timezone
 from dashboard.models import Bounty
 from marketing.mails import new_bounty_daily
 from marketing.models import EmailSubscriber
-from townsquare.utils import is_email_townsquare_enabled
+from townsquare.utils import get_townsquare_enabled_emails
 
 
-def get_bounties_for_keywords(keywords, hours_back):
-    new_bounties_pks = []
-    all_bounties_pks = []
+def get_keyword_bounties(keywords, hours_back):
+    """Resolve the bounties matching each of the keywords, once per distinct keyword.
 
+    Returns:
+        dict: The pks of the new bounties and of all the bounties matching each keyword.
+
+    """
     new_bounty_cutoff = (timezone.now() - timezone.timedelta(hours=hours_back))
     all_bounty_cutoff = (timezone.now() - timezone.timedelta(days=60))
 
-    for keyword in keywords:
+    keyword_bounties = {}
+    for keyword in set(keywords):
         relevant_bounties = Bounty.objects.current().filter(
             network='mainnet',
             idx_status__in=['open'],
+            web3_created__gt=all_bounty_cutoff,
         ).keyword(keyword).exclude(bounty_reserved_for_user__isnull=False)
-        for bounty in relevant_bounties.filter(web3_created__gt=new_bounty_cutoff):
-            new_bounties_pks.append(bounty.pk)
-        for bounty in relevant_bounties.filter(web3_created__gt=all_bounty_cutoff):
-            all_bounties_pks.append(bounty.pk)
+        new_bounties_pks, all_bounties_pks = set(), set()
+        for pk, web3_created in relevant_bounties.values_list('pk', 'web3_created'):
+            all_bounties_pks.add(pk)
+            if web3_created > new_bounty_cutoff:
+                new_bounties_pks.add(pk)
+        keyword_bounties[keyword] = (new_bounties_pks, all_bounties_pks)
+    return keyword_bounties
+
+
+def get_bounties_for_keywords(keywords, hours_back, keyword_bounties=None):
+    if keyword_bounties is None:
+        keyword_bounties = get_keyword_bounties(keywords, hours_back)
+    new_bounties_pks = set()
+    all_bounties_pks = set()
+    for keyword in keywords:
+        new_keyword_pks, all_keyword_pks = keyword_bounties[keyword]
+        new_bounties_pks.update(new_keyword_pks)
+        all_bounties_pks.update(all_keyword_pks)
     new_bounties = Bounty.objects.filter(pk__in=new_bounties_pks).order_by('-_val_usd_db')
-    all_bounties = Bounty.objects.filter(pk__in=all_bounties_pks).exclude(pk__in=new_bounties_pks).order_by('-_val_usd_db')
+    all_bounties = Bounty.objects.filter(pk__in=all_bounties_pks - new_bounties_pks).order_by('-_val_usd_db')
 
     new_bounties = new_bounties.order_by('-admin_mark_as_remarket_ready')
     all_bounties = all_bounties.order_by('-admin_mark_as_remarket_ready')
@@ -62,29 +82,37 @@ class Command(BaseCommand):
             return
         hours_back = 24
         eses = EmailSubscriber.objects.filter(active=True)
-        counter_grant_total = 0
+        print("got {} emails".format(eses.count()))
+
+        # subscribers with the same keywords get the same digest
+        townsquare_emails = get_townsquare_enabled_emails()
+        digests = defaultdict(list)
+        for to_email, keywords in eses.values_list('email', 'keywords').iterator():
+            town_square_enabled = to_email in townsquare_emails
+            if keywords or town_square_enabled:
+                digests[(tuple(sorted(set(keywords))), town_square_enabled)].append(to_email)
+        keyword_bounties = get_keyword_bounties(
+            [keyword for keywords, _ in digests.keys() for keyword in keywords], hours_back
+        )
+        print("got {} digests for {} keywords".format(len(digests), len(keyword_bounties)))
+
         counter_total = 0
         counter_sent = 0
-        print("got {} emails".format(eses.count()))
-        for es in eses:
+        for (keywords, town_square_enabled), to_emails in digests.items():
             try:
-                counter_grant_total += 1
-                to_email = es.email
-                keywords = es.keywords
-                town_square_enabled = is_email_townsquare_enabled(to_email)
-                should_eval = keywords or town_square_enabled
-                if not should_eval:
-                    continue
-                counter_total += 1
-                new_bounties, all_bounties = get_bounties_for_keywords(keywords, hours_back)
-                print("{}/{}/{}) {}/{}: got {} new bounties & {} all bounties".format(counter_sent, counter_total, counter_grant_total, to_email, keywords, new_bounties.count(), all_bounties.count()))
+                counter_total += len(to_emails)
+                new_bounties, all_bounties = get_bounties_for_keywords(keywords, hours_back, keyword_bounties)
+                # evaluated once for the whole group
+                new_bounties = new_bounties[:10]
+                len(new_bounties)
+                len(all_bounties)
+                print("{}/{}) {} emails/{}: got {} new bounties & {} all bounties".format(counter_sent, counter_total, len(to_emails), keywords, new_bounties.count(), all_bounties.count()))
                 should_send = new_bounties.count() or town_square_enabled
-                #should_send = new_bounties.count()
                 if should_send:
-                    print(f"sending to {to_email}")
-                    new_bounty_daily(new_bounties, all_bounties, [to_email])
-                    print(f"/sent to {to_email}")
-                    counter_sent += 1
+                    print(f"sending to {len(to_emails)} emails")
+                    new_bounty_daily(new_bounties, all_bounties, to_emails)
+                    print(f"/sent to {len(to_emails)} emails")
+                    counter_sent += len(to_emails)
             except Exception as e:
                 logging.exception(e)
                 print(e)
@@ -15,12 +15,11 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 '''
-import time
 import warnings
 
 from django.core.management.base import BaseCommand
 
-from marketing.mails import weekly_roundup
+from marketing.mails import dispatch_to_all, weekly_roundup
 from marketing.models import EmailSubscriber
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -65,46 +64,38 @@ class Command(BaseCommand):
             help="filter_startswith (optional)",
         )
         parser.add_argument(
-            '--start_counter',
-            dest='start_counter',
+            '--resume',
+            action='store_true',
+            dest='resume',
+            default=False,
+            help="skip the emails sent to by the last run (optional)",
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers',
             type=int,
-            default=0,
-            help="start_counter (optional)",
+            default=4,
+            help="how many requests to send to sendgrid at once (optional)",
         )
 
     def handle(self, *args, **options):
 
         exclude_startswith = options['exclude_startswith']
         filter_startswith = options['filter_startswith']
-        start_counter = options['start_counter']
 
         queryset = EmailSubscriber.objects.all()
         if exclude_startswith:
             queryset = queryset.exclude(email__startswith=exclude_startswith)
         if filter_startswith:
             queryset = queryset.filter(email__startswith=filter_startswith)
-        queryset = queryset.order_by('email')
-        email_list = list(set(queryset.values_list('email', flat=True)))
-        # list.sort(email_list)
+        email_list = set(queryset.values_list('email', flat=True))
+        if check_already_sent:
+            email_list = [to_email for to_email in email_list if not is_already_sent_this_week(to_email)]
 
         print("got {} emails".format(len(email_list)))
 
-        counter = 0
-        for to_email in email_list:
-            counter += 1
-
-            # skip any that are below the start counter
-            if counter < start_counter:
-                continue
-
-            print("-sending {} / {}".format(counter, to_email))
-            if options['live']:
-                try:
-                    if check_already_sent and is_already_sent_this_week(to_email):
-                        print(' -- already sent')
-                    else:
-                        weekly_roundup([to_email])
-                        time.sleep(1)
-                except Exception as e:
-                    print(e)
-                    time.sleep(5)
+        if options['live']:
+            failed = dispatch_to_all(
+                'roundup', email_list, weekly_roundup, resume=options['resume'], workers=options['workers']
+            )
+            print("failed to send to {} emails".format(len(failed)))
@@ -15,13 +15,12 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 '''
-import time
 import warnings
 
 from django.core.management.base import BaseCommand
 
 from dashboard.models import Profile
-from marketing.mails import weekly_recap
+from marketing.mails import dispatch_to_all, weekly_recap
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
@@ -38,6 +37,20 @@ class Command(BaseCommand):
             default=False,
             help='Actually Send the emails'
         )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            dest='resume',
+            default=False,
+            help="skip the emails sent to by the last run (optional)",
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers',
+            type=int,
+            default=4,
+            help="how many requests to send to sendgrid at once (optional)",
+        )
 
     def handle(self, *args, **options):
         profiles = Profile.objects.active()
@@ -45,12 +58,8 @@ class Command(BaseCommand):
         email_list = list(set(email_list))
         print("trying to send to the following amount of receipients: "+str(len(email_list)))
 
-        for counter, to_email in enumerate(email_list):
-            print(f"- sending {counter+1} / {to_email}")
-            if options['live'] and to_email:
-                try:
-                    weekly_recap([to_email])
-                    time.sleep(1)
-                except Exception as e:
-                    print(e)
-                    time.sleep(5)
+        if options['live']:
+            failed = dispatch_to_all(
+                'weekly_recap', email_list, weekly_recap, resume=options['resume'], workers=options['workers']
+            )
+            print("failed to send to {} emails".format(len(failed)))
@@ -18,11 +18,15 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
 from datetime import date, datetime, timedelta
+from unittest.mock import patch
 
 from dashboard.models import Bounty, BountyFulfillment, Profile, Tip, UserAction
+from grants.models import Contribution
+from kudos.models import KudosTransfer
 from marketing.management.commands import assemble_leaderboards
 from marketing.management.commands.assemble_leaderboards import (
-    BREAKDOWNS, TIMES, Command, bounty_index_terms, default_ranks, sum_bounties, sum_tips, tip_index_terms,
+    BREAKDOWNS, TIMES, Command, LeaderboardLookups, bounty_index_terms, default_ranks, do_leaderboard,
+    should_suppress_leaderboard, sum_bounties, sum_tips, tip_index_terms,
 )
 from marketing.models import LeaderboardRank
 from pytz import UTC
@@ -152,6 +156,29 @@ class TestAssembleLeaderboards(TestCase):
 
         assert len(ranks) == len(TIMES) * len(BREAKDOWNS)
 
+    def test_lookups_resolve_handles_like_the_per_row_queries(self):
+        """Test only the lower case profile of a handle is resolved."""
+        fred = Profile.objects.create(handle='fred', data={}, suppress_leaderboard=True)
+        other_fred = Profile.objects.create(handle='other_fred', data={})
+        Profile.objects.filter(pk=other_fred.pk).update(handle='Fred')
+
+        lookups = LeaderboardLookups(
+            Contribution.objects.none(), Bounty.objects.none(), Tip.objects.none(), KudosTransfer.objects.none()
+        )
+
+        assert lookups.profiles['fred']['id'] == fred.pk
+        with patch.object(assemble_leaderboards, 'lookups', lookups):
+            assert should_suppress_leaderboard('Fred')
+
+    @patch('marketing.management.commands.assemble_leaderboards.do_leaderboard_with_lookups')
+    def test_do_leaderboard_resets_lookups(self, do_leaderboard_with_lookups):
+        """Test the lookups of a failed run are not used outside of it."""
+        do_leaderboard_with_lookups.side_effect = ValueError
+
+        with self.assertRaises(ValueError):
+            do_leaderboard()
+        assert assemble_leaderboards.lookups is None
+
     def test_bounty_index_terms(self):
         """Test bounty index terms list."""
         index_terms = bounty_index_terms(self.bounty)
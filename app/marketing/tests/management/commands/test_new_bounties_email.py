@@ -5,7 +5,7 @@ from django.utils import timezone
 
 import pytest
 from dashboard.models import Bounty, Profile
-from marketing.management.commands.new_bounties_email import get_bounties_for_keywords
+from marketing.management.commands.new_bounties_email import get_bounties_for_keywords, get_keyword_bounties
 from marketing.models import Keyword
 from test_plus.test import TestCase
 
@@ -74,3 +74,11 @@ class TestNewBountiesEmail(TestCase):
         """Test get_bounties_for_keywords function to confirm a bounty reserved for a specific user is excluded."""
         new_bounties, _all_bounties = get_bounties_for_keywords('Python',24)
         assert new_bounties.count() == 1
+
+    def test_get_keyword_bounties(self):
+        """Test get_keyword_bounties resolves each distinct keyword once."""
+        with self.assertNumQueries(2):
+            keyword_bounties = get_keyword_bounties(['Python', 'python', 'Python'], 24)
+        assert set(keyword_bounties.keys()) == {'Python', 'python'}
+        new_bounties, _all_bounties = get_bounties_for_keywords(['Python', 'python'], 24, keyword_bounties)
+        assert new_bounties.count() == 1
@@ -17,7 +17,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
 from marketing.management.commands.roundup import Command
 from marketing.models import EmailSubscriber
@@ -53,7 +53,7 @@ class TestRoundup(TestCase):
     @patch('marketing.management.commands.roundup.weekly_roundup')
     def test_handle_no_options(self, mock_weekly_roundup, *args):
         """Test command roundup when live option is False."""
-        Command().handle(exclude_startswith=None, filter_startswith=None, start_counter=0, live=False)
+        Command().handle(exclude_startswith=None, filter_startswith=None, resume=False, workers=1, live=False)
 
         assert mock_weekly_roundup.call_count == 0
 
@@ -61,8 +61,8 @@ class TestRoundup(TestCase):
     @patch('marketing.management.commands.roundup.weekly_roundup')
     def test_handle_with_options(self, mock_weekly_roundup, *args):
         """Test command roundup which various options."""
-        Command().handle(exclude_startswith='f', filter_startswith='jack', start_counter=0, live=True)
+        Command().handle(exclude_startswith='f', filter_startswith='jack', resume=False, workers=1, live=True)
 
         assert mock_weekly_roundup.call_count == 1
 
-        mock_weekly_roundup.assert_called_once_with(['jackson@bar.com'])
+        mock_weekly_roundup.assert_called_once_with(['jackson@bar.com'], dispatcher=ANY)
@@ -17,13 +17,21 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 """
-from unittest.mock import patch
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock, Mock, patch
 
+from django.test import override_settings
 from django.utils import timezone
 
 from dashboard.models import Profile
-from marketing.mails import nth_day_email_campaign, setup_lang
-from retail.emails import render_nth_day_email_campaign
+from marketing.mails import (
+    MAIL_CURSORS_VIEW, MailDispatcher, dispatch_to_all, new_bounty_daily, nth_day_email_campaign, setup_lang,
+)
+from perftools.utils import get_jsonstore
+from retail import emails
+from retail.emails import personalize_email, render_nth_day_email_campaign, render_shared_email
 from test_plus.test import TestCase
 
 
@@ -77,3 +85,109 @@ class MarketingMailsTest(TestCase):
 
         nth_day_email_campaign(self.days[2], self.user)
         assert mock_send_mail.call_count == 1
+
+    @patch('marketing.mails.send_mail')
+    @patch('marketing.mails.render_new_bounty')
+    def test_new_bounty_daily_continues_past_failing_recipients(self, mock_render_new_bounty, mock_send_mail):
+        """Test one recipient that cannot be rendered does not stop the rest of the group."""
+        mock_render_new_bounty.side_effect = [ValueError('render failed'), ('html', 'text')]
+
+        new_bounty_daily(MagicMock(), MagicMock(), ['a@gitcoin.co', 'b@gitcoin.co'])
+        assert mock_send_mail.call_count == 1
+        assert mock_send_mail.call_args[0][1] == 'b@gitcoin.co'
+
+
+class SendGridStub(BaseHTTPRequestHandler):
+    """Record the mail send requests, answering them with the queued status codes."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.bodies.append(body)
+        self.send_response(self.server.statuses.pop(0) if self.server.statuses else 202)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(IS_DEBUG_ENV=False)
+class MailDispatcherTest(TestCase):
+    """Define tests for the batched SendGrid dispatcher."""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), SendGridStub)
+        self.server.bodies = []
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = f'http://127.0.0.1:{self.server.server_port}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def dispatcher(self, **kwargs):
+        return MailDispatcher(workers=2, backoff=0, host=self.host, api_key='key', **kwargs)
+
+    def test_packs_recipients_of_the_same_email(self):
+        dispatcher = self.dispatcher()
+        dispatcher.max_personalizations = 2
+        for to_email in ['a@foo.bar', 'b@foo.bar', 'c@foo.bar']:
+            dispatcher.add('from@foo.bar', to_email, 'subject', 'text', '<p>html</p>', categories=['marketing'])
+        dispatcher.add('from@foo.bar', 'd@foo.bar', 'other subject', 'text', '<p>html</p>', categories=['marketing'])
+
+        assert dispatcher.flush() == []
+        recipients = sorted(
+            [personalization['to'][0]['email'] for personalization in body['personalizations']]
+            for body in self.server.bodies
+        )
+        assert recipients == [['a@foo.bar', 'b@foo.bar'], ['c@foo.bar'], ['d@foo.bar']]
+        assert self.server.bodies[0]['content'] == [{'type': 'text/html', 'value': '<p>html</p>'}]
+
+    def test_retries_with_backoff(self):
+        self.server.statuses = [503, 429, 400]
+        dispatcher = self.dispatcher(max_retries=3)
+        dispatcher.add('from@foo.bar', 'a@foo.bar', 'subject', 'text')
+
+        assert dispatcher.flush() == ['a@foo.bar']
+        assert len(self.server.bodies) == 3
+
+    def test_dispatch_to_all_flushes_a_failed_batch(self):
+        self.server.statuses = [400]
+
+        def mail_func(to_emails, dispatcher):
+            for to_email in to_emails:
+                dispatcher.add('from@foo.bar', to_email, 'subject', 'text')
+            raise ValueError('render failed')
+
+        with self.assertRaises(ValueError):
+            dispatch_to_all('test', ['b@foo.bar', 'a@foo.bar'], mail_func, host=self.host, api_key='key', backoff=0)
+        assert len(self.server.bodies) == 1
+        assert get_jsonstore(MAIL_CURSORS_VIEW, 'test') is None
+
+        failed = dispatch_to_all('test', ['a@foo.bar', 'b@foo.bar'], lambda to_emails, dispatcher: None, host=self.host, api_key='key')
+        assert failed == []
+        assert get_jsonstore(MAIL_CURSORS_VIEW, 'test').data == {'last_email': 'b@foo.bar', 'failed': []}
+
+
+@patch('retail.emails.premailer_transform', lambda html: html)
+@patch('retail.emails.render_to_string', lambda name, params: f"{name} {params['subscriber'].priv}")
+class SharedEmailTest(TestCase):
+    """Define tests for the render once email cache."""
+
+    def setUp(self):
+        emails._shared_emails.clear()
+
+    def test_renders_once_per_content(self):
+        build_params = Mock(return_value={})
+
+        html, text, substitutions = render_shared_email('emails/roundup', build_params, 'week 1', 'a@foo.bar')
+        other_html, _, other_substitutions = render_shared_email('emails/roundup', build_params, 'week 1', 'b@foo.bar')
+
+        assert build_params.call_count == 1
+        assert html == other_html
+        assert text == f'emails/roundup.txt {emails.PRIV_PLACEHOLDER}'
+        assert personalize_email(html, substitutions) == f"emails/roundup.html {substitutions[emails.PRIV_PLACEHOLDER]}"
+        assert personalize_email(html, substitutions) != personalize_email(other_html, other_substitutions)
+
+        render_shared_email('emails/roundup', build_params, 'week 2', 'a@foo.bar')
+        assert build_params.call_count == 2
@@ -16,23 +16,61 @@
 
 '''
 
-import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models, transaction
-from django.db.models import Count, Q
-from django.db.models.query import QuerySet
-from django.forms.models import model_to_dict
-from django.utils.encoding import force_text
-from django.utils.functional import Promise
-
-from dashboard.models import Profile
-from economy.models import EncodeAnything, SuperModel
-from perftools.models import JSONStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from dashboard.models import Profile, TribeMember
+from perftools.utils import get_jsonstore, replace_jsonstore
 from retail.utils import build_stat_results, programming_languages
 
+logger = logging.getLogger(__name__)
+
+# JSONStore view holding the timing, row count and input fingerprint of each builder's last run
+BUILDS_VIEW = 'page_cache_builds'
+BUILDERS = {}
+
+
+def cache_builder(name, depends_on=(), inputs=None, in_debug=False):
+    """Register a page cache builder.
+
+    Args:
+        name (str): The builder name, as passed to --builders.
+        depends_on (tuple): Builders that have to finish first, e.g. because
+            this one reads their JSONStore rows.
+        inputs (callable): Returns a JSON serializable fingerprint of the
+            builder's inputs; the builder is skipped while it is unchanged.
+            Builders without one (external or time windowed inputs) always run.
+        in_debug (bool): Whether to also run when settings.DEBUG is set.
+
+    The decorated function builds its cache and returns the rows it wrote.
+
+    """
+    def register(func):
+        BUILDERS[name] = {
+            'func': func,
+            'depends_on': tuple(depends_on),
+            'inputs': inputs,
+            'in_debug': in_debug,
+        }
+        return func
+    return register
+
+
+def table_fingerprint(*querysets):
+    """Fingerprint SuperModel querysets by their row count and latest modification."""
+    fingerprint = []
+    for queryset in querysets:
+        stats = queryset.aggregate(count=Count('id'), modified_on=Max('modified_on'))
+        fingerprint.append([stats['count'], stats['modified_on'].isoformat() if stats['modified_on'] else None])
+    return fingerprint
+
 
 def fetchPost(qt='2'):
     import requests
@@ -41,22 +79,16 @@ def fetchPost(qt='2'):
     last_posts = requests.get(url=url).json()
     return last_posts
 
+@cache_builder('hidden_profiles', inputs=lambda: table_fingerprint(Profile.objects.hidden()), in_debug=True)
 def create_hidden_profiles_cache():
 
     handles = list(Profile.objects.hidden().values_list('handle', flat=True))
-
-    view = 'hidden_profiles'
-    keyword = 'hidden_profiles'
-    with transaction.atomic():
-        JSONStore.objects.filter(view=view).all().delete()
-        data = handles
-        JSONStore.objects.create(
-            view=view,
-            key=keyword,
-            data=data,
-            )
+    return replace_jsonstore('hidden_profiles', {'hidden_profiles': handles})
 
 
+@cache_builder('tribes', inputs=lambda: table_fingerprint(
+    Profile.objects.filter(data__type='Organization'), TribeMember.objects.all()
+))
 def create_tribes_cache():
 
     _tribes = Profile.objects.filter(data__type='Organization').\
@@ -72,34 +104,25 @@ def create_tribes_cache():
         }
         tribes.append(tribe)
 
-    view = 'tribes'
-    keyword = 'tribes'
-    with transaction.atomic():
-        JSONStore.objects.filter(view=view).all().delete()
-        data = tribes
-        JSONStore.objects.create(
-            view=view,
-            key=keyword,
-            data=data,
-            )
+    return replace_jsonstore('tribes', {'tribes': tribes})
 
 
+@cache_builder('posts')
 def create_post_cache():
     data = fetchPost()
-    view = 'posts'
-    keyword = 'posts'
-    JSONStore.objects.filter(view=view, key=keyword).all().delete()
-    data = json.loads(json.dumps(data, cls=EncodeAnything))
-    JSONStore.objects.create(
-        view=view,
-        key=keyword,
-        data=data,
-        )
+    return replace_jsonstore('posts', {'posts': data}, whole_view=False)
 
 
+def avatar_inputs():
+    from avatar.models import AvatarTheme, CustomAvatar
+    return table_fingerprint(AvatarTheme.objects.all(), CustomAvatar.objects.all())
+
+
+@cache_builder('avatars', inputs=avatar_inputs)
 def create_avatar_cache():
     from avatar.models import AvatarTheme, CustomAvatar
-    for at in AvatarTheme.objects.all():
+    themes = AvatarTheme.objects.all()
+    for at in themes:
         at.popularity = at.popularity_cheat_by
         if at.name == 'classic':
             at.popularity += CustomAvatar.objects.filter(active=True, config__icontains='"Ears"').count()
@@ -108,126 +131,211 @@ def create_avatar_cache():
             at.popularity += CustomAvatar.objects.filter(active=True, config__icontains='hairTone').exclude(config__icontains="theme").count()
         else:
             at.popularity += CustomAvatar.objects.filter(active=True, config__theme=[at.name]).count()
-        at.save()
+        # keep modified_on so the popularity refresh does not count as a new input
+        at.save(update=False)
+    return len(themes)
 
 
+@cache_builder('activity')
 def create_activity_cache():
-    from django.utils import timezone
     from dashboard.models import Activity
     hours = 24 if not settings.DEBUG else 1000
 
     print('activity.1')
-    view = 'activity'
-    keyword = '24hcount'
-    data = Activity.objects.filter(created_on__gt=timezone.now() - timezone.timedelta(hours=hours)).count()
-    JSONStore.objects.filter(view=view, key=keyword).all().delete()
-    JSONStore.objects.create(
-        view=view,
-        key=keyword,
-        data=json.loads(json.dumps(data, cls=EncodeAnything)),
-        )
+    data = {}
+    data['24hcount'] = Activity.objects.filter(created_on__gt=timezone.now() - timezone.timedelta(hours=hours)).count()
 
     print('activity.2')
     from retail.views import get_specific_activities
     from townsquare.views import tags
     for tag in tags:
         keyword = tag[2]
-        data = get_specific_activities(keyword, False, None, None).filter(created_on__gt=timezone.now() - timezone.timedelta(hours=hours)).count()
-        JSONStore.objects.filter(view=view, key=keyword).all().delete()
-        JSONStore.objects.create(
-            view=view,
-            key=keyword,
-            data=json.loads(json.dumps(data, cls=EncodeAnything)),
-            )
+        data[keyword] = get_specific_activities(keyword, False, None, None).filter(created_on__gt=timezone.now() - timezone.timedelta(hours=hours)).count()
+
+    # the activity view also holds keys written by create_activity_cache
+    return replace_jsonstore('activity', data, whole_view=False)
+
+
+def grants_inputs():
+    from grants.models import Contribution, Subscription
+    return table_fingerprint(Contribution.objects.all(), Subscription.objects.all())
 
+
+@cache_builder('grants', inputs=grants_inputs)
 def create_grants_cache():
     from grants.utils import generate_leaderboard
     print('grants')
-    view = 'grants'
-    keyword = 'leaderboard'
     data = generate_leaderboard()
-    JSONStore.objects.create(
-        view=view,
-        key=keyword,
-        data=json.loads(json.dumps(data, cls=EncodeAnything)),
-        )
+    return replace_jsonstore('grants', {'leaderboard': data}, whole_view=False)
+
+
+def quests_inputs():
+    from quests.models import Quest, QuestAttempt, QuestFeedback, QuestPointAward
+    from quests.views import current_round_number
+    return [current_round_number] + table_fingerprint(
+        Quest.objects.all(), QuestAttempt.objects.all(), QuestFeedback.objects.all(), QuestPointAward.objects.all()
+    )
 
 
+@cache_builder('quests', inputs=quests_inputs)
 def create_quests_cache():
     from quests.helpers import generate_leaderboard
     from quests.views import current_round_number
+    data = {}
     for i in range(1, current_round_number+1):
         print(f'quests_{i}')
-        view = 'quests'
-        keyword = f'leaderboard_{i}'
-        data = generate_leaderboard(round_number=i)
-        JSONStore.objects.create(
-            view=view,
-            key=keyword,
-            data=json.loads(json.dumps(data, cls=EncodeAnything)),
-            )
+        data[f'leaderboard_{i}'] = generate_leaderboard(round_number=i)
+    rows = replace_jsonstore('quests', data, whole_view=False)
 
     from quests.models import Quest
     for quest in Quest.objects.filter(visible=True):
-        quest.save()
+        # refreshes ui_data; keep modified_on so it does not count as a new input
+        quest.save(update=False)
+    return rows
 
 
+@cache_builder('results')
 def create_results_cache():
     print('results')
     keywords = ['']
     if settings.DEBUG:
         keywords = ['']
-    view = 'results'
-    with transaction.atomic():
-        items = []
-        JSONStore.objects.filter(view=view).all().delete()
-        for keyword in keywords:
-            print(f"- executing {keyword}")
-            data = build_stat_results(keyword)
-            print("- creating")
-            items.append(JSONStore(
-                view=view,
-                key=keyword,
-                data=json.loads(json.dumps(data, cls=EncodeAnything)),
-                ))
-        JSONStore.objects.bulk_create(items)
+    data = {}
+    for keyword in keywords:
+        print(f"- executing {keyword}")
+        data[keyword] = build_stat_results(keyword)
+    print("- creating")
+    return replace_jsonstore('results', data)
 
 
+@cache_builder('contributor_landing_page')
 def create_contributor_landing_page_context():
     print('create_contributor_landing_page_context')
     keywords = [''] + programming_languages
     if settings.DEBUG:
         keywords = ['']
-    view = 'contributor_landing_page'
     from retail.views import get_contributor_landing_page_context
-    with transaction.atomic():
-        items = []
-        JSONStore.objects.filter(view=view).all().delete()
-        for keyword in keywords:
-            print(f"- executing {keyword}")
-            data = get_contributor_landing_page_context(keyword)
-            print("- creating")
-            items.append(JSONStore(
-                view=view,
-                key=keyword,
-                data=json.loads(json.dumps(data, cls=EncodeAnything)),
-                ))
-        JSONStore.objects.bulk_create(items)
-
+    data = {}
+    for keyword in keywords:
+        print(f"- executing {keyword}")
+        data[keyword] = get_contributor_landing_page_context(keyword)
+    print("- creating")
+    return replace_jsonstore('contributor_landing_page', data)
+
+
+def run_builder(name, builder, force=False, rebuilt_dependencies=False):
+    """Run one builder unless its inputs are unchanged since its last run.
+
+    Returns:
+        dict: The build record, also stored in the page_cache_builds JSONStore view.
+
+    """
+    fingerprint = builder['inputs']() if builder['inputs'] else None
+    last_build = get_jsonstore(BUILDS_VIEW, name)
+    unchanged = fingerprint is not None and last_build and last_build.data.get('fingerprint') == fingerprint
+    if unchanged and not force and not rebuilt_dependencies:
+        return dict(last_build.data, status='skipped')
+
+    start_time = time.time()
+    rows = builder['func']()
+    record = {
+        'status': 'built',
+        'rows': rows,
+        'duration': round(time.time() - start_time, 2),
+        'built_on': timezone.now().isoformat(),
+        'fingerprint': fingerprint,
+    }
+    replace_jsonstore(BUILDS_VIEW, {name: record}, whole_view=False)
+    return record
+
+
+def _run_builder_in_thread(*args):
+    try:
+        return run_builder(*args)
+    finally:
+        # each worker thread opens its own connection
+        connection.close()
+
+
+def submit_builder(pool, *args):
+    """Start run_builder on the pool, or run it right away without one."""
+    if pool:
+        return pool.submit(_run_builder_in_thread, *args)
+    future = Future()
+    try:
+        future.set_result(run_builder(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def run_builders(builders, workers=4, force=False):
+    """Run builders concurrently, starting each once the builders it depends on are done.
+
+    Args:
+        builders (dict): The builders to run, by name (see cache_builder).
+        workers (int): The number of builders to run at once; 1 runs them in this thread.
+        force (bool): Whether to rebuild caches whose inputs are unchanged.
+
+    Returns:
+        dict: The build record of each builder, by name.
+
+    """
+    pending = dict(builders)
+    running = {}
+    records = {}
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while pending or running:
+            for name, builder in list(pending.items()):
+                # dependencies outside of this run are taken as already built
+                dependencies = [dependency for dependency in builder['depends_on'] if dependency in builders]
+                if any(dependency not in records for dependency in dependencies):
+                    continue
+                del pending[name]
+                if any(records[dependency]['status'] == 'failed' for dependency in dependencies):
+                    records[name] = {'status': 'failed', 'error': 'dependency failed'}
+                    continue
+                rebuilt_dependencies = any(records[dependency]['status'] == 'built' for dependency in dependencies)
+                running[submit_builder(pool, name, builder, force, rebuilt_dependencies)] = name
+
+            if not running:
+                if pending:
+                    raise CommandError(f"circular page cache dependencies between {', '.join(pending)}")
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    records[name] = future.result()
+                except Exception as e:
+                    logger.exception(e)
+                    records[name] = {'status': 'failed', 'error': str(e)}
+    finally:
+        if pool:
+            pool.shutdown()
+    return records
 
 
 class Command(BaseCommand):
 
     help = 'generates some /results data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--builders', nargs='+', choices=list(BUILDERS.keys()), help='only run these builders')
+        parser.add_argument('--workers', type=int, default=4, help='how many builders to run at once')
+        parser.add_argument('--force', action='store_true', help='rebuild caches whose inputs are unchanged')
+
     def handle(self, *args, **options):
-        create_hidden_profiles_cache()
-        if not settings.DEBUG:
-            create_tribes_cache()
-            create_activity_cache()
-            create_post_cache()
-            create_results_cache()
-            create_avatar_cache()
-            create_quests_cache()
-            create_grants_cache()
-            create_contributor_landing_page_context()
+        names = options['builders'] or [
+            name for name, builder in BUILDERS.items() if builder['in_debug'] or not settings.DEBUG
+        ]
+        start_time = time.time()
+        records = run_builders({name: BUILDERS[name] for name in names}, options['workers'], options['force'])
+        for name in names:
+            record = records[name]
+            print(f"{name}: {record['status']} {record.get('rows', '')} rows in {record.get('duration', '-')}s {record.get('error', '')}")
+        print(f"page cache built in {round(time.time() - start_time, 2)}s")
+        if any(record['status'] == 'failed' for record in records.values()):
+            raise CommandError('some page caches failed to build')
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.4 on 2020-04-02 12:00
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import economy.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('perftools', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jsonstore',
+            name='generation',
+            field=models.PositiveIntegerField(default=0, help_text='The JSONStoreGeneration of its view this row was written in'),
+        ),
+        migrations.AlterField(
+            model_name='jsonstore',
+            name='data',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, encoder=economy.models.EncodeAnything),
+        ),
+        migrations.AddIndex(
+            model_name='jsonstore',
+            index=models.Index(fields=['view', 'key', 'generation'], name='perftools_json_view_gen_idx'),
+        ),
+        migrations.CreateModel(
+            name='JSONStoreGeneration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(db_index=True, default=economy.models.get_time)),
+                ('modified_on', models.DateTimeField(default=economy.models.get_time)),
+                ('view', models.CharField(max_length=255, unique=True)),
+                ('generation', models.PositiveIntegerField(default=0)),
+                ('last_generation', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
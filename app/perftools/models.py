@@ -1,7 +1,7 @@
 from django.contrib.postgres.fields import JSONField
 from django.db import models
 
-from economy.models import SuperModel
+from economy.models import EncodeAnything, SuperModel
 
 # Create your models here.
 
@@ -9,12 +9,32 @@ from economy.models import SuperModel
 class JSONStore(SuperModel):
     """Define the JSONStore data model."""
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['view', 'key', 'generation'], name='perftools_json_view_gen_idx'),
+        ]
+
     view = models.CharField(max_length=255, default='', blank=True, db_index=True)
     key = models.CharField(max_length=255, default='', blank=True, db_index=True)
-    data = JSONField(blank=True, default=dict)
+    data = JSONField(blank=True, default=dict, encoder=EncodeAnything)
+    generation = models.PositiveIntegerField(
+        default=0, help_text='The JSONStoreGeneration of its view this row was written in'
+    )
 
     def __str__(self):
         """Define the string representation of GasProfile."""
         if not self:
             return "none"
         return f" {self.view} / {self.key} "
+
+
+class JSONStoreGeneration(SuperModel):
+    """Define the pointer to the JSONStore generation readers of a view see."""
+
+    view = models.CharField(max_length=255, unique=True)
+    generation = models.PositiveIntegerField(default=0)
+    last_generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        """Define the string representation of a JSONStoreGeneration."""
+        return f"{self.view} @ {self.generation}"
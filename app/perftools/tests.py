@@ -1,3 +1,87 @@
-from django.test import TestCase
+from perftools import utils
+from perftools.management.commands.create_page_cache import run_builders
+from perftools.models import JSONStore, JSONStoreGeneration
+from perftools.utils import get_jsonstore, replace_jsonstore
+from test_plus.test import TestCase
 
-# Create your tests here.
+
+def builder(func, depends_on=(), inputs=None):
+    return {'func': func, 'depends_on': depends_on, 'inputs': inputs, 'in_debug': True}
+
+
+class PageCacheSchedulerTest(TestCase):
+
+    def setUp(self):
+        utils._generations.clear()
+        utils._jsonstores.clear()
+
+    def test_runs_dependencies_first(self):
+        order = []
+
+        def build(name):
+            def func():
+                order.append(name)
+                return 1
+            return func
+
+        records = run_builders({
+            'c': builder(build('c'), depends_on=('b', )),
+            'b': builder(build('b'), depends_on=('a', )),
+            'a': builder(build('a')),
+            'd': builder(build('d'), depends_on=('not_in_this_run', )),
+        }, workers=1)
+
+        self.assertLess(order.index('a'), order.index('b'))
+        self.assertLess(order.index('b'), order.index('c'))
+        self.assertEqual({record['status'] for record in records.values()}, {'built'})
+
+    def test_skips_unchanged_inputs(self):
+        calls = []
+        builders = {
+            'a': builder(lambda: calls.append('a') or 1, inputs=lambda: ['unchanged']),
+            'b': builder(lambda: calls.append('b') or 1, depends_on=('a', ), inputs=lambda: ['unchanged']),
+        }
+
+        self.assertEqual(run_builders(builders, workers=1)['a']['status'], 'built')
+        self.assertEqual(run_builders(builders, workers=1)['b']['status'], 'skipped')
+        self.assertEqual(run_builders(builders, workers=1, force=True)['a']['status'], 'built')
+        self.assertEqual(calls, ['a', 'b', 'a', 'b'])
+
+    def test_failed_dependency(self):
+        def fail():
+            raise ValueError('no data')
+
+        records = run_builders({'a': builder(fail), 'b': builder(lambda: 1, depends_on=('a', ))}, workers=1)
+
+        self.assertEqual(records['a'], {'status': 'failed', 'error': 'no data'})
+        self.assertEqual(records['b']['status'], 'failed')
+
+    def test_replace_jsonstore(self):
+        JSONStore.objects.create(view='activity', key='other', data=1)
+        replace_jsonstore('activity', {'24hcount': 1})
+        replace_jsonstore('activity', {'24hcount': 2}, whole_view=False)
+        replace_jsonstore('activity', {'kudos': 3}, whole_view=False)
+
+        stores = JSONStore.objects.filter(view='activity').order_by('key')
+        self.assertEqual([(store.key, store.data) for store in stores], [('24hcount', 2), ('kudos', 3)])
+        self.assertEqual([store.generation for store in stores], [2, 3])
+        self.assertEqual(JSONStoreGeneration.objects.get(view='activity').generation, 3)
+
+    def test_get_jsonstore(self):
+        JSONStore.objects.create(view='results', key='', data={'legacy': True})
+        self.assertEqual(get_jsonstore('results', '').data, {'legacy': True})
+
+        replace_jsonstore('results', {'': {'generation': 1}, 'python': {'generation': 1}})
+        replace_jsonstore('results', {'python': {'generation': 2}}, whole_view=False)
+        utils._generations.clear()
+
+        self.assertEqual(get_jsonstore('results', '').data, {'generation': 1})
+        self.assertEqual(get_jsonstore('results', 'python').data, {'generation': 2})
+        self.assertIsNone(get_jsonstore('results', 'rust'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_jsonstore('results', 'python').data, {'generation': 2})
+
+        replace_jsonstore('results', {'python': {'generation': 3}})
+        utils._generations.clear()
+        self.assertIsNone(get_jsonstore('results', ''))
+        self.assertEqual(get_jsonstore('results', 'python').data, {'generation': 3})
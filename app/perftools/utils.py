@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Define the versioned JSONStore read and write helpers.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import transaction
+
+from perftools.models import JSONStore, JSONStoreGeneration
+
+# how long a process trusts the generation pointer it read last
+GENERATION_TTL = 5
+MAX_CACHED_JSONSTORES = 256
+
+_generations = {}
+_jsonstores = OrderedDict()
+_lock = threading.Lock()
+
+
+def replace_jsonstore(view, data_by_key, whole_view=True):
+    """Write data_by_key as a new generation of a view and flip readers over to it.
+
+    The new rows are written next to the current ones and become visible
+    with a single update of the view's JSONStoreGeneration, so readers
+    never see a missing or half written view. The rows they supersede are
+    deleted afterwards.
+
+    Args:
+        view (str): The JSONStore view.
+        data_by_key (dict): The data to store under each key.
+        whole_view (bool): Whether to drop the view's other keys too.
+
+    Returns:
+        int: The number of rows written.
+
+    """
+    with transaction.atomic():
+        pointer, _ = JSONStoreGeneration.objects.select_for_update().get_or_create(view=view)
+        pointer.last_generation = max(pointer.last_generation, pointer.generation) + 1
+        pointer.save()
+    generation = pointer.last_generation
+
+    JSONStore.objects.bulk_create([
+        JSONStore(view=view, key=key, data=data, generation=generation) for key, data in data_by_key.items()
+    ])
+    JSONStoreGeneration.objects.filter(view=view, generation__lt=generation).update(generation=generation)
+
+    superseded = JSONStore.objects.filter(view=view, generation__lt=generation)
+    if not whole_view:
+        superseded = superseded.filter(key__in=list(data_by_key.keys()))
+    superseded.delete()
+    return len(data_by_key)
+
+
+def get_generation(view, refresh=False):
+    """Return the generation of a view readers should see, None if it was never swapped."""
+    cached = _generations.get(view)
+    if cached and not refresh and time.time() - cached[1] < GENERATION_TTL:
+        return cached[0]
+    generation = JSONStoreGeneration.objects.filter(view=view).values_list('generation', flat=True).first()
+    _generations[view] = (generation, time.time())
+    return generation
+
+
+def _read_jsonstore(view, key, generation):
+    jsonstores = JSONStore.objects.filter(view=view, key=key)
+    if generation is not None:
+        # keys a partial swap did not rewrite live on in older generations
+        jsonstores = jsonstores.filter(generation__lte=generation)
+    return jsonstores.order_by('-generation', '-pk').first()
+
+
+def get_jsonstore(view, key):
+    """Return the current JSONStore of (view, key), or None.
+
+    Rows are kept in a process local LRU keyed by (view, key, generation),
+    so hot pages skip both the query and decoding the JSON. The returned
+    row is shared between callers and must not be modified.
+
+    """
+    generation = get_generation(view)
+    if generation is None:
+        # never written through replace_jsonstore, so there is no generation to cache by
+        return _read_jsonstore(view, key, None)
+
+    cache_key = (view, key, generation)
+    with _lock:
+        if cache_key in _jsonstores:
+            _jsonstores.move_to_end(cache_key)
+            return _jsonstores[cache_key]
+
+    jsonstore = _read_jsonstore(view, key, generation)
+    if not jsonstore:
+        # the generation we knew of may have been collected by a newer swap
+        fresh_generation = get_generation(view, refresh=True)
+        if fresh_generation == generation:
+            return None
+        return get_jsonstore(view, key)
+
+    with _lock:
+        _jsonstores[cache_key] = jsonstore
+        while len(_jsonstores) > MAX_CACHED_JSONSTORES:
+            _jsonstores.popitem(last=False)
+    return jsonstore
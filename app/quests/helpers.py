@@ -13,7 +13,7 @@ from dashboard.models import Activity
 from inbox.utils import send_notification_to_user
 from kudos.models import BulkTransferCoupon, BulkTransferRedemption, Token
 from kudos.views import get_profile
-from perftools.models import JSONStore
+from perftools.utils import get_jsonstore
 from quests.models import Quest, QuestAttempt, QuestPointAward
 
 logger = logging.getLogger(__name__)
@@ -217,7 +217,7 @@ def process_win(request, qa):
 
 def get_leaderboard(max_entries=25, round_number=1):
     try:
-        return JSONStore.objects.filter(view='quests', key=f'leaderboard_{round_number}').order_by('-pk').first().data
+        return get_jsonstore('quests', f'leaderboard_{round_number}').data
     except:
         return {}
 
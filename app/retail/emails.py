@@ -16,9 +16,13 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 '''
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from datetime import date, timedelta
 from functools import partial
+from types import SimpleNamespace
 
 from django.conf import settings
 from django.contrib import messages
@@ -27,7 +31,7 @@ from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.template.response import TemplateResponse
-from django.utils import timezone
+from django.utils import timezone, translation
 from django.utils.translation import gettext as _
 
 import cssutils
@@ -39,6 +43,14 @@ from retail.utils import strip_double_chars, strip_html
 
 logger = logging.getLogger(__name__)
 
+# placeholders shared emails are rendered with, see render_shared_email
+PRIV_PLACEHOLDER = '-gitcoin-subscriber-priv-'
+PAYOUT_ADDRESS_PLACEHOLDER = '-gitcoin-payout-address-'
+MAX_CACHED_SHARED_EMAILS = 32
+
+_shared_emails = OrderedDict()
+_shared_emails_lock = threading.Lock()
+
 # RENDERERS
 
 # key, name, frequency
@@ -82,6 +94,64 @@ def premailer_transform(html):
     return p.transform()
 
 
+def get_shared_email_subscriber(has_payout_address):
+    """Return the stand-in subscriber shared emails are rendered with."""
+    return SimpleNamespace(
+        priv=PRIV_PLACEHOLDER,
+        profile=SimpleNamespace(preferred_payout_address=PAYOUT_ADDRESS_PLACEHOLDER if has_payout_address else ''),
+    )
+
+
+def render_shared_email(template_name, build_params, content_key, to_email):
+    """Render an email once for every recipient with the same language and segment.
+
+    The html and text templates are rendered with a stand-in subscriber
+    whose fields are placeholders, and cached by template, language,
+    recipient segment and a hash of content_key. build_params is only
+    called when the email is not cached.
+
+    Args:
+        template_name (str): The templates, without their .html and .txt extension.
+        build_params (callable): Returns the template params, but the subscriber.
+        content_key (object): Changes whenever the content of the email does.
+        to_email (str): The recipient.
+
+    Returns:
+        tuple: The shared html and text, and the substitutions of the recipient's placeholders.
+
+    """
+    subscriber = get_or_save_email_subscriber(to_email, 'internal')
+    profile = subscriber.profile if subscriber else None
+    payout_address = profile.preferred_payout_address if profile else ''
+    substitutions = {
+        PRIV_PLACEHOLDER: subscriber.priv if subscriber else '',
+        PAYOUT_ADDRESS_PLACEHOLDER: payout_address or '',
+    }
+
+    content_hash = hashlib.sha1(repr(content_key).encode('utf-8')).hexdigest()
+    cache_key = (template_name, translation.get_language(), bool(payout_address), content_hash)
+    with _shared_emails_lock:
+        if cache_key in _shared_emails:
+            _shared_emails.move_to_end(cache_key)
+            return _shared_emails[cache_key] + (substitutions, )
+
+    params = dict(build_params(), subscriber=get_shared_email_subscriber(bool(payout_address)))
+    response_html = premailer_transform(render_to_string(f"{template_name}.html", params))
+    response_txt = render_to_string(f"{template_name}.txt", params)
+    with _shared_emails_lock:
+        _shared_emails[cache_key] = (response_html, response_txt)
+        while len(_shared_emails) > MAX_CACHED_SHARED_EMAILS:
+            _shared_emails.popitem(last=False)
+    return response_html, response_txt, substitutions
+
+
+def personalize_email(body, substitutions):
+    """Replace the placeholders of an email rendered by render_shared_email."""
+    for placeholder, value in substitutions.items():
+        body = body.replace(placeholder, value)
+    return body
+
+
 def render_featured_funded_bounty(bounty):
     params = {'bounty': bounty}
     response_html = premailer_transform(render_to_string("emails/funded_featured_bounty.html", params))
@@ -1002,7 +1072,8 @@ def render_start_work_applicant_expired(interest, bounty):
     return response_html, response_txt, subject
 
 
-def render_new_bounty_roundup(to_email):
+def render_new_bounty_roundup_shared(to_email):
+    """Render the roundup for to_email, with the placeholders of render_shared_email."""
     from dashboard.models import Bounty
     from django.conf import settings
     subject = "COVID: Stay Safe & Carry On"
@@ -1108,67 +1179,78 @@ Back to (remote) work,
     num_kudos_to_show = 15
 
     #### don't need to edit anything below this line
-    leaderboard = {
-        'quarterly_payers': {
-            'title': _('Top Payers'),
-            'items': [],
-        },
-        'quarterly_earners': {
-            'title': _('Top Earners'),
-            'items': [],
-        },
-        'quarterly_orgs': {
-            'title': _('Top Orgs'),
-            'items': [],
-        },
-    }
-
-
-    from kudos.models import KudosTransfer
-    if highlight_kudos_ids:
-        kudos_highlights = KudosTransfer.objects.filter(id__in=highlight_kudos_ids)
-    else:
-        kudos_highlights = KudosTransfer.objects.exclude(network='mainnet', txid='').order_by('-created_on')[:num_kudos_to_show]
-
-    for key, __ in leaderboard.items():
-        leaderboard[key]['items'] = LeaderboardRank.objects.active() \
-            .filter(leaderboard=key, product='all').order_by('rank')[0:num_leadboard_items]
-    if not len(leaderboard['quarterly_payers']['items']):
-        leaderboard = []
-
-    bounties = []
-    for nb in bounties_spec:
-        try:
-            bounty = Bounty.objects.current().filter(
-                github_url__iexact=nb['url'],
-            ).order_by('-web3_created').first()
-            if bounty:
-                bounties.append({
-                    'obj': bounty,
-                    'primer': nb['primer']
-                })
-        except Exception as e:
-            print(e)
-
-    params = {
-        'intro': intro,
-        'intro_txt': strip_double_chars(strip_double_chars(strip_double_chars(strip_html(intro), ' '), "\n"), "\n "),
-        'bounties': bounties,
-        'leaderboard': leaderboard,
-        'invert_footer': False,
-        'hide_header': False,
-        'highlights': highlights,
-        'subscriber': get_or_save_email_subscriber(to_email, 'internal'),
-        'kudos_highlights': kudos_highlights,
-        'sponsor': sponsor,
-		'email_type': 'roundup',
-        'email_style': email_style,
-    }
+    def build_params():
+        leaderboard = {
+            'quarterly_payers': {
+                'title': _('Top Payers'),
+                'items': [],
+            },
+            'quarterly_earners': {
+                'title': _('Top Earners'),
+                'items': [],
+            },
+            'quarterly_orgs': {
+                'title': _('Top Orgs'),
+                'items': [],
+            },
+        }
+
+
+        from kudos.models import KudosTransfer
+        if highlight_kudos_ids:
+            kudos_highlights = KudosTransfer.objects.filter(id__in=highlight_kudos_ids)
+        else:
+            kudos_highlights = KudosTransfer.objects.exclude(network='mainnet', txid='').order_by('-created_on')[:num_kudos_to_show]
+
+        for key, __ in leaderboard.items():
+            leaderboard[key]['items'] = LeaderboardRank.objects.active() \
+                .filter(leaderboard=key, product='all').order_by('rank')[0:num_leadboard_items]
+        if not len(leaderboard['quarterly_payers']['items']):
+            leaderboard = []
+
+        bounties = []
+        for nb in bounties_spec:
+            try:
+                bounty = Bounty.objects.current().filter(
+                    github_url__iexact=nb['url'],
+                ).order_by('-web3_created').first()
+                if bounty:
+                    bounties.append({
+                        'obj': bounty,
+                        'primer': nb['primer']
+                    })
+            except Exception as e:
+                print(e)
+
+        params = {
+            'intro': intro,
+            'intro_txt': strip_double_chars(strip_double_chars(strip_double_chars(strip_html(intro), ' '), "\n"), "\n "),
+            'bounties': bounties,
+            'leaderboard': leaderboard,
+            'invert_footer': False,
+            'hide_header': False,
+            'highlights': highlights,
+            'kudos_highlights': kudos_highlights,
+            'sponsor': sponsor,
+            'email_type': 'roundup',
+            'email_style': email_style,
+        }
+
+        return params
+
+    content_key = (
+        subject, intro, highlights, sponsor, bounties_spec, num_leadboard_items, highlight_kudos_ids,
+        num_kudos_to_show, email_style, timezone.now().date(),
+    )
+    response_html, response_txt, substitutions = render_shared_email(
+        'emails/bounty_roundup', build_params, content_key, to_email
+    )
+    return response_html, response_txt, subject, substitutions
 
-    response_html = premailer_transform(render_to_string("emails/bounty_roundup.html", params))
-    response_txt = render_to_string("emails/bounty_roundup.txt", params)
 
-    return response_html, response_txt, subject
+def render_new_bounty_roundup(to_email):
+    response_html, response_txt, subject, substitutions = render_new_bounty_roundup_shared(to_email)
+    return personalize_email(response_html, substitutions), personalize_email(response_txt, substitutions), subject
 
 
 
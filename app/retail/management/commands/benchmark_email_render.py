@@ -0,0 +1,63 @@
+'''
+    Copyright (C) 2020 Gitcoin Core
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published
+    by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from marketing.models import EmailSubscriber
+from retail import emails
+
+RENDERERS = {
+    'roundup': emails.render_new_bounty_roundup,
+}
+
+
+class Command(BaseCommand):
+
+    help = 'benchmarks rendering an email for many recipients, with and without the shared email cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', choices=list(RENDERERS.keys()))
+        parser.add_argument('--recipients', type=int, default=100, help='how many recipients to render the email for')
+
+    def time_renders(self, render, to_emails, shared):
+        start_time = time.time()
+        for to_email in to_emails:
+            if not shared:
+                emails._shared_emails.clear()
+            render(to_email)
+        return (time.time() - start_time) / len(to_emails)
+
+    def handle(self, *args, **options):
+        to_emails = list(EmailSubscriber.objects.order_by('pk').values_list('email', flat=True)[:options['recipients']])
+        to_emails += [settings.CONTACT_EMAIL] * (options['recipients'] - len(to_emails))
+        if not to_emails:
+            print("no recipients")
+            return
+        render = RENDERERS[options['email']]
+
+        emails._shared_emails.clear()
+        per_email = self.time_renders(render, to_emails, shared=False)
+        emails._shared_emails.clear()
+        per_shared_email = self.time_renders(render, to_emails, shared=True)
+
+        print(f"rendered {options['email']} for {len(to_emails)} recipients")
+        print(f"- rendered for each recipient: {round(per_email * 1000, 2)}ms per email")
+        print(f"- rendered once and personalized: {round(per_shared_email * 1000, 2)}ms per email")
+        print(f"- {round(per_email / per_shared_email, 1)}x faster")
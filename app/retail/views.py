@@ -29,7 +29,7 @@ from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
 from django.core.validators import validate_email
 from django.db.models import Count, Q
-from django.http import Http404, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
 from django.templatetags.static import static
@@ -41,7 +41,9 @@ from django.views.decorators.csrf import csrf_exempt
 
 from app.utils import get_default_network, get_profiles_from_text
 from cacheops import cached_as, cached_view, cached_view_as
-from dashboard.models import Activity, Bounty, HackathonEvent, Profile, get_my_earnings_counter_profiles, get_my_grants
+from dashboard.models import (
+    Activity, Bounty, HackathonEvent, Profile, encode_feed_cursor, get_my_earnings_counter_profiles, get_my_grants,
+)
 from dashboard.notifications import amount_usdt_open_work, open_bounties
 from economy.models import Token
 from marketing.mails import (
@@ -49,7 +51,7 @@ from marketing.mails import (
 )
 from marketing.models import Alumni, Job, LeaderboardRank
 from marketing.utils import get_or_save_email_subscriber, invite_to_slack
-from perftools.models import JSONStore
+from perftools.utils import get_jsonstore
 from ratelimit.decorators import ratelimit
 from retail.emails import render_nth_day_email_campaign
 from retail.helpers import get_ip
@@ -575,7 +577,7 @@ def contributor_bounties(request, tech_stack):
         return redirect('new_funding_short')
 
     try:
-        new_context = JSONStore.objects.get(view='contributor_landing_page', key=tech_stack).data
+        new_context = get_jsonstore('contributor_landing_page', tech_stack).data
 
         for key, value in new_context.items():
             context[key] = value
@@ -619,7 +621,7 @@ def how_it_works(request, work_type):
 
 
 def robotstxt(request):
-    hidden_profiles = list(JSONStore.objects.get(view='hidden_profiles').data)
+    hidden_profiles = list(get_jsonstore('hidden_profiles', 'hidden_profiles').data)
     context = {
         'settings': settings,
         'hidden_profiles': hidden_profiles,
@@ -1132,8 +1134,8 @@ def results(request, keyword=None):
     """Render the Results response."""
     if keyword and keyword not in programming_languages:
         raise Http404
-    js = JSONStore.objects.get(view='results', key=keyword)
-    context = js.data
+    js = get_jsonstore('results', keyword)
+    context = dict(js.data)
     context['updated'] = js.created_on
     context['is_outside'] = True
     context['prefix'] = 'data-'
@@ -1219,30 +1221,40 @@ def get_specific_activities(what, trending_only, user, after_pk, request=None):
 
 
 def activity(request):
-    """Render the Activity response."""
+    """Render the Activity response.
+
+    Pages are fetched by the opaque cursor returned with the previous page;
+    the page parameter only remains for links that predate cursors.
+    """
     page_size = 7
     page = int(request.GET.get('page', 1))
+    cursor = request.GET.get('cursor')
     what = request.GET.get('what', 'everywhere')
     trending_only = int(request.GET.get('trending_only', 0))
 
     activities = get_specific_activities(what, trending_only, request.user, request.GET.get('after-pk'), request)
     activities = activities.prefetch_related('profile', 'likes', 'comments', 'kudos', 'grant', 'subscription', 'hackathonevent')
 
+    # pagination
+    next_page = page + 1
+    if cursor or page == 1:
+        try:
+            page, next_cursor = activities.feed_page(cursor, page_size)
+        except ValueError:
+            return HttpResponse(status=400)
+    else:
+        start_index = (page-1) * page_size
+        end_index = page * page_size
+        page = list(activities.order_by('-created_on', '-pk')[start_index:end_index])
+        next_cursor = encode_feed_cursor(page[-1]) if len(page) == page_size else None
+    suppress_more_link = not next_cursor
+
     # store last seen
-    if activities.exists():
-        last_pk = activities.first().pk
+    if page and not cursor:
+        last_pk = page[0].pk
         current_pk = request.session.get(what)
         next_pk = last_pk if (not current_pk or current_pk < last_pk) else current_pk
         request.session[what] = next_pk
-    # pagination
-    next_page = page + 1
-    start_index = (page-1) * page_size
-    end_index = page * page_size
-
-    #p = Paginator(activities, page_size)
-    #page = p.get_page(page)
-    page = activities[start_index:end_index]
-    suppress_more_link = not len(page)
 
     # increment view counts
     activities_pks = [obj.pk for obj in page]
@@ -1253,12 +1265,13 @@ def activity(request):
         'suppress_more_link': suppress_more_link,
         'what': what,
         'next_page': next_page,
+        'next_cursor': next_cursor,
         'page': page,
-        'target': f'/activity?what={what}&trending_only={trending_only}&page={next_page}',
+        'target': f'/activity?what={what}&trending_only={trending_only}&page={next_page}&cursor={next_cursor}',
         'title': _('Activity Feed'),
         'my_tribes': list(request.user.profile.tribe_members.values_list('org__handle',flat=True)) if request.user.is_authenticated else [],
     }
-    context["activities"] = [a.view_props_for(request.user) for a in page]
+    context["activities"] = Activity.view_props_for_many(page, request.user)
 
 
     return TemplateResponse(request, 'activity.html', context)
@@ -1710,7 +1723,7 @@ def tribes(request):
         }
     ]
 
-    tribes = JSONStore.objects.get(view='tribes', key='tribes').data
+    tribes = get_jsonstore('tribes', 'tribes').data
 
     testimonials = [
         {
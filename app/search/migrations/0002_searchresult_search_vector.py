@@ -0,0 +1,55 @@
+# Generated by Django 2.2.4 on 2020-04-02 12:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+UPDATE_SEARCH_VECTOR = """
+    setweight(to_tsvector('simple', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}description, '')), 'B')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='searchresult',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=f"""
+                CREATE FUNCTION search_result_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector := {UPDATE_SEARCH_VECTOR.format(row='NEW.')};
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER search_result_vector_update
+                    BEFORE INSERT OR UPDATE OF title, description ON search_searchresult
+                    FOR EACH ROW EXECUTE PROCEDURE search_result_vector_update();
+
+                UPDATE search_searchresult SET search_vector = {UPDATE_SEARCH_VECTOR.format(row='')};
+            """,
+            reverse_sql="""
+                DROP TRIGGER search_result_vector_update ON search_searchresult;
+                DROP FUNCTION search_result_vector_update();
+            """,
+        ),
+        migrations.AddIndex(
+            model_name='searchresult',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='search_result_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchresult',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='search_result_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,9 +1,57 @@
+import re
+
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity
 from django.db import models
+from django.db.models import Case, F, FloatField, Q, Value, When
 
 from economy.models import SuperModel
 
+# ranking multipliers by the model name of SearchResult.source_type
+SOURCE_TYPE_BOOSTS = {
+    'profile': 1.5,
+    'grant': 1.3,
+    'bounty': 1.2,
+    'page': 1.2,
+    'quest': 1.0,
+    'token': 1.0,
+    'programminglanguage': 0.8,
+}
+
+
+class SearchResultQuerySet(models.QuerySet):
+    """Handle the manager queryset for SearchResults."""
+
+    def visible_to_profile(self, profile=None):
+        """Filter results to the public ones plus those only visible to profile."""
+        if profile:
+            return self.filter(Q(visible_to__isnull=True) | Q(visible_to=profile))
+        return self.filter(visible_to__isnull=True)
+
+    def ranked(self, keyword, limit=20):
+        """Return the best matches of keyword in a single query.
+
+        Every word of keyword is matched as a prefix against search_vector, so
+        partially typed words match, and titles within trigram distance of
+        keyword catch typos. Matches are ranked by both and boosted by
+        SOURCE_TYPE_BOOSTS.
+
+        """
+        words = re.findall(r'\w+', keyword.lower())
+        if not words:
+            return self.none()
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), config='simple', search_type='raw')
+        boost = Case(
+            *[When(source_type__model=model, then=Value(boost)) for model, boost in SOURCE_TYPE_BOOSTS.items()],
+            default=Value(1.0),
+            output_field=FloatField(),
+        )
+        return self.filter(Q(search_vector=query) | Q(title__trigram_similar=keyword)).annotate(
+            rank=(SearchRank(F('search_vector'), query) + TrigramSimilarity('title', keyword)) * boost,
+        ).select_related('source_type').order_by('-rank', '-pk')[:limit]
+
 
 class SearchResult(SuperModel):
     """Records SearchResult - the generic object for all search results on the platform ."""
@@ -16,6 +64,16 @@ class SearchResult(SuperModel):
     url = models.CharField(max_length=500, default='')
     img_url = models.CharField(max_length=500, default='', null=True)
     visible_to = models.ForeignKey('dashboard.Profile', related_name='search_results_visible', on_delete=models.CASCADE, db_index=True, null=True)
+    # weighted title and description, kept up to date by the search_result_vector_update trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchResultQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='search_result_vector_idx'),
+            GinIndex(fields=['title'], name='search_result_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return f"{self.source_type}; {self.url}"
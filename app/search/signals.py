@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Handle search index related signals.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from search.utils import SEARCH_DOCUMENTS, queue_search_update
+
+
+def update_search_result(sender, instance, **kwargs):
+    # bounties superseded by a sync are saved with current_bounty=False, which drops their results
+    queue_search_update(sender._meta.label_lower, instance.pk)
+
+
+for label in SEARCH_DOCUMENTS:
+    model = apps.get_model(label)
+    post_save.connect(update_search_result, sender=model, dispatch_uid=f"search_save_{label}")
+    post_delete.connect(update_search_result, sender=model, dispatch_uid=f"search_delete_{label}")
@@ -0,0 +1,26 @@
+from app.redis_service import RedisService
+from celery import app
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+redis = RedisService().redis
+
+# Lock timeout of 2 minutes (just in the case that the application hangs to avoid a redis deadlock)
+LOCK_TIMEOUT = 60 * 2
+
+
+@app.shared_task(bind=True, max_retries=3)
+def flush_search_updates(self, retry=False):
+    """
+    :param self:
+    :return:
+    """
+    from search.utils import flush_pending_search_updates
+    with redis.lock("tasks:flush_search_updates", timeout=LOCK_TIMEOUT):
+        try:
+            flushed = flush_pending_search_updates()
+        except Exception as e:
+            logger.exception(e)
+            raise self.retry(countdown=30)
+        logger.info(f'indexed {flushed} search results')
@@ -1,3 +1,69 @@
-from django.test import TestCase
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+
+from dashboard.models import Profile
+from search.models import SearchResult
+from search.utils import SEARCH_DOCUMENTS, flush_pending_search_updates, index_search_results, profile_document
+from test_plus.test import TestCase
+
+
+class SearchResultTest(TestCase):
+
+    def setUp(self):
+        self.profile = Profile.objects.create(handle='fred', data={})
+        page = ContentType.objects.get(app_label='search', model='page')
+        profile = ContentType.objects.get(app_label='dashboard', model='profile')
+        SearchResult.objects.create(source_type=page, source_id=1, title='Gitcoin Grants', description='Fund open source')
+        SearchResult.objects.create(source_type=profile, source_id=2, title='Gitcoin', description='The Gitcoin profile')
+        SearchResult.objects.create(source_type=page, source_id=3, title='Quests', description='Learn about gitcoin')
+        SearchResult.objects.create(source_type=page, source_id=4, title='Gitcoin Secret', visible_to=self.profile)
+
+    def titles(self, keyword, profile=None, limit=20):
+        return [result.title for result in SearchResult.objects.visible_to_profile(profile).ranked(keyword, limit)]
+
+    def test_ranked(self):
+        self.assertEqual(self.titles('gitc'), ['Gitcoin', 'Gitcoin Grants', 'Quests'])
+        self.assertEqual(self.titles('gitcoin grants')[0], 'Gitcoin Grants')
+        self.assertEqual(self.titles('gitc', limit=1), ['Gitcoin'])
+        self.assertEqual(self.titles('!!'), [])
+
+    def test_ranked_typos(self):
+        self.assertIn('Gitcoin', self.titles('gitcoim'))
+
+    def test_ranked_visible_to(self):
+        self.assertNotIn('Gitcoin Secret', self.titles('secret'))
+        self.assertEqual(self.titles('secret', self.profile), ['Gitcoin Secret'])
+
+
+class SearchIndexTest(TestCase):
+
+    def test_index_search_results(self):
+        fred, alice = [Profile.objects.create(handle=handle, data={}, hide_profile=False) for handle in ['fred', 'alice']]
+        source_type = ContentType.objects.get(app_label='dashboard', model='profile')
+
+        self.assertEqual(index_search_results('dashboard.profile', [fred.pk, alice.pk]), 2)
+        results = SearchResult.objects.filter(source_type=source_type).order_by('title')
+        self.assertEqual([result.title for result in results], ['alice', 'fred'])
+
+        alice.hide_profile = True
+        alice.save()
+        fred_pk = fred.pk
+        fred.delete()
+        index_search_results('dashboard.profile', [fred_pk, alice.pk])
+        self.assertFalse(SearchResult.objects.filter(source_type=source_type).exists())
+
+    @patch('search.utils.redis')
+    def test_flush_pending_search_updates_drops_failing_objects(self, redis):
+        fred, alice = [Profile.objects.create(handle=handle, data={}, hide_profile=False) for handle in ['fred', 'alice']]
+        redis.spop.side_effect = [[f'dashboard.profile:{fred.pk}'.encode(), f'dashboard.profile:{alice.pk}'.encode()], []]
+
+        def document(profile):
+            if profile.handle == 'fred':
+                raise ValueError('no document')
+            return profile_document(profile)
+
+        with patch.dict(SEARCH_DOCUMENTS, {'dashboard.profile': document}):
+            self.assertEqual(flush_pending_search_updates(), 1)
+        self.assertEqual([result.title for result in SearchResult.objects.filter(source_id__in=[fred.pk, alice.pk])], ['alice'])
+        redis.sadd.assert_not_called()
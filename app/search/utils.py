@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Define the incremental SearchResult indexing helpers.
+
+Copyright (C) 2020 Gitcoin Core
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from app.redis_service import RedisService
+from redis import RedisError
+
+from .models import SearchResult
+
+logger = logging.getLogger(__name__)
+
+redis = RedisService().redis
+
+# "<app_label.model>:<pk>" members waiting for flush_search_updates
+PENDING_KEY = 'search:pending'
+FLUSH_SCHEDULED_KEY = 'search:pending:scheduled'
+# how long saves are collected before they are indexed in one batch
+FLUSH_DELAY = 5
+BATCH_SIZE = 500
+DOCUMENT_FIELDS = ['created_on', 'modified_on', 'title', 'description', 'url', 'visible_to', 'img_url']
+
+
+def bounty_document(bounty):
+    if not bounty.current_bounty:
+        return None
+    return {
+        "created_on": bounty.web3_created,
+        "title": bounty.title,
+        "description": bounty.issue_description,
+        "url": bounty.url,
+        'img_url': bounty.get_avatar_url(True),
+    }
+
+
+def profile_document(profile):
+    if profile.hide_profile:
+        return None
+    return {
+        "created_on": profile.created_on,
+        "title": profile.handle,
+        "description": profile.desc,
+        "url": profile.url,
+        'img_url': profile.avatar_url,
+    }
+
+
+def hackathonevent_document(hackathon):
+    return {
+        "created_on": hackathon.created_on,
+        "title": hackathon.name,
+        "description": hackathon.stats['range'],
+        "url": hackathon.onboard_url,
+        'img_url': hackathon.logo.url if hackathon.logo else None,
+    }
+
+
+def grant_document(grant):
+    return {
+        "created_on": grant.created_on,
+        "title": grant.title,
+        "description": grant.description,
+        "url": grant.url,
+        'img_url': grant.logo.url if grant.logo else None,
+    }
+
+
+def token_document(token):
+    if token.gen != 1 or token.hidden:
+        return None
+    return {
+        "created_on": token.created_on,
+        "title": token.humanized_name,
+        "description": token.description,
+        "url": token.url,
+        'img_url': token.img_url,
+    }
+
+
+def quest_document(quest):
+    if not quest.visible:
+        return None
+    return {
+        "created_on": quest.created_on,
+        "title": quest.title,
+        "description": quest.description,
+        "url": quest.url,
+        'img_url': quest.enemy_img_url,
+    }
+
+
+# the SearchResult fields of each indexed model, or None when it should not be searchable
+SEARCH_DOCUMENTS = {
+    'dashboard.bounty': bounty_document,
+    'dashboard.profile': profile_document,
+    'dashboard.hackathonevent': hackathonevent_document,
+    'grants.grant': grant_document,
+    'kudos.token': token_document,
+    'quests.quest': quest_document,
+}
+
+
+def index_search_results(label, pks):
+    """Bring the SearchResults of some objects of an indexed model up to date.
+
+    Args:
+        label (str): The model, as in SEARCH_DOCUMENTS.
+        pks (iterable): The primary keys of the objects; objects that no
+            longer exist or are no longer searchable lose their results.
+
+    Returns:
+        int: The number of SearchResults written.
+
+    """
+    model = apps.get_model(label)
+    document_for = SEARCH_DOCUMENTS[label]
+    source_type = ContentType.objects.get_for_model(model)
+    pks = set(pks)
+
+    documents = {}
+    for obj in model.objects.filter(pk__in=pks):
+        document = document_for(obj)
+        if document:
+            documents[obj.pk] = dict(document, modified_on=timezone.now(), visible_to=None)
+
+    stale = []
+    existing = {}
+    for search_result in SearchResult.objects.filter(source_type=source_type, source_id__in=pks).order_by('pk'):
+        if search_result.source_id in documents and search_result.source_id not in existing:
+            existing[search_result.source_id] = search_result
+        else:
+            stale.append(search_result.pk)
+    SearchResult.objects.filter(pk__in=stale).delete()
+
+    new_results = []
+    for pk, document in documents.items():
+        if pk in existing:
+            for field, value in document.items():
+                setattr(existing[pk], field, value)
+        else:
+            new_results.append(SearchResult(source_type=source_type, source_id=pk, **document))
+    SearchResult.objects.bulk_create(new_results, batch_size=BATCH_SIZE)
+    SearchResult.objects.bulk_update(existing.values(), DOCUMENT_FIELDS, batch_size=BATCH_SIZE)
+    return len(documents)
+
+
+def queue_search_update(label, pk):
+    """Index an object shortly after the current transaction commits.
+
+    Updates from all processes are collected in a redis set and indexed in
+    batches by search.tasks.flush_search_updates. If redis is unavailable
+    the update is left to the create_search_results reconciler.
+    """
+    def enqueue():
+        from search.tasks import flush_search_updates
+        try:
+            redis.sadd(PENDING_KEY, f'{label}:{pk}')
+            if redis.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=FLUSH_DELAY):
+                flush_search_updates.apply_async(countdown=FLUSH_DELAY)
+        except RedisError as e:
+            logger.warning(f'could not queue the search update of {label} {pk}: {e}')
+
+    transaction.on_commit(enqueue)
+
+
+def flush_pending_search_updates():
+    """Index every object queued by queue_search_update, in batches.
+
+    Each model is indexed in one go; when that fails its objects are
+    indexed one by one, and the ones that still fail are logged and
+    dropped, left to the create_search_results reconciler.
+
+    Returns:
+        int: The number of objects indexed.
+
+    """
+    flushed = 0
+    while True:
+        members = redis.spop(PENDING_KEY, BATCH_SIZE)
+        if not members:
+            return flushed
+        pks_by_label = defaultdict(set)
+        for member in members:
+            label, pk = member.decode('utf-8').split(':')
+            pks_by_label[label].add(int(pk))
+        for label, pks in pks_by_label.items():
+            try:
+                with transaction.atomic():
+                    index_search_results(label, pks)
+                flushed += len(pks)
+                continue
+            except Exception as e:
+                logger.warning(f'could not index {len(pks)} {label}, indexing them one by one: {e}')
+            for pk in pks:
+                try:
+                    with transaction.atomic():
+                        index_search_results(label, [pk])
+                    flushed += 1
+                except Exception as e:
+                    logger.exception(f'dropping the search update of {label} {pk}: {e}')
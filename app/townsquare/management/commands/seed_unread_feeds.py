@@ -0,0 +1,36 @@
+'''
+    Copyright (C) 2020 Gitcoin Core
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published
+    by the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+
+from django.core.management.base import BaseCommand
+
+from dashboard.models import Activity
+from townsquare.utils import UNREAD_FEED_LENGTH, fan_out_activity
+
+
+class Command(BaseCommand):
+
+    help = 'seeds the town square unread feeds with the newest activities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=UNREAD_FEED_LENGTH, help='how many activities to fan out')
+
+    def handle(self, *args, **options):
+        activities = Activity.objects.filter(hidden=False).order_by('-pk')[:options['limit']]
+        for activity in reversed(list(activities)):
+            fan_out_activity(activity)
+        print(f"fanned out {len(activities)} activities")
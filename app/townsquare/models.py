@@ -83,8 +83,37 @@ class Comment(SuperModel):
 @receiver(post_save, sender=Comment, dispatch_uid="post_save_comment")
 def postsave_comment(sender, instance, created, **kwargs):
     from townsquare.tasks import send_comment_email
+    from townsquare.utils import add_thread
     if created:
         send_comment_email.delay(instance.pk)
+        transaction.on_commit(lambda: add_thread(instance.profile_id, instance.activity_id))
+
+
+@receiver(post_save, sender=Like, dispatch_uid="post_save_like")
+def postsave_like(sender, instance, created, **kwargs):
+    from townsquare.utils import add_thread
+    if created:
+        transaction.on_commit(lambda: add_thread(instance.profile_id, instance.activity_id))
+
+
+@receiver(post_save, sender='dashboard.Activity', dispatch_uid="post_save_activity_unread")
+def postsave_activity_unread(sender, instance, created, **kwargs):
+    from townsquare.tasks import fan_out_unread_activity
+    from townsquare.utils import hide_from_unread_feeds
+    if instance.hidden:
+        transaction.on_commit(lambda: hide_from_unread_feeds(instance.pk))
+    elif created:
+        transaction.on_commit(lambda: fan_out_unread_activity.delay(instance.pk))
+
+
+@receiver(post_save, sender='dashboard.Tip', dispatch_uid="post_save_tip_unread")
+def postsave_tip_unread(sender, instance, created, **kwargs):
+    from townsquare.utils import add_thread
+    if created and instance.comments_priv.startswith('activity:'):
+        activity_pk = instance.comments_priv.split(':')[1]
+        if activity_pk.isnumeric():
+            for profile_pk in {instance.sender_profile_id, instance.recipient_profile_id} - {None}:
+                transaction.on_commit(lambda profile_pk=profile_pk: add_thread(profile_pk, int(activity_pk)))
 
 
 class OfferQuerySet(models.QuerySet):
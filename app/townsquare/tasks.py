@@ -84,3 +84,16 @@ def calculate_clr_match(self, retry=False):
         mr = MatchRound.objects.current().first()
         if mr:
             mr.process()
+
+
+@app.shared_task(bind=True, max_retries=3)
+def fan_out_unread_activity(self, pk, retry=False):
+    """
+    :param self:
+    :param pk:
+    :return:
+    """
+    from townsquare.utils import fan_out_activity
+    activity = Activity.objects.filter(pk=pk).first()
+    if activity and not activity.hidden:
+        fan_out_activity(activity)
@@ -1,3 +1,26 @@
-from django.test import TestCase
+from django.contrib.contenttypes.models import ContentType
 
-# Create your tests here.
+from dashboard.models import Activity, Earning, Profile, get_my_earnings_counter_profiles
+from test_plus.test import TestCase
+from townsquare.utils import get_activity_subscribers, unread_feed_key
+
+
+class UnreadFeedsTest(TestCase):
+
+    def test_unread_feed_key(self):
+        self.assertEqual(unread_feed_key('everywhere', 1), 'townsquare:unread:everywhere')
+        self.assertEqual(unread_feed_key('my_threads', 1), 'townsquare:unread:my_threads:1')
+
+    def test_activity_subscribers_match_relationships(self):
+        funder, hunter, org, other = [Profile.objects.create(handle=handle, data={}) for handle in ['funder', 'hunter', 'org', 'other']]
+        source_type = ContentType.objects.get(app_label='dashboard', model='tip')
+        Earning.objects.create(from_profile=funder, to_profile=hunter, org_profile=org, source_type=source_type, source_id=1)
+        Earning.objects.create(from_profile=other, to_profile=org, source_type=source_type, source_id=2)
+
+        profiles = [funder, hunter, org, other]
+        for author in profiles:
+            activity = Activity.objects.create(profile=author, activity_type='status_update', metadata={})
+            subscribers = get_activity_subscribers(activity)['my_tribes']
+            for viewer in profiles:
+                sees = author.pk in get_my_earnings_counter_profiles(viewer.pk) and viewer != author
+                self.assertEqual(viewer.pk in subscribers, sees, f'{viewer.handle} sees {author.handle}')
@@ -1,5 +1,23 @@
+import logging
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from app.redis_service import RedisService
+from redis import RedisError
+
 from .models import Offer
 
+logger = logging.getLogger(__name__)
+
+redis = RedisService().redis
+
+# badges are capped by max_of_ten, so a feed only needs its newest activity pks
+UNREAD_FEED_LENGTH = 100
+# feeds shared by every user; the others are kept per profile
+GLOBAL_FEEDS = ['everywhere', 'connect', 'kudos']
+RELATIONSHIP_COUNTS_TIMEOUT = 60 * 60
+
 
 def is_user_townsquare_enabled(user):
     if not user.is_authenticated:
@@ -19,5 +37,124 @@ def is_email_townsquare_enabled(email):
     return is_user_townsquare_enabled(user)
 
 
+def get_townsquare_enabled_emails():
+    """Return the emails is_email_townsquare_enabled is true for, in one query."""
+    from django.contrib.auth.models import User
+    return set(User.objects.exclude(email='').values_list('email', flat=True))
+
+
 def is_there_an_action_available():
     return Offer.objects.current().exists()
+
+
+def unread_feed_key(feed, profile_pk=None):
+    """Return the redis sorted set holding the newest activity pks of a sidebar feed."""
+    if feed in GLOBAL_FEEDS:
+        return f'townsquare:unread:{feed}'
+    return f'townsquare:unread:{feed}:{profile_pk}'
+
+
+def _add_to_feed(pipeline, feed, activity_pk, profile_pk=None):
+    key = unread_feed_key(feed, profile_pk)
+    pipeline.zadd(key, {activity_pk: activity_pk})
+    pipeline.zremrangebyrank(key, 0, -UNREAD_FEED_LENGTH - 1)
+
+
+def get_activity_subscribers(activity):
+    """Return the pks of the profiles whose personal sidebar feeds show an activity, by feed.
+
+    This mirrors the my_tribes and grants filters of retail.views.get_specific_activities
+    from the side of the activity instead of the viewer.
+    """
+    from dashboard.models import Earning
+    profile_pk = activity.profile_id
+    tribes = set()
+    earnings = Earning.objects.filter(Q(from_profile=profile_pk) | Q(to_profile=profile_pk))
+    for from_profile, to_profile, org_profile in earnings.values_list('from_profile', 'to_profile', 'org_profile'):
+        tribes.update([from_profile, to_profile, org_profile])
+    tribes.discard(profile_pk)
+    tribes.discard(None)
+    subscribers = {'my_tribes': tribes}
+
+    if activity.grant_id:
+        from grants.models import Grant, PhantomFunding, Subscription
+        grant = Grant.objects.get(pk=activity.grant_id)
+        grants = {grant.admin_profile_id}
+        grants.update(grant.team_members.values_list('pk', flat=True))
+        grants.update(Subscription.objects.filter(grant=grant).values_list('contributor_profile', flat=True))
+        grants.update(PhantomFunding.objects.filter(grant=grant).values_list('profile', flat=True))
+        grants.discard(None)
+        subscribers['grants'] = grants
+    return subscribers
+
+
+def fan_out_activity(activity):
+    """Add a new activity to the unread feeds of the sidebar tabs it shows up in."""
+    from retail.views import connect_types
+    pipeline = redis.pipeline(transaction=False)
+    _add_to_feed(pipeline, 'everywhere', activity.pk)
+    if activity.activity_type in connect_types:
+        _add_to_feed(pipeline, 'connect', activity.pk)
+    if activity.activity_type in ['new_kudos', 'receive_kudos']:
+        _add_to_feed(pipeline, 'kudos', activity.pk)
+    for feed, profile_pks in get_activity_subscribers(activity).items():
+        for profile_pk in profile_pks:
+            _add_to_feed(pipeline, feed, activity.pk, profile_pk)
+    pipeline.execute()
+
+
+def hide_from_unread_feeds(activity_pk):
+    """Drop a hidden activity from the shared unread feeds."""
+    try:
+        pipeline = redis.pipeline(transaction=False)
+        for feed in GLOBAL_FEEDS:
+            pipeline.zrem(unread_feed_key(feed), activity_pk)
+        pipeline.execute()
+    except RedisError as e:
+        logger.warning(f'could not hide activity {activity_pk} from the unread feeds: {e}')
+
+
+def add_thread(profile_pk, activity_pk):
+    """Add an activity a profile liked, commented on or tipped to its my_threads feed."""
+    try:
+        pipeline = redis.pipeline(transaction=False)
+        _add_to_feed(pipeline, 'my_threads', activity_pk, profile_pk)
+        pipeline.execute()
+    except RedisError as e:
+        logger.warning(f'could not add thread {activity_pk} of {profile_pk}: {e}')
+
+
+def get_unread_counts(last_seen_pks, profile_pk=None):
+    """Return how many activities of each feed are newer than the pk last seen on it.
+
+    Args:
+        last_seen_pks (dict): The last seen activity pk, by feed.
+        profile_pk (int): The viewing profile, for the personal feeds.
+
+    Returns:
+        dict: The unread count by feed, 0 for all of them if redis is unavailable.
+
+    """
+    feeds = list(last_seen_pks.keys())
+    try:
+        pipeline = redis.pipeline(transaction=False)
+        for feed in feeds:
+            pipeline.zcount(unread_feed_key(feed, profile_pk), f'({last_seen_pks[feed] or 0}', '+inf')
+        return dict(zip(feeds, pipeline.execute()))
+    except RedisError as e:
+        logger.warning(f'could not read the unread counts: {e}')
+        return {feed: 0 for feed in feeds}
+
+
+def get_relationship_counts(profile):
+    """Return how many profiles and grants a profile has done business with, cached for an hour."""
+    from dashboard.models import get_my_earnings_counter_profiles, get_my_grants
+    key = f'townsquare:relationships:{profile.pk}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = {
+            'my_tribes': len(set(get_my_earnings_counter_profiles(profile.pk))),
+            'grants': len(set(get_my_grants(profile))),
+        }
+        cache.set(key, counts, RELATIONSHIP_COUNTS_TIMEOUT)
+    return counts
@@ -8,16 +8,15 @@ from django.template.response import TemplateResponse
 from django.utils import timezone
 
 import metadata_parser
-from dashboard.models import Activity, HackathonEvent, Profile, get_my_earnings_counter_profiles, get_my_grants
+from dashboard.models import Activity, HackathonEvent, Profile
 from kudos.models import Token
 from marketing.mails import comment_email, new_action_request
-from perftools.models import JSONStore
+from perftools.utils import get_jsonstore
 from ratelimit.decorators import ratelimit
-from retail.views import get_specific_activities
 
 from .models import Announcement, Comment, Flag, Like, MatchRanking, MatchRound, Offer, OfferAction, SuggestedAction
 from .tasks import increment_offer_view_counts
-from .utils import is_user_townsquare_enabled
+from .utils import GLOBAL_FEEDS, get_relationship_counts, get_unread_counts, is_user_townsquare_enabled
 
 tags = [
     ['#announce','bullhorn','search-announce'],
@@ -70,9 +69,9 @@ def get_amount_unread(key, request):
     if key == request.COOKIES.get('tab'):
         return 0
     posts_unread = 0
-    post_data_cache = JSONStore.objects.filter(view='activity', key=key)
-    if post_data_cache.exists():
-        data = post_data_cache.first().data
+    post_data_cache = get_jsonstore('activity', key)
+    if post_data_cache:
+        data = post_data_cache.data
         elements = []
         if isinstance(data, list):
             elements = [ele for ele in data if ele > request.session.get(key, 0)]
@@ -80,50 +79,62 @@ def get_amount_unread(key, request):
     return max_of_ten(posts_unread)
 
 
+def get_unread_badge(key, request, unread_counts):
+    if key == request.GET.get('tab'):
+        return 0
+    if key in GLOBAL_FEEDS and key == request.COOKIES.get('tab'):
+        return 0
+    return max_of_ten(unread_counts.get(key, 0))
+
+
 def get_sidebar_tabs(request):
+    # read every badge from the unread feeds in one round trip
+    feeds = list(GLOBAL_FEEDS)
+    profile_pk = None
+    if request.user.is_authenticated:
+        profile_pk = request.user.profile.pk
+        relationships = get_relationship_counts(request.user.profile)
+        feeds += [key for key in ['my_tribes', 'grants'] if relationships[key]] + ['my_threads']
+    unread_counts = get_unread_counts({key: request.session.get(key, 0) for key in feeds}, profile_pk)
+
     # setup tabs
-    hours = 24
     hackathon_tabs = []
     tabs = [{
         'title': f"Everywhere",
         'slug': 'everywhere',
         'helper_text': f'The activity feed items everywhere in the Gitcoin network',
-        'badge': get_amount_unread('everywhere', request),
+        'badge': get_unread_badge('everywhere', request, unread_counts),
     }]
     default_tab = 'everywhere'
 
     if request.user.is_authenticated:
-        num_business_relationships = len(set(get_my_earnings_counter_profiles(request.user.profile.pk)))
-        if num_business_relationships:
+        if 'my_tribes' in feeds:
             key = 'my_tribes'
             new_tab = {
                 'title': f"Relationships",
                 'slug': key,
                 'helper_text': f'Activity from the users who you\'ve done business with Gitcoin',
-                'badge': max_of_ten(get_specific_activities(key, False, request.user, request.session.get(key, 0)).count()) if request.GET.get('tab') != key else 0
+                'badge': get_unread_badge(key, request, unread_counts),
             }
             tabs = [new_tab] + tabs
             default_tab = 'my_tribes'
-        num_grants_relationships = (len(set(get_my_grants(request.user.profile))))
 
-        if num_grants_relationships:
+        if 'grants' in feeds:
             key = 'grants'
             new_tab = {
                 'title': f'Grants',
                 'slug': key,
                 'helper_text': f'Activity on the Grants you\'ve created or funded.',
-                'badge': max_of_ten(get_specific_activities(key, False, request.user, request.session.get(key, 0)).count()) if request.GET.get('tab') != key else 0
+                'badge': get_unread_badge(key, request, unread_counts),
             }
             tabs = [new_tab] + tabs
             default_tab = 'grants'
 
-        threads_last_24_hours = max_of_ten(request.user.profile.subscribed_threads.filter(pk__gt=request.session.get('my_threads', 0)).count())  if request.GET.get('tab') != 'my_threads' else 0
-
         threads = {
             'title': f"My Threads",
             'slug': f'my_threads',
             'helper_text': f'The Threads that you\'ve liked, commented on, or sent a tip upon on Gitcoin in the last 24 hours.',
-            'badge': threads_last_24_hours
+            'badge': get_unread_badge('my_threads', request, unread_counts),
         }
         tabs = [threads] + tabs
 
@@ -132,7 +143,7 @@ def get_sidebar_tabs(request):
         'title': f"Connect",
         'slug': f'connect',
         'helper_text': f'The announcements, requests for help, kudos jobs, mentorship, or other connective requests on Gitcoin.',
-        'badge': get_amount_unread('connect', request),
+        'badge': get_unread_badge('connect', request, unread_counts),
     }
     tabs = [connect] + tabs
 
@@ -140,7 +151,7 @@ def get_sidebar_tabs(request):
         'title': f"Kudos",
         'slug': f'kudos',
         'helper_text': f'The Kudos that have been sent by Gitcoin community members, to show appreciation for one aother.',
-        'badge': get_amount_unread('kudos', request),
+        'badge': get_unread_badge('kudos', request, unread_counts),
     }
     tabs = tabs + [connect]
 